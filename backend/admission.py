@@ -0,0 +1,174 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """Spend `cost` tokens; returns 0 on success, else seconds until they are available"""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class ClientRateLimiter:
+    """One token bucket per client, keeping only the `max_clients` most recently seen"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.limited = 0
+        self.lock = threading.Lock()
+
+    def take(self, client: str, cost: float = 1.0) -> float:
+        with self.lock:
+            bucket = self.buckets.get(client)
+            if bucket is None:
+                bucket = self.buckets[client] = TokenBucket(self.rate, self.burst)
+                while len(self.buckets) > self.max_clients:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(client)
+            wait = bucket.take(cost)
+            if wait:
+                self.limited += 1
+            return wait
+
+
+class ConcurrencyGate:
+    """At most `limit` requests in flight; up to `queue_budget` more wait at most `max_wait` seconds.
+
+    Anything beyond the budget is rejected immediately, so a saturated
+    class answers fast instead of piling up worker threads. Service time is
+    tracked (EWMA) to suggest a Retry-After.
+    """
+
+    def __init__(self, name: str, priority: int, limit: int, queue_budget: int, max_wait: float):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue_budget = queue_budget
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.service_time = 0.05
+        self.condition = threading.Condition()
+
+    def acquire(self) -> bool:
+        with self.condition:
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.queue_budget or self.max_wait <= 0:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    self.condition.wait(remaining)
+                self.active += 1
+                self.admitted += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self, elapsed: float):
+        with self.condition:
+            self.active -= 1
+            self.service_time += 0.2 * (elapsed - self.service_time)
+            self.condition.notify()
+
+    def retry_after(self) -> int:
+        """Whole seconds until the current backlog should have drained"""
+        with self.condition:
+            backlog = self.active + self.waiting
+            return max(1, math.ceil(self.service_time * backlog / self.limit))
+
+    def stats(self) -> Dict:
+        with self.condition:
+            return {
+                "priority": self.priority,
+                "limit": self.limit,
+                "active": self.active,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "service_ms": round(self.service_time * 1000, 1)
+            }
+
+
+class AdmissionController:
+    """Per-route concurrency limits, priority classes and per-client rate limits.
+
+    Every endpoint belongs to a priority class (lower number = more
+    important) with its own concurrency gate, so slow work cannot occupy
+    the threads that cheap reads need. A class is shed outright while any
+    more important class has requests waiting. `admit()` returns None when
+    the request may proceed, else (status, retry_after, reason): 429 when
+    the client is over its rate, 503 when the class is saturated.
+    """
+
+    def __init__(self, classes: Dict[str, Tuple[int, int, int, float]], routes: Dict[str, str],
+                 default_class: str, rate_limiter: Optional[ClientRateLimiter] = None,
+                 unlimited_routes: Tuple[str, ...] = ()):
+        self.gates = {
+            name: ConcurrencyGate(name, priority, limit, queue_budget, max_wait)
+            for name, (priority, limit, queue_budget, max_wait) in classes.items()
+        }
+        self.routes = routes
+        self.default_class = default_class
+        self.rate_limiter = rate_limiter
+        self.unlimited_routes = set(unlimited_routes)
+
+    def gate_for(self, endpoint: Optional[str]) -> ConcurrencyGate:
+        return self.gates[self.routes.get(endpoint, self.default_class)]
+
+    def _higher_priority_waiting(self, gate: ConcurrencyGate) -> bool:
+        return any(other.waiting for other in self.gates.values() if other.priority < gate.priority)
+
+    def admit(self, endpoint: Optional[str], client: str) -> Optional[Tuple[int, int, str]]:
+        gate = self.gate_for(endpoint)
+        if self.rate_limiter and endpoint not in self.unlimited_routes:
+            wait = self.rate_limiter.take(client)
+            if wait:
+                return 429, max(1, math.ceil(wait)), "Rate limit exceeded"
+        if self._higher_priority_waiting(gate):
+            with gate.condition:
+                gate.rejected += 1
+            return 503, gate.retry_after(), "Server busy, shedding low-priority requests"
+        if not gate.acquire():
+            return 503, gate.retry_after(), f"Too many concurrent {gate.name} requests"
+        return None
+
+    def release(self, endpoint: Optional[str], elapsed: float):
+        self.gate_for(endpoint).release(elapsed)
+
+    def stats(self) -> Dict:
+        return {
+            "classes": {name: gate.stats() for name, gate in self.gates.items()},
+            "rate_limited": self.rate_limiter.limited if self.rate_limiter else 0
+        }
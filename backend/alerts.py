@@ -0,0 +1,183 @@
+import queue
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Set
+
+from ingestion import get_aqi_category
+
+
+class ThresholdIndex:
+    """Subscriptions for one location, kept as a sorted list of distinct thresholds.
+
+    Range lookups over (low, high] cost O(log n + k) where k is the number of
+    thresholds inside the range, independent of the total number of users.
+    """
+
+    def __init__(self):
+        self.thresholds: List[float] = []
+        self.users_at: Dict[float, Set[str]] = {}
+
+    def add(self, user_id: str, threshold: float):
+        users = self.users_at.get(threshold)
+        if users is None:
+            users = self.users_at[threshold] = set()
+            insort(self.thresholds, threshold)
+        users.add(user_id)
+
+    def remove(self, user_id: str, threshold: float):
+        users = self.users_at.get(threshold)
+        if not users:
+            return
+        users.discard(user_id)
+        if not users:
+            del self.users_at[threshold]
+            del self.thresholds[bisect_left(self.thresholds, threshold)]
+
+    def between(self, low: float, high: float):
+        """Yield (threshold, users) for every threshold t with low < t <= high"""
+        start = bisect_right(self.thresholds, low)
+        end = bisect_right(self.thresholds, high)
+        for threshold in self.thresholds[start:end]:
+            yield threshold, self.users_at[threshold]
+
+
+class AlertInbox:
+    """Default delivery sink: the most recent alerts per user, kept in memory"""
+
+    def __init__(self, per_user: int = 50):
+        self.per_user = per_user
+        self.inboxes: Dict[str, deque] = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, alert: Dict):
+        with self.lock:
+            inbox = self.inboxes.get(alert["user_id"])
+            if inbox is None:
+                inbox = self.inboxes[alert["user_id"]] = deque(maxlen=self.per_user)
+            inbox.append(alert)
+
+    def get(self, user_id: str) -> List[Dict]:
+        with self.lock:
+            return list(self.inboxes.get(user_id, ()))
+
+
+class AlertEngine:
+    """Per-user AQI threshold alerts evaluated as readings are saved.
+
+    Subscriptions are indexed per location by threshold. For each new reading
+    only thresholds between the previous and the new AQI are visited:
+    rising past a threshold alerts its armed users, and falling more than
+    `hysteresis` below it re-arms them, so a value hovering around a
+    threshold does not alert repeatedly. Alerts go onto a bounded queue and
+    are handed to the delivery sinks by a dispatcher thread.
+    """
+
+    def __init__(self, hysteresis: float = 5, queue_size: int = 10000):
+        self.hysteresis = hysteresis
+        self.indexes: Dict[str, ThresholdIndex] = {}
+        self.subscriptions: Dict[str, Dict[str, float]] = {}
+        self.active: Set[tuple] = set()
+        self.last_aqi: Dict[str, float] = {}
+        self.last_time: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.sinks: List[Callable[[Dict], None]] = []
+        self.dropped = 0
+        self.thread = None
+
+    def subscribe(self, user_id: str, thresholds: Dict[str, float]):
+        """Replace a user's subscriptions with {location_id: threshold}"""
+        with self.lock:
+            for location_id, threshold in self.subscriptions.pop(user_id, {}).items():
+                self.indexes[location_id].remove(user_id, threshold)
+                self.active.discard((location_id, user_id))
+            if thresholds:
+                self.subscriptions[user_id] = dict(thresholds)
+            for location_id, threshold in thresholds.items():
+                self.indexes.setdefault(location_id, ThresholdIndex()).add(user_id, float(threshold))
+
+    def load(self, subscriptions: List[Dict]):
+        """Bulk-load rows shaped like AirQualityDatabase.get_alert_subscriptions()"""
+        by_user: Dict[str, Dict[str, float]] = {}
+        for sub in subscriptions:
+            by_user.setdefault(sub["user_id"], {})[sub["location_id"]] = sub["threshold"]
+        for user_id, thresholds in by_user.items():
+            self.subscribe(user_id, thresholds)
+
+    def prime(self, location_id: str, aqi_value: float, reading_time: Optional[str] = None):
+        """Seed the previous AQI for a location (e.g. from the latest stored reading)"""
+        with self.lock:
+            self.last_aqi[location_id] = aqi_value
+            if reading_time:
+                self.last_time[location_id] = reading_time
+
+    def evaluate(self, location_id: str, aqi_value: float, reading_time: Optional[str] = None) -> List[Dict]:
+        """Process one reading; returns (and enqueues) the alerts it raised"""
+        alerts = []
+        with self.lock:
+            if reading_time and reading_time < self.last_time.get(location_id, ""):
+                return alerts  # late, out-of-order reading: not a crossing
+            previous = self.last_aqi.get(location_id, float("-inf"))
+            self.last_aqi[location_id] = aqi_value
+            if reading_time:
+                self.last_time[location_id] = reading_time
+
+            index = self.indexes.get(location_id)
+            if index is None:
+                return alerts
+
+            if aqi_value > previous:
+                category = get_aqi_category(aqi_value)
+                created_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+                for threshold, users in index.between(previous, aqi_value):
+                    for user_id in users:
+                        key = (location_id, user_id)
+                        if key in self.active:
+                            continue
+                        self.active.add(key)
+                        alerts.append({
+                            "user_id": user_id,
+                            "location_id": location_id,
+                            "threshold": threshold,
+                            "aqi_value": aqi_value,
+                            "aqi_category": category,
+                            "reading_time": reading_time,
+                            "created_at": created_at
+                        })
+            elif aqi_value < previous:
+                for threshold, users in index.between(aqi_value + self.hysteresis, previous + self.hysteresis):
+                    for user_id in users:
+                        self.active.discard((location_id, user_id))
+
+        for alert in alerts:
+            try:
+                self.queue.put_nowait(alert)
+            except queue.Full:
+                self.dropped += 1
+        return alerts
+
+    def on_readings_saved(self, location_id: str, readings: List[Dict]):
+        """AirQualityDatabase save listener"""
+        for reading in sorted(readings, key=lambda r: r["reading_time"]):
+            self.evaluate(location_id, reading["aqi_value"], reading["reading_time"])
+
+    def add_sink(self, sink: Callable[[Dict], None]):
+        self.sinks.append(sink)
+
+    def _dispatch(self):
+        while True:
+            alert = self.queue.get()
+            for sink in self.sinks:
+                try:
+                    sink(alert)
+                except Exception as e:
+                    print(f"❌ Error delivering alert to {alert['user_id']}: {e}")
+            self.queue.task_done()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._dispatch, name="alert-dispatcher", daemon=True)
+        self.thread.start()
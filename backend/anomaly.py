@@ -0,0 +1,210 @@
+import bisect
+import math
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ringbuffer import ROLLING_FIELDS
+
+# Physically plausible bounds; anything outside is a sensor fault, not pollution
+FIELD_RANGES = {
+    "aqi_value": (0, 999),
+    "pm25": (0, 1000),
+    "pm10": (0, 2000),
+    "o3": (0, 1000),
+    "no2": (0, 2000),
+    "so2": (0, 2000),
+    "co": (0, 100),
+    "temperature": (-50, 60),
+    "humidity": (0, 100)
+}
+
+# Smallest spread used when scoring, so a near-constant series does not turn
+# ordinary jitter into huge scores
+MIN_SCALE = {
+    "aqi_value": 5.0,
+    "pm25": 2.0,
+    "pm10": 3.0,
+    "o3": 3.0,
+    "no2": 2.0,
+    "so2": 1.0,
+    "co": 0.2,
+    "temperature": 1.0,
+    "humidity": 3.0
+}
+
+# Flag kinds that keep a reading out of the tables in quarantine mode;
+# stuck-at values are plausible on their own, so they are only flagged
+QUARANTINE_KINDS = {"spike", "out_of_range"}
+
+
+class FieldStats:
+    """Sliding-window statistics for one (source, field) series.
+
+    Mean and variance are kept with Welford's update (and its inverse when
+    a value leaves the window), O(1) per reading. The median comes from a
+    sorted copy of the window maintained with bisect: an O(log window)
+    search plus an O(window) list shift, which for the ~100-value windows
+    used here is a single short memmove.
+    """
+
+    __slots__ = ("window", "values", "ordered", "mean", "m2", "last", "run", "pending")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.ordered = []
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.last = None
+        self.run = 0
+        self.pending = []  # consecutive outliers as (reading_time, value), kept out of the baseline
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value: float):
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(value)
+        bisect.insort(self.ordered, value)
+        delta = value - self.mean
+        self.mean += delta / len(self.values)
+        self.m2 += delta * (value - self.mean)
+
+    def _remove(self, value: float):
+        del self.ordered[bisect.bisect_left(self.ordered, value)]
+        n = len(self.values)  # already excludes `value`
+        if n == 0:
+            self.mean = self.m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / n
+        self.m2 -= delta * (value - self.mean)
+
+    def reset(self, values: Sequence[float]):
+        self.values.clear()
+        self.ordered.clear()
+        self.mean = self.m2 = 0.0
+        for value in values:
+            self.add(value)
+
+    @property
+    def std(self) -> float:
+        n = len(self.values)
+        return math.sqrt(max(self.m2, 0.0) / (n - 1)) if n > 1 else 0.0
+
+    @property
+    def median(self) -> float:
+        ordered, n = self.ordered, len(self.ordered)
+        mid = n // 2
+        return ordered[mid] if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+class AnomalyDetector:
+    """Online spike, range and stuck-at detection per source and field.
+
+    A value is a spike when it sits more than `z_threshold` standard
+    deviations from the rolling median of the last `window` accepted
+    values. Spikes are kept out of the baseline; after `shift_after`
+    consecutive spikes the baseline is rebuilt from them, since that is a
+    level change (e.g. smoke) rather than a faulty sensor: the reading that
+    confirms it is flagged "level_shift" instead of "spike", and its flag
+    lists the reading times of the earlier spikes in the run ("released")
+    so the caller can let those through too. A value repeated `stuck_run`
+    times in a row is flagged as stuck once, on the reading that completes
+    the run.
+    """
+
+    def __init__(self, window: int = 96, z_threshold: float = 4.0, min_points: int = 12,
+                 stuck_run: int = 8, shift_after: int = 3, mode: str = "quarantine",
+                 fields: Sequence[str] = ROLLING_FIELDS):
+        if mode not in ("flag", "quarantine"):
+            raise ValueError(f"Unknown anomaly mode: {mode}")
+        self.window = window
+        self.z_threshold = z_threshold
+        self.min_points = min_points
+        self.stuck_run = stuck_run
+        self.shift_after = shift_after
+        self.mode = mode
+        self.fields = list(fields)
+        self.stats: Dict[Tuple[str, str, str], FieldStats] = {}
+        self.lock = threading.Lock()
+
+    def _stats(self, source_type: str, source_id: str, field: str) -> FieldStats:
+        key = (source_type, source_id, field)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = FieldStats(self.window)
+        return stats
+
+    def prime(self, source_type: str, source_id: str, rows: List[tuple]):
+        """Seed baselines from stored rows shaped (reading_time, *fields)"""
+        with self.lock:
+            for row in rows:
+                for field, value in zip(self.fields, row[1:]):
+                    if value is not None:
+                        stats = self._stats(source_type, source_id, field)
+                        stats.add(float(value))
+                        stats.run = stats.run + 1 if value == stats.last else 1
+                        stats.last = value
+
+    def _check_field(self, stats: FieldStats, field: str, value: float,
+                     reading_time: Optional[str] = None) -> Optional[Dict]:
+        low, high = FIELD_RANGES.get(field, (-math.inf, math.inf))
+        if not low <= value <= high:
+            return self._flag(stats, "out_of_range", None)
+
+        stats.run = stats.run + 1 if value == stats.last else 1
+        stats.last = value
+
+        if len(stats) >= self.min_points:
+            median, std = stats.median, stats.std
+            scale = max(std, MIN_SCALE.get(field, 0.0))
+            score = abs(value - median) / scale if scale else 0.0
+            if score > self.z_threshold:
+                flag = self._flag(stats, "spike", round(score, 2))
+                stats.pending.append((reading_time, value))
+                if len(stats.pending) >= self.shift_after:
+                    flag.update(kind="level_shift", released=[t for t, _ in stats.pending[:-1]])
+                    stats.reset([v for _, v in stats.pending])
+                    stats.pending = []
+                return flag
+
+        stats.pending = []
+        if stats.run == self.stuck_run:
+            # Flag once when the run reaches the threshold, not on every repeat after it
+            flag = self._flag(stats, "stuck", float(stats.run))
+            stats.add(value)
+            return flag
+        stats.add(value)
+        return None
+
+    @staticmethod
+    def _flag(stats: FieldStats, kind: str, score: Optional[float]) -> Dict:
+        """Flag dict with the baseline as it was before this reading"""
+        if not len(stats):
+            return {"kind": kind, "score": score, "baseline_mean": None, "baseline_median": None, "baseline_std": None}
+        return {"kind": kind, "score": score, "baseline_mean": stats.mean,
+                "baseline_median": stats.median, "baseline_std": stats.std}
+
+    def screen(self, source_type: str, source_id: str, reading: Dict) -> Tuple[List[Dict], bool]:
+        """Check one reading before it is written.
+
+        Returns (flags, quarantine): one flag dict per offending field, and
+        whether the reading should be held back from the reading tables.
+        """
+        flags = []
+        with self.lock:
+            for field in self.fields:
+                value = reading.get(field)
+                if value is None:
+                    continue
+                flag = self._check_field(self._stats(source_type, source_id, field), field, float(value),
+                                         reading.get("reading_time"))
+                if flag:
+                    flag.update(field=field, value=value)
+                    flags.append(flag)
+
+        quarantine = self.mode == "quarantine" and any(f["kind"] in QUARANTINE_KINDS for f in flags)
+        return flags, quarantine
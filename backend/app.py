@@ -1,13 +1,27 @@
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
-import requests
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import os
+import sqlite3
+import threading
 import time
-import random
-from database import AirQualityDatabase, LOCATION_MAPPING, STATION_TO_LOCATION
+from database import AirQualityDatabase, LOCATION_MAPPING
+from ingestion import IngestionPoller, STATIONS_BY_ID, build_sources, get_aqi_category
+from anomaly import AnomalyDetector
+from alerts import AlertEngine, AlertInbox
+from ringbuffer import ROLLING_FIELDS, RollingWindows
+from forecasting import ForecastService
+from grid import AQIGridService, NYC_BBOX
+from formats import FastJSONProvider, rows_response
+from exposure import ExposureEngine, parse_time_of_day
+from insights import InsightPrewarmer
+from admission import AdmissionController, ClientRateLimiter
+from backup import BackupManager
+from rules import RuleEngine
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson when installed
 CORS(app)  # Enable CORS for frontend
 
 # Initialize database
@@ -17,120 +31,164 @@ db = AirQualityDatabase()
 NYC_LAT = 40.7128
 NYC_LON = -74.0060
 
-# NYC Monitoring Stations
-NYC_STATIONS = [
-    {
-        "id": "manhattan_midtown",
-        "location": "Manhattan Midtown",
-        "latitude": 40.7589,
-        "longitude": -73.9851
-    },
-    {
-        "id": "brooklyn_downtown", 
-        "location": "Brooklyn Downtown",
-        "latitude": 40.6943,
-        "longitude": -73.9903
-    },
-    {
-        "id": "queens_astoria",
-        "location": "Queens Astoria", 
-        "latitude": 40.7794,
-        "longitude": -73.9217
-    },
-    {
-        "id": "bronx_south",
-        "location": "Bronx South",
-        "latitude": 40.8448,
-        "longitude": -73.8648
-    },
-    {
-        "id": "staten_island_north",
-        "location": "Staten Island North",
-        "latitude": 40.6415,
-        "longitude": -74.0776
-    }
-]
-
-def get_aqi_category(aqi_value):
-    """Convert AQI value to category"""
-    if aqi_value <= 50:
-        return "good"
-    elif aqi_value <= 100:
-        return "moderate"
-    elif aqi_value <= 150:
-        return "unhealthy_sensitive"
-    elif aqi_value <= 200:
-        return "unhealthy"
-    elif aqi_value <= 300:
-        return "very_unhealthy"
-    else:
-        return "hazardous"
-
-def generate_mock_current_data():
-    """Generate mock current air quality data"""
-    aqi_value = random.randint(40, 120)
-    
-    return {
-        "location": "New York City, NY",
-        "aqi_value": aqi_value,
-        "aqi_category": get_aqi_category(aqi_value),
-        "primary_pollutant": "PM2.5",
-        "pm25": round(random.uniform(10, 30), 1),
-        "pm10": round(random.uniform(15, 40), 1),
-        "o3": round(random.uniform(20, 60), 1),
-        "no2": round(random.uniform(10, 35), 1),
-        "so2": round(random.uniform(5, 15), 1),
-        "co": round(random.uniform(0.5, 2.0), 1),
-        "temperature": round(random.uniform(15, 25), 1),
-        "humidity": round(random.uniform(50, 80), 1),
-        "reading_time": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "latitude": NYC_LAT,
-        "longitude": NYC_LON
-    }
+# Admission control: (priority, concurrency limit, queue budget, max wait seconds) per class.
+# Cheap current-data reads keep their own threads; slow endpoints are shed first under load
+ADMISSION_CLASSES = {
+    "critical": (0, 32, 64, 1.0),
+    "normal": (1, 16, 32, 0.5),
+    "low": (2, 4, 8, 0.25)
+}
+ADMISSION_ROUTES = {
+    "health_check": "critical",
+    "root": "critical",
+    "get_current_aqi": "critical",
+    "get_location_current_data": "critical",
+    "get_location_rolling": "critical",
+    "get_station_rolling": "critical",
+    "get_location_insights": "low",
+    "get_location_history": "low",
+    "get_location_forecast": "low",
+    "get_user_exposure": "low",
+    "get_users_exposure": "low",
+    "import_user_profiles": "low",
+    "get_database_stats": "low",
+    "create_database_backup": "low"
+}
+# Per-client token bucket (requests per second, burst); ADMISSION_RATE=0 disables it
+ADMISSION_RATE = float(os.environ.get("ADMISSION_RATE", "20"))
+ADMISSION_BURST = float(os.environ.get("ADMISSION_BURST", "40"))
 
-def generate_mock_historical_data():
-    """Generate mock historical data for the last 24 hours"""
-    historical = []
-    now = datetime.now()
-    
-    for i in range(24):
-        time_point = now - timedelta(hours=i)
-        aqi_value = random.randint(40, 120)
-        
-        historical.append({
-            "time": time_point.strftime("%H:%M"),
-            "aqi": aqi_value
-        })
-    
-    return list(reversed(historical))
+admission = AdmissionController(
+    ADMISSION_CLASSES, ADMISSION_ROUTES, default_class="normal",
+    rate_limiter=ClientRateLimiter(ADMISSION_RATE, ADMISSION_BURST) if ADMISSION_RATE > 0 else None,
+    unlimited_routes=("health_check",)
+)
 
-def generate_mock_station_data():
-    """Generate mock data for all NYC stations"""
-    stations = []
-    
-    for station in NYC_STATIONS:
-        aqi_value = random.randint(40, 120)
-        
-        stations.append({
-            "id": station["id"],
-            "location": station["location"],
-            "latitude": station["latitude"],
-            "longitude": station["longitude"],
-            "aqi_value": aqi_value,
-            "aqi_category": get_aqi_category(aqi_value),
-            "primary_pollutant": "PM2.5",
-            "pm25": round(random.uniform(10, 30), 1),
-            "pm10": round(random.uniform(15, 40), 1),
-            "o3": round(random.uniform(20, 60), 1),
-            "no2": round(random.uniform(10, 35), 1),
-            "so2": round(random.uniform(5, 15), 1),
-            "co": round(random.uniform(0.5, 2.0), 1),
-            "temperature": round(random.uniform(15, 25), 1),
-            "humidity": round(random.uniform(50, 80), 1),
-            "reading_time": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-        })
-    
-    return stations
+@app.before_request
+def admit_request():
+    """Reject over-rate clients (429) and saturated route classes (503) before doing any work"""
+    # Servers that never run the __main__ block (WSGI, flask run) start the services on first request
+    start_background_services()
+    rejection = admission.admit(request.endpoint, request.remote_addr or "unknown")
+    if rejection:
+        status, retry_after, reason = rejection
+        response = jsonify({"error": reason, "retry_after": retry_after})
+        response.headers["Retry-After"] = str(retry_after)
+        return response, status
+    g.admitted_at = time.perf_counter()
+
+@app.teardown_request
+def release_request(error=None):
+    admitted_at = g.pop("admitted_at", None)
+    if admitted_at is not None:
+        admission.release(request.endpoint, time.perf_counter() - admitted_at)
+
+# Ingestion: comma separated sources, e.g. "mock" or "fixture:http://localhost:5055"
+INGEST_SOURCES = os.environ.get("INGEST_SOURCES", "mock")
+INGEST_INTERVAL = float(os.environ.get("INGEST_INTERVAL", "60"))
+
+ingestion_poller = IngestionPoller(db, build_sources(INGEST_SOURCES), interval=INGEST_INTERVAL)
+
+# Spike / stuck-sensor screening on the write path: "quarantine" keeps spikes out of the tables
+ANOMALY_MODE = os.environ.get("ANOMALY_MODE", "quarantine")
+
+anomaly_detector = AnomalyDetector(mode=ANOMALY_MODE)
+for station_id in STATIONS_BY_ID:
+    anomaly_detector.prime("station", station_id,
+                           db.get_recent_station_rows(station_id, ROLLING_FIELDS, anomaly_detector.window))
+for location_id in LOCATION_MAPPING:
+    anomaly_detector.prime("location", location_id,
+                           db.get_recent_location_rows(location_id, ROLLING_FIELDS, anomaly_detector.window))
+db.set_anomaly_detector(anomaly_detector)
+
+# Personalized AQI alerts, evaluated whenever location readings are saved
+ALERT_HYSTERESIS = float(os.environ.get("ALERT_HYSTERESIS", "5"))
+DEFAULT_ALERT_THRESHOLD = 75
+
+alert_engine = AlertEngine(hysteresis=ALERT_HYSTERESIS)
+alert_inbox = AlertInbox()
+alert_engine.add_sink(alert_inbox)
+alert_engine.load(db.get_alert_subscriptions())
+for location_id in LOCATION_MAPPING:
+    latest = db.get_latest_location_data(location_id)
+    if latest:
+        alert_engine.prime(location_id, latest["aqi_value"], latest["reading_time"])
+db.add_save_listener(alert_engine.on_readings_saved)
+
+# In-memory rolling windows per location and station, filled once from the database
+ROLLING_CAPACITY = int(os.environ.get("ROLLING_CAPACITY", "2048"))
+
+rolling_windows = RollingWindows(capacity=ROLLING_CAPACITY)
+for location_id, station_id in LOCATION_MAPPING.items():
+    rolling_windows.load_rows("location", location_id,
+                              db.get_recent_location_rows(location_id, ROLLING_FIELDS, ROLLING_CAPACITY))
+    rolling_windows.load_rows("station", station_id,
+                              db.get_recent_station_rows(station_id, ROLLING_FIELDS, ROLLING_CAPACITY))
+db.add_save_listener(rolling_windows.on_location_saved)
+db.add_station_save_listener(rolling_windows.on_station_saved)
+
+# Short-horizon AQI forecasts, refit in worker processes after every ingest batch.
+# The pool is forked here: importing the app starts no threads, so this is the
+# one point every server (python app.py, WSGI, flask run) passes single-threaded.
+FORECAST_HORIZON = 24
+FORECAST_HISTORY_ROWS = 20000
+
+forecast_service = ForecastService(list(LOCATION_MAPPING), horizon=FORECAST_HORIZON,
+                                   history_rows=FORECAST_HISTORY_ROWS)
+forecast_service.start()
+for location_id in LOCATION_MAPPING:
+    forecast_service.load_rows(location_id,
+                               db.get_recent_location_rows(location_id, ["aqi_value"], FORECAST_HISTORY_ROWS))
+db.add_save_listener(forecast_service.on_location_saved)
+db.add_batch_listener(forecast_service.request_refresh)
+
+# Interpolated AQI surface for the map, recomputed after station updates
+aqi_grid = AQIGridService()
+aqi_grid.load_stations(db.get_all_stations_data())
+db.add_station_save_listener(aqi_grid.on_station_saved)
+db.add_batch_listener(aqi_grid.on_batch_saved)
+
+# Health recommendations and fallback insights, compiled once and evaluated in batches
+rule_engine = RuleEngine()
+
+# Online snapshots of the database and its partitions, taken while ingestion keeps writing
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+BACKUP_INTERVAL = float(os.environ.get("BACKUP_INTERVAL", "3600"))  # seconds, 0 disables
+BACKUP_KEEP = int(os.environ.get("BACKUP_KEEP", "24"))
+
+backup_manager = BackupManager(db, BACKUP_DIR, keep=BACKUP_KEEP)
+if BACKUP_INTERVAL > 0:
+    # Committed batches are archived between snapshots for point-in-time restore
+    db.add_batch_listener(backup_manager.archive.append)
+
+# Time-weighted personal exposure from user schedules, cached per (user, day)
+MAX_EXPOSURE_DAYS = 7
+MAX_EXPOSURE_BATCH = 10000
+
+exposure_engine = ExposureEngine(db, list(LOCATION_MAPPING))
+db.add_save_listener(exposure_engine.on_location_saved)
+
+def parse_exposure_date(value):
+    """?date=YYYY-MM-DD (UTC), defaulting to today"""
+    if not value:
+        return datetime.now(timezone.utc).date()
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def rolling_historical(location_id, hours=24):
+    """Hourly AQI points for the dashboard chart, served from the ring buffer"""
+    return [
+        {
+            "time": datetime.fromtimestamp(hour, tz=timezone.utc).strftime("%H:%M"),
+            "aqi": round(aqi)
+        }
+        for hour, aqi in rolling_windows.hourly_series("location", location_id, hours=hours)
+    ]
+
+def station_response(row):
+    """Shape a stored station snapshot row like the upstream station payload"""
+    station = dict(row)
+    station["id"] = station.pop("station_id")
+    return station
 
 # Routes
 @app.route('/health', methods=['GET'])
@@ -140,18 +198,22 @@ def health_check():
         "status": "OK",
         "timestamp": datetime.now().isoformat(),
         "environment": "development",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "admission": admission.stats()
     })
 
 @app.route('/api/aqi/nyc/current', methods=['GET'])
 def get_current_aqi():
     """Get current NYC air quality data"""
     try:
-        current_data = generate_mock_current_data()
-        historical_data = generate_mock_historical_data()
+        # NYC overview is served from the latest ingested reading for home
+        current_data = db.get_latest_location_data("home")
+        
+        if not current_data:
+            return jsonify({"error": "No data available yet"}), 404
         
-        # Save current data to database (for home location)
-        db.save_location_data("home", current_data)
+        current_data["location"] = "New York City, NY"
+        historical_data = rolling_historical("home")
         
         response = {
             "current": current_data,
@@ -167,23 +229,10 @@ def get_current_aqi():
 def get_stations_data():
     """Get air quality data for all NYC monitoring stations"""
     try:
-        stations_data = generate_mock_station_data()
-        
-        # Save station data to database
-        db.save_station_data(stations_data)
-        
-        # Also save data for each mapped location
-        for station in stations_data:
-            station_id = station['id']
-            if station_id in STATION_TO_LOCATION:
-                location_id = STATION_TO_LOCATION[station_id]
-                db.save_location_data(location_id, station)
-        
-        response = {
-            "stations": stations_data
-        }
+        stations_data = [station_response(row) for row in db.get_all_stations_data()]
         
-        return jsonify(response)
+        # JSON by default; columnar JSON, MessagePack or Arrow via ?format= / Accept
+        return rows_response(request, stations_data, "stations")
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -192,7 +241,7 @@ def get_stations_data():
 def get_station_data(station_id):
     """Get air quality data for a specific station"""
     try:
-        station_data = generate_mock_station_data()
+        station_data = [station_response(row) for row in db.get_all_stations_data()]
         
         # Find the requested station
         station = next((s for s in station_data if s["id"] == station_id), None)
@@ -205,51 +254,92 @@ def get_station_data(station_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/aqi/nyc/station/<station_id>/rolling', methods=['GET'])
+def get_station_rolling(station_id):
+    """Rolling window series, moving averages and max for a station (from memory)"""
+    try:
+        hours = request.args.get('hours', 24, type=int)
+        summary = rolling_windows.summary("station", station_id, hours=hours)
+        
+        if not summary:
+            return jsonify({"error": "No data available for this station"}), 404
+        
+        return jsonify({"station": station_id, "hours": hours, **summary})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/aqi/nyc/grid', methods=['GET'])
+def get_aqi_grid():
+    """Get the interpolated AQI grid for a bbox (minLon,minLat,maxLon,maxLat) and zoom"""
+    try:
+        zoom = request.args.get('zoom', aqi_grid.default_zoom, type=int)
+        bbox_arg = request.args.get('bbox')
+        
+        if bbox_arg:
+            try:
+                bbox = tuple(float(v) for v in bbox_arg.split(','))
+            except ValueError:
+                bbox = ()
+            if len(bbox) != 4 or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+                return jsonify({"error": "bbox must be minLon,minLat,maxLon,maxLat"}), 400
+        else:
+            bbox = NYC_BBOX
+        
+        grid = aqi_grid.get_grid(bbox, zoom)
+        
+        if not grid:
+            return jsonify({"error": "No station data available"}), 404
+        
+        if request.if_none_match.contains(grid["etag"]):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify({k: v for k, v in grid.items() if k != "etag"})
+        response.set_etag(grid["etag"])
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/anomalies', methods=['GET'])
+def get_anomalies():
+    """Get anomaly flags raised on ingest (?station=, ?location=, ?kind=, ?since=, ?limit=)"""
+    try:
+        station_id = request.args.get('station')
+        location_id = request.args.get('location')
+        if station_id and location_id:
+            return jsonify({"error": "Filter by station or location, not both"}), 400
+        
+        source_type = "station" if station_id else "location" if location_id else None
+        flags = db.get_reading_flags(
+            source_type=source_type,
+            source_id=station_id or location_id,
+            kind=request.args.get('kind'),
+            since=request.args.get('since'),
+            limit=min(request.args.get('limit', 100, type=int), 1000)
+        )
+        
+        return jsonify({"mode": anomaly_detector.mode, "count": len(flags), "flags": flags})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/aqi/health-recommendations', methods=['GET'])
 def get_health_recommendations():
     """Get health recommendations based on current AQI"""
     try:
-        current_data = generate_mock_current_data()
-        
-        recommendations = {
-            "good": {
-                "message": "Air quality is satisfactory and poses little or no risk.",
-                "activities": ["All outdoor activities are safe", "Great day for outdoor exercise"],
-                "sensitive_groups": "No special precautions needed"
-            },
-            "moderate": {
-                "message": "Air quality is acceptable for most people.",
-                "activities": ["Most outdoor activities are safe", "Consider reducing prolonged outdoor exertion"],
-                "sensitive_groups": "Sensitive individuals may experience minor breathing discomfort"
-            },
-            "unhealthy_sensitive": {
-                "message": "Sensitive groups may experience health effects.",
-                "activities": ["Reduce outdoor activities", "Avoid prolonged outdoor exertion"],
-                "sensitive_groups": "Children, elderly, and those with respiratory conditions should limit outdoor activities"
-            },
-            "unhealthy": {
-                "message": "Everyone may begin to experience health effects.",
-                "activities": ["Avoid outdoor activities", "Stay indoors when possible"],
-                "sensitive_groups": "Sensitive groups should avoid all outdoor activities"
-            },
-            "very_unhealthy": {
-                "message": "Health warnings of emergency conditions.",
-                "activities": ["Stay indoors", "Avoid all outdoor activities"],
-                "sensitive_groups": "Everyone should avoid outdoor activities"
-            },
-            "hazardous": {
-                "message": "Health alert: everyone may experience serious health effects.",
-                "activities": ["Stay indoors", "Use air purifiers", "Avoid all outdoor activities"],
-                "sensitive_groups": "Emergency conditions - everyone should stay indoors"
-            }
-        }
+        current_data = db.get_latest_location_data("home")
+        
+        if not current_data:
+            return jsonify({"error": "No data available yet"}), 404
         
-        category = current_data["aqi_category"]
+        result = rule_engine.evaluate_one(current_data)
         
         response = {
             "aqi_value": current_data["aqi_value"],
-            "aqi_category": category,
-            "recommendations": recommendations.get(category, recommendations["moderate"])
+            "aqi_category": result["aqi_category"],
+            "recommendations": result["recommendations"]
         }
         
         return jsonify(response)
@@ -257,6 +347,38 @@ def get_health_recommendations():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/aqi/health-recommendations/locations', methods=['GET'])
+def get_locations_health_recommendations():
+    """Recommendations and rule-based insights for every location (or ?locations=home,work) in one pass"""
+    try:
+        requested = request.args.get('locations')
+        location_ids = requested.split(',') if requested else list(LOCATION_MAPPING)
+        invalid = [location_id for location_id in location_ids if location_id not in LOCATION_MAPPING]
+        if invalid:
+            return jsonify({"error": f"Invalid location(s): {', '.join(invalid)}"}), 400
+        
+        latest = {location_id: db.get_latest_location_data(location_id) for location_id in location_ids}
+        available = [location_id for location_id, data in latest.items() if data]
+        results = rule_engine.evaluate(
+            [latest[location_id] for location_id in available],
+            [LOCATION_DISPLAY_NAMES.get(location_id, LOCATION_MAPPING[location_id]) for location_id in available]
+        )
+        
+        locations = {location_id: None for location_id in location_ids}
+        for location_id, result in zip(available, results):
+            data = latest[location_id]
+            locations[location_id] = {
+                "location": LOCATION_MAPPING[location_id],
+                "aqi_value": data["aqi_value"],
+                "reading_time": data["reading_time"],
+                **result
+            }
+        
+        return jsonify({"locations": locations})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/users/profile', methods=['POST'])
 def create_user_profile():
     """Create or update user profile"""
@@ -271,6 +393,7 @@ def create_user_profile():
         success = db.save_user_profile(data.get('userId'), data)
         
         if success:
+            stored = db.get_user_profile(data.get('userId')) or {}
             response = {
                 "message": "User profile saved successfully",
                 "profile": {
@@ -279,8 +402,8 @@ def create_user_profile():
                     "sex": data.get('sex'),
                     "smoking_status": data.get('smoking_status'),
                     "health_conditions": data.get('health_conditions', []),
-                    "created_at": datetime.now().isoformat(),
-                    "updated_at": datetime.now().isoformat()
+                    "created_at": stored.get('created_at'),
+                    "updated_at": stored.get('updated_at')
                 }
             }
             return jsonify(response)
@@ -290,6 +413,29 @@ def create_user_profile():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/users/profiles/import', methods=['POST'])
+def import_user_profiles():
+    """Bulk import user profiles in one transaction"""
+    try:
+        data = request.get_json()
+        profiles = data.get('profiles') if isinstance(data, dict) else data
+        
+        if not isinstance(profiles, list):
+            return jsonify({"error": "Expected a list of profiles or {\"profiles\": [...]}"}), 400
+        
+        result = db.import_user_profiles(profiles)
+        
+        if profiles and not result["imported"]:
+            return jsonify({"error": "No profiles imported: every profile lacks a userId", **result}), 400
+        
+        return jsonify({"message": "User profiles imported", **result})
+    
+    except sqlite3.Error as e:
+        print(f"❌ Error importing user profiles: {e}")
+        return jsonify({"error": f"Database error while importing profiles: {e}"}), 500
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/users/profile/<user_id>', methods=['GET'])
 def get_user_profile(user_id):
     """Get user profile by ID"""
@@ -329,6 +475,149 @@ def get_health_risk(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/users/profile/<user_id>/alerts', methods=['POST'])
+def set_user_alerts(user_id):
+    """Subscribe a user to AQI alerts for their locations"""
+    try:
+        data = request.get_json() or {}
+        
+        # Either {"thresholds": {"home": 75, ...}} or {"locations": [...], "threshold": 75}
+        thresholds = data.get('thresholds')
+        if thresholds is None:
+            threshold = data.get('threshold', DEFAULT_ALERT_THRESHOLD)
+            thresholds = {location_id: threshold for location_id in data.get('locations', [])}
+        
+        invalid = [location_id for location_id in thresholds if location_id not in LOCATION_MAPPING]
+        if invalid:
+            return jsonify({"error": f"Invalid location(s): {', '.join(invalid)}"}), 400
+        
+        try:
+            thresholds = {location_id: float(value) for location_id, value in thresholds.items()}
+        except (TypeError, ValueError):
+            return jsonify({"error": "Thresholds must be numbers"}), 400
+        
+        if not db.save_alert_subscriptions(user_id, thresholds):
+            return jsonify({"error": "Failed to save alert subscriptions"}), 500
+        alert_engine.subscribe(user_id, thresholds)
+        
+        return jsonify({
+            "message": "Alert subscriptions saved",
+            "userId": user_id,
+            "thresholds": thresholds
+        })
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/users/profile/<user_id>/alerts', methods=['GET'])
+def get_user_alerts(user_id):
+    """Get a user's alert subscriptions and most recent alerts"""
+    try:
+        return jsonify({
+            "userId": user_id,
+            "thresholds": alert_engine.subscriptions.get(user_id, {}),
+            "alerts": alert_inbox.get(user_id)
+        })
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/users/profile/<user_id>/schedule', methods=['POST'])
+def set_user_schedule(user_id):
+    """Save where a user spends their week, used for exposure"""
+    try:
+        data = request.get_json() or {}
+        
+        # {"blocks": [{"location": "work", "start": "09:00", "end": "17:00", "days": [0, 1, 2, 3, 4]}]}
+        blocks = []
+        for block in data.get('blocks', []):
+            location_id = block.get('location')
+            if location_id not in LOCATION_MAPPING:
+                return jsonify({"error": f"Invalid location: {location_id}"}), 400
+            try:
+                days = sorted({int(d) for d in block.get('days', range(7))})
+                start_minute = parse_time_of_day(block['start'])
+                end_minute = parse_time_of_day(block['end'])
+            except (KeyError, TypeError, ValueError):
+                return jsonify({"error": "Each block needs start/end as HH:MM and days as 0-6 (0 = Monday)"}), 400
+            if not all(0 <= d <= 6 for d in days) or start_minute == end_minute:
+                return jsonify({"error": "Each block needs start/end as HH:MM and days as 0-6 (0 = Monday)"}), 400
+            blocks.append({
+                "location": location_id,
+                "days": days,
+                "start_minute": start_minute,
+                "end_minute": end_minute % (24 * 60)
+            })
+        
+        if not db.save_user_schedule(user_id, blocks):
+            return jsonify({"error": "Failed to save schedule"}), 500
+        exposure_engine.invalidate_user(user_id)
+        
+        return jsonify({
+            "message": "Schedule saved",
+            "userId": user_id,
+            "blocks": blocks
+        })
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/users/profile/<user_id>/schedule', methods=['GET'])
+def get_user_schedule(user_id):
+    """Get a user's schedule (unscheduled time counts as home)"""
+    try:
+        return jsonify({
+            "userId": user_id,
+            "blocks": db.get_user_schedules([user_id]).get(user_id, [])
+        })
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/users/profile/<user_id>/exposure', methods=['GET'])
+def get_user_exposure(user_id):
+    """Time-weighted exposure per pollutant for ?date= (UTC) and the ?days= before it"""
+    try:
+        try:
+            end_day = parse_exposure_date(request.args.get('date'))
+        except ValueError:
+            return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+        days = max(1, min(request.args.get('days', 1, type=int), MAX_EXPOSURE_DAYS))
+        
+        exposure = [
+            exposure_engine.compute_user(user_id, end_day - timedelta(days=offset))
+            for offset in range(days - 1, -1, -1)
+        ]
+        
+        return jsonify({"userId": user_id, "days": exposure})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/users/exposure', methods=['POST'])
+def get_users_exposure():
+    """Batch exposure for many users on one day: {"user_ids": [...], "date": "YYYY-MM-DD"}"""
+    try:
+        data = request.get_json() or {}
+        user_ids = data.get('user_ids')
+        
+        if not isinstance(user_ids, list) or not user_ids:
+            return jsonify({"error": "user_ids must be a non-empty list"}), 400
+        if len(user_ids) > MAX_EXPOSURE_BATCH:
+            return jsonify({"error": f"At most {MAX_EXPOSURE_BATCH} users per request"}), 400
+        try:
+            day = parse_exposure_date(data.get('date'))
+        except ValueError:
+            return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+        
+        return jsonify({
+            "date": day.isoformat(),
+            "exposure": exposure_engine.compute([str(u) for u in user_ids], day)
+        })
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/location/<location_id>/current', methods=['GET'])
 def get_location_current_data(location_id):
     """Get current air quality data for a specific location"""
@@ -357,10 +646,60 @@ def get_location_history(location_id):
         hours = request.args.get('hours', 24, type=int)
         data = db.get_location_history(location_id, hours)
         
+        return rows_response(request, data, "data", {
+            "location": location_id,
+            "hours": hours
+        })
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/location/<location_id>/rolling', methods=['GET'])
+def get_location_rolling(location_id):
+    """Rolling window series, moving averages and max for a location (from memory)"""
+    try:
+        if location_id not in LOCATION_MAPPING:
+            return jsonify({"error": "Invalid location"}), 400
+        
+        hours = request.args.get('hours', 24, type=int)
+        summary = rolling_windows.summary("location", location_id, hours=hours)
+        
+        if not summary:
+            return jsonify({"error": "No data available for this location"}), 404
+        
+        return jsonify({"location": location_id, "hours": hours, **summary})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/location/<location_id>/forecast', methods=['GET'])
+def get_location_forecast(location_id):
+    """Get the precomputed AQI forecast for the next 1-24 hours"""
+    try:
+        if location_id not in LOCATION_MAPPING:
+            return jsonify({"error": "Invalid location"}), 400
+        
+        hours = max(1, min(request.args.get('hours', FORECAST_HORIZON, type=int), FORECAST_HORIZON))
+        forecast = forecast_service.get(location_id)
+        
+        if not forecast:
+            return jsonify({"error": "No forecast available yet for this location"}), 404
+        
         return jsonify({
             "location": location_id,
             "hours": hours,
-            "data": data
+            "model": forecast["model"],
+            "generated_at": forecast["generated_at"],
+            "training_points": forecast["points"],
+            "mae": forecast["mae"],
+            "forecast": [
+                {
+                    "time": datetime.fromtimestamp(t, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "aqi": round(value),
+                    "aqi_category": get_aqi_category(value)
+                }
+                for t, value in zip(forecast["times"][:hours], forecast["values"][:hours])
+            ]
         })
     
     except Exception as e:
@@ -380,6 +719,24 @@ def get_database_stats():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/database/backups', methods=['GET'])
+def get_database_backups():
+    """List verified snapshots, oldest first"""
+    try:
+        return jsonify({"backups": backup_manager.snapshots(), "interval_seconds": BACKUP_INTERVAL})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/database/backups', methods=['POST'])
+def create_database_backup():
+    """Take a snapshot now (online; writes continue while it runs)"""
+    try:
+        return jsonify({"message": "Backup created", "backup": backup_manager.snapshot()}), 201
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 def generate_air_quality_insight(location_data):
     """Generate custom air quality insights using Ollama with full location data"""
     try:
@@ -439,6 +796,7 @@ Generate insights:"""
             }
         }
         
+        import requests  # deferred: only needed off the request path (insight pre-warming)
         response = requests.post(ollama_url, json=payload, timeout=15)
         
         if response.status_code == 200:
@@ -455,92 +813,68 @@ Generate insights:"""
 
 def generate_fallback_insight(location_data):
     """Generate fallback insights when Ollama is not available"""
-    display_location = location_data.get('location', 'Unknown Location')
-    aqi_value = location_data.get('aqi_value', 0)
-    aqi_category = location_data.get('aqi_category', 'Unknown')
-    primary_pollutant = location_data.get('primary_pollutant', 'Unknown')
-    co = location_data.get('co', 0)
-    pm25 = location_data.get('pm25', 0)
-    temperature = location_data.get('temperature', 0)
-    
-    # Generate insights based on specific pollutants and conditions
-    insights = []
-    
-    # AQI-based general insight
-    if aqi_category == "Good":
-        insights.append(f"Air quality is excellent in {display_location} - perfect for outdoor activities!")
-    elif aqi_category == "Moderate":
-        insights.append(f"Air quality is acceptable in {display_location} - most activities are safe")
-    elif aqi_category == "Unhealthy for Sensitive Groups":
-        insights.append(f"Air quality may affect sensitive groups in {display_location} - limit outdoor time")
-    elif aqi_category == "Unhealthy":
-        insights.append(f"Air quality is unhealthy in {display_location} - stay indoors when possible")
-    elif aqi_category == "Very Unhealthy":
-        insights.append(f"Air quality is very unhealthy in {display_location} - stay indoors")
-    else:
-        insights.append(f"Hazardous air quality in {display_location} - stay indoors immediately")
-    
-    # Specific pollutant insights
-    if co > 2.0:
-        insights.append("High CO levels detected - check for nearby fires or gas leaks")
-    elif co > 1.0:
-        insights.append("Elevated CO levels - avoid areas with heavy traffic")
-    
-    if pm25 > 25:
-        insights.append("High PM2.5 levels - consider wearing a mask outdoors")
-    elif pm25 > 15:
-        insights.append("Moderate PM2.5 levels - sensitive individuals should take precautions")
-    
-    if temperature > 30:
-        insights.append("Hot weather combined with air pollution - stay hydrated and limit outdoor time")
-    elif temperature < 5:
-        insights.append("Cold weather may trap pollutants - check indoor air quality")
-    
-    # Primary pollutant specific advice
-    if primary_pollutant == "PM2.5":
-        insights.append("Fine particles are the main concern - avoid outdoor exercise")
-    elif primary_pollutant == "O3":
-        insights.append("Ozone levels are elevated - avoid outdoor activities during peak hours")
-    elif primary_pollutant == "NO2":
-        insights.append("Nitrogen dioxide from traffic - avoid busy roads")
-    
-    # Return 2-3 insights
-    return "\n".join(insights[:3])
+    return rule_engine.evaluate_one(location_data)["insight"]
+
+# Display names used in insight text
+LOCATION_DISPLAY_NAMES = {
+    'home': 'your home area',
+    'work': 'your work area', 
+    'football': 'your football center area',
+    'studio': 'your studio area',
+    'daycare': 'your daycare area'
+}
+
+def insight_payload(location_id, data, insight):
+    return {
+        "location": LOCATION_MAPPING[location_id],
+        "aqi_value": data['aqi_value'],
+        "aqi_category": data['aqi_category'],
+        "primary_pollutant": data['primary_pollutant'],
+        "insight": insight,
+        "reading_time": data['reading_time'],
+        "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "full_data": data  # Include full data for debugging
+    }
+
+def latest_insight_data(location_id):
+    """Latest reading for a location, labelled with its display name"""
+    data = db.get_latest_location_data(location_id)
+    if data:
+        data['location'] = LOCATION_DISPLAY_NAMES.get(location_id, LOCATION_MAPPING[location_id])
+    return data
+
+def build_location_insight(location_id):
+    """Generate (slowly, via the LLM) the insight payload for a location's latest reading"""
+    data = latest_insight_data(location_id)
+    if not data:
+        return None
+    return insight_payload(location_id, data, generate_air_quality_insight(data))
+
+# Insights are regenerated in the background after every ingest batch, busiest locations first
+insight_prewarmer = InsightPrewarmer(build_location_insight, list(LOCATION_MAPPING))
+db.add_batch_listener(insight_prewarmer.enqueue_all)
 
 @app.route('/api/insights/<location_id>', methods=['GET'])
 def get_location_insights(location_id):
-    """Get AI-generated insights for a specific location"""
+    """Get AI-generated insights for a specific location (served from the pre-warmed store)"""
     try:
         if location_id not in LOCATION_MAPPING:
             return jsonify({"error": "Invalid location"}), 400
         
-        # Get current data for the location
-        data = db.get_latest_location_data(location_id)
+        insight_prewarmer.record_request(location_id)
+        warm = insight_prewarmer.store.get(location_id)
+        if warm:
+            return jsonify({**warm, "source": "prewarmed"})
+        
+        # Nothing generated yet (e.g. right after startup): answer with the rule-based
+        # insight now; the request above already raised this location's queue priority
+        data = latest_insight_data(location_id)
         
         if not data:
             return jsonify({"error": "No data available for this location"}), 404
         
-        # Add location name to the data (use display name for user-friendly output)
-        location_display_names = {
-            'home': 'your home area',
-            'work': 'your work area', 
-            'football': 'your football center area',
-            'studio': 'your studio area',
-            'daycare': 'your daycare area'
-        }
-        data['location'] = location_display_names.get(location_id, LOCATION_MAPPING[location_id])
-        
-        # Generate insight using full location data
-        insight = generate_air_quality_insight(data)
-        
-        return jsonify({
-            "location": LOCATION_MAPPING[location_id],
-            "aqi_value": data['aqi_value'],
-            "aqi_category": data['aqi_category'],
-            "primary_pollutant": data['primary_pollutant'],
-            "insight": insight,
-            "full_data": data  # Include full data for debugging
-        })
+        insight_prewarmer.enqueue(location_id)
+        return jsonify({**insight_payload(location_id, data, generate_fallback_insight(data)), "source": "fallback"})
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -555,18 +889,56 @@ def root():
             "health": "/health",
             "currentNYC": "/api/aqi/nyc/current",
             "stationsNYC": "/api/aqi/nyc/stations",
+            "gridNYC": "/api/aqi/nyc/grid",
+            "anomalies": "/api/anomalies",
+            "healthRecommendations": "/api/aqi/health-recommendations",
+            "locationsHealthRecommendations": "/api/aqi/health-recommendations/locations",
             "locationCurrent": "/api/location/:locationId/current",
             "locationHistory": "/api/location/:locationId/history",
+            "locationRolling": "/api/location/:locationId/rolling",
+            "locationForecast": "/api/location/:locationId/forecast",
             "locationInsights": "/api/insights/:locationId",
             "userProfile": "/api/users/profile",
+            "userProfileImport": "/api/users/profiles/import",
             "healthRisk": "/api/users/profile/:userId/health-risk",
-            "databaseStats": "/api/database/stats"
+            "userAlerts": "/api/users/profile/:userId/alerts",
+            "userSchedule": "/api/users/profile/:userId/schedule",
+            "userExposure": "/api/users/profile/:userId/exposure",
+            "usersExposure": "/api/users/exposure",
+            "databaseStats": "/api/database/stats",
+            "databaseBackups": "/api/database/backups"
         },
         "locations": list(LOCATION_MAPPING.keys()),
         "documentation": "Python Flask backend for AirWatch with SQLite database"
     })
 
+_services_started = False
+_services_lock = threading.Lock()
+
+def start_background_services():
+    """Start ingestion, alerts, forecasts, insight pre-warming and backups once per process.
+
+    Runs from the __main__ block, or on the first request under servers
+    that import the app (WSGI, flask run); deployments can also call it
+    from a post-fork hook. Forecast workers are already forked at import.
+    """
+    global _services_started
+    if _services_started:
+        return
+    with _services_lock:
+        if _services_started:
+            return
+        alert_engine.start()
+        forecast_service.request_refresh()
+        insight_prewarmer.enqueue_all()
+        insight_prewarmer.start()
+        ingestion_poller.start()
+        if BACKUP_INTERVAL > 0:
+            backup_manager.start(BACKUP_INTERVAL)
+        _services_started = True
+
 if __name__ == '__main__':
+    debug = True
     print("🚀 Starting AirWatch Python Backend...")
     print("📊 Environment: development")
     print(f"🌍 NYC Coordinates: {NYC_LAT}, {NYC_LON}")
@@ -576,6 +948,12 @@ if __name__ == '__main__':
     print("   GET  /api/aqi/nyc/stations - NYC monitoring stations")
     print("   POST /api/users/profile - Create/update user profile")
     print("   GET  /api/users/profile/:userId - Get user profile")
+    print("   POST /api/users/profiles/import - Bulk import user profiles")
+    print(f"\n📥 Ingestion sources: {INGEST_SOURCES} (every {INGEST_INTERVAL:g}s)")
     print("\n🌐 Server URL: http://localhost:5000")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # The debug reloader's parent only watches files; its serving child starts the services
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_services()
+    
+    app.run(debug=debug, host='0.0.0.0', port=5000)
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Online Backups
+Verified snapshots of the main database and its monthly partitions, taken
+while the app keeps writing, plus an archive of the ingest batches committed
+since, for point-in-time restore
+
+Usage: python backup.py snapshot | list | verify <name> | restore <name|latest|ISO time> <target_dir>
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import stat
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from migrations import schema_version
+from partitions import MAX_ATTACHED
+
+SNAPSHOT_TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+MANIFEST_NAME = "manifest.json"
+# Archive segments hold one hour of committed batches each
+SEGMENT_TIME_FORMAT = "%Y%m%dT%H"
+
+
+def file_checksum(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pinned_reader(paths: List[str]) -> Tuple[sqlite3.Connection, List[str]]:
+    """Read-only connection with `paths` open under one read transaction; returns it and their schema names.
+
+    In WAL mode the transaction pins a single point in time across all the
+    files, so copies taken through it are mutually consistent while
+    concurrent commits neither wait for them nor restart them.
+    """
+    conn = sqlite3.connect(f"file:{os.path.abspath(paths[0])}?mode=ro", uri=True)
+    schemas = ["main"]
+    for i, path in enumerate(paths[1:]):
+        schemas.append(f"src{i}")
+        conn.execute(f"ATTACH DATABASE ? AS {schemas[-1]}", (f"file:{os.path.abspath(path)}?mode=ro",))
+    conn.execute("BEGIN")
+    for schema in schemas:
+        conn.execute(f"SELECT COUNT(*) FROM {schema}.sqlite_master").fetchone()
+    return conn, schemas
+
+
+def online_copy(source: sqlite3.Connection, schema: str, target_path: str, pages: int = 256,
+                pause: float = 0.0) -> int:
+    """Copy one database of a live connection with the backup API; returns the pages copied.
+
+    Copying `pages` at a time, with an optional pause between steps, bounds
+    the I/O burst each step causes.
+    """
+    target = sqlite3.connect(target_path)
+    copied = 0
+
+    def progress(status, remaining, total):
+        nonlocal copied
+        copied = total - remaining
+        if pause and remaining:
+            time.sleep(pause)
+
+    try:
+        source.backup(target, pages=pages, progress=progress, name=schema)
+        # Snapshots are single self-contained files
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+    return copied
+
+
+def integrity_error(path: str) -> Optional[str]:
+    """None when SQLite's integrity check passes, else its first complaint"""
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        result = str(e)
+    finally:
+        conn.close()
+    return None if result == "ok" else result
+
+
+class BatchArchive:
+    """Append-only log of committed ingest batches, in hourly JSON-lines segments.
+
+    SQLite has no log shipping, and a WAL file is reset at every checkpoint,
+    so the archive records the batches themselves (as an ingest batch
+    listener) rather than WAL frames. Replaying the batches committed after
+    a snapshot, up to a chosen time, rebuilds the readings as of that time;
+    writes are idempotent upserts, so replaying a batch the snapshot
+    already holds is harmless.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, readings: List[Dict]):
+        """Record a committed batch (register with db.add_batch_listener)"""
+        if not readings:
+            return
+        committed_at = datetime.now(timezone.utc)
+        line = json.dumps({"committed_at": committed_at.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), "readings": readings})
+        path = os.path.join(self.directory, f"{committed_at.strftime(SEGMENT_TIME_FORMAT)}.jsonl")
+        with self.lock:
+            with open(path, "a") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def segments(self) -> List[str]:
+        """Segment names (UTC hour), oldest first"""
+        return sorted(name[:-6] for name in os.listdir(self.directory) if name.endswith(".jsonl"))
+
+    def batches(self, since: str, until: str):
+        """Yield the readings of each batch committed at since <= time <= until (ISO, 'Z' suffix)"""
+        since_segment, until_segment = since[:13].replace("-", ""), until[:13].replace("-", "")
+        for segment in self.segments():
+            if not since_segment <= segment <= until_segment:
+                continue
+            with open(os.path.join(self.directory, f"{segment}.jsonl")) as f:
+                for line in f:
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line of a crashed append
+                    # Second resolution on both sides: a batch from the snapshot's own second is replayed
+                    if since[:19] <= batch["committed_at"][:19] <= until[:19]:
+                        yield batch["readings"]
+
+    def prune(self, before: str):
+        """Delete segments that end before an ISO time"""
+        cutoff = before[:13].replace("-", "")
+        for segment in self.segments():
+            if segment < cutoff:
+                os.remove(os.path.join(self.directory, f"{segment}.jsonl"))
+
+
+class BackupManager:
+    """Verified point-in-time snapshots of an AirQualityDatabase.
+
+    A snapshot is a directory named by its UTC creation time holding a copy
+    of the main file and every partition plus a manifest (sizes, checksums,
+    schema version). Live files are copied with the backup API through one
+    pinned read transaction, so they agree with each other. Frozen
+    partitions never change, so they are copied once and hard-linked into
+    later snapshots, making each snapshot incremental in the months that
+    are still written. Every new copy is integrity-checked before the
+    snapshot is renamed into place, so only verified snapshots are listed.
+    Restoring to a point in time starts from the newest snapshot at or
+    before it and replays the archived batches committed up to that time.
+    """
+
+    def __init__(self, db, directory: str, pages_per_step: int = 256, step_pause: float = 0.001,
+                 keep: int = 24):
+        self.db = db
+        self.directory = directory
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        os.makedirs(directory, exist_ok=True)
+        self.archive = BatchArchive(os.path.join(directory, "archive"))
+
+    def _sources(self) -> List[Dict]:
+        """Files making up the database: (snapshot-relative name, path, frozen)"""
+        sources = [{"name": os.path.basename(self.db.db_path), "path": self.db.db_path, "frozen": False}]
+        partitions = self.db.partitions
+        for month in partitions.months():
+            path = partitions.path(month)
+            sources.append({
+                "name": os.path.join("partitions", os.path.basename(path)),
+                "path": path,
+                "frozen": partitions.is_frozen(month)
+            })
+        return sources
+
+    def snapshots(self) -> List[Dict]:
+        """Manifests of all published snapshots, oldest first"""
+        manifests = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name, MANIFEST_NAME)
+            if not name.endswith(".partial") and os.path.exists(path):
+                with open(path) as f:
+                    manifests.append(json.load(f))
+        return manifests
+
+    def snapshot(self) -> Dict:
+        """Take, verify and publish a snapshot; returns its manifest"""
+        with self.lock:
+            started = time.perf_counter()
+            created_at = datetime.now(timezone.utc)
+            name = created_at.strftime(SNAPSHOT_TIME_FORMAT)
+            final_dir = os.path.join(self.directory, name)
+            if os.path.exists(final_dir):
+                raise FileExistsError(f"Snapshot {name} already exists")
+            work_dir = f"{final_dir}.partial"
+            shutil.rmtree(work_dir, ignore_errors=True)
+            os.makedirs(os.path.join(work_dir, "partitions"))
+
+            previous = self.snapshots()
+            previous_files = {entry["name"]: (previous[-1]["name"], entry) for entry in previous[-1]["files"]} \
+                if previous else {}
+
+            files, copied_bytes = [], 0
+            sources = self._sources()
+            live = [source for source in sources if not source["frozen"]]
+            try:
+                # Live files are copied through pinned readers, MAX_ATTACHED + 1 files at a time
+                for start in range(0, len(live), MAX_ATTACHED + 1):
+                    group = live[start:start + MAX_ATTACHED + 1]
+                    reader, schemas = pinned_reader([source["path"] for source in group])
+                    try:
+                        for source, schema in zip(group, schemas):
+                            source["stat"] = os.stat(source["path"])
+                            online_copy(reader, schema, os.path.join(work_dir, source["name"]),
+                                        self.pages_per_step, self.step_pause)
+                    finally:
+                        reader.close()
+
+                for source in sources:
+                    target = os.path.join(work_dir, source["name"])
+                    source_stat = source.get("stat") or os.stat(source["path"])
+                    entry = {
+                        "name": source["name"],
+                        "frozen": source["frozen"],
+                        "source_mtime_ns": source_stat.st_mtime_ns,
+                        "source_size": source_stat.st_size
+                    }
+                    earlier = previous_files.get(source["name"])
+                    if (source["frozen"] and earlier and earlier[1]["frozen"]
+                            and earlier[1]["source_mtime_ns"] == entry["source_mtime_ns"]
+                            and earlier[1]["source_size"] == entry["source_size"]):
+                        earlier_path = os.path.join(self.directory, earlier[0], source["name"])
+                        try:
+                            os.link(earlier_path, target)
+                        except OSError:
+                            shutil.copyfile(earlier_path, target)
+                        entry.update(size=earlier[1]["size"], sha256=earlier[1]["sha256"], reused=True)
+                    else:
+                        if source["frozen"]:
+                            shutil.copyfile(source["path"], target)
+                        error = integrity_error(target)
+                        if error:
+                            raise ValueError(f"{source['name']} failed verification: {error}")
+                        entry.update(size=os.path.getsize(target), sha256=file_checksum(target), reused=False)
+                        copied_bytes += entry["size"]
+                    files.append(entry)
+
+                main_copy = sqlite3.connect(os.path.join(work_dir, files[0]["name"]))
+                version = schema_version(main_copy)
+                main_copy.close()
+                manifest = {
+                    "name": name,
+                    "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "schema_version": version,
+                    "files": files,
+                    "copied_bytes": copied_bytes,
+                    "seconds": round(time.perf_counter() - started, 3)
+                }
+                with open(os.path.join(work_dir, MANIFEST_NAME), "w") as f:
+                    json.dump(manifest, f, indent=2)
+                os.rename(work_dir, final_dir)
+            except Exception:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                raise
+
+            self.prune()
+            return manifest
+
+    def verify(self, name: str) -> Dict:
+        """Re-check a published snapshot's checksums and SQLite integrity"""
+        snapshot_dir = os.path.join(self.directory, name)
+        with open(os.path.join(snapshot_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        problems = []
+        for entry in manifest["files"]:
+            path = os.path.join(snapshot_dir, entry["name"])
+            if not os.path.exists(path):
+                problems.append(f"{entry['name']}: missing")
+            elif file_checksum(path) != entry["sha256"]:
+                problems.append(f"{entry['name']}: checksum mismatch")
+            else:
+                error = integrity_error(path)
+                if error:
+                    problems.append(f"{entry['name']}: {error}")
+        return {"name": name, "ok": not problems, "problems": problems}
+
+    def snapshot_at(self, at: str) -> Optional[Dict]:
+        """Newest snapshot created at or before an ISO time ('latest' for the newest)"""
+        snapshots = self.snapshots()
+        if at == "latest":
+            return snapshots[-1] if snapshots else None
+        for manifest in reversed(snapshots):
+            if manifest["created_at"] <= at:
+                return manifest
+        return None
+
+    def restore(self, name: str, target_dir: str) -> str:
+        """Write a verified copy of a snapshot into an empty directory; returns the main file's path.
+
+        The live database is never overwritten: stop the app and swap the
+        restored files in, or point AirQualityDatabase at them.
+        """
+        if os.path.exists(target_dir) and os.listdir(target_dir):
+            raise FileExistsError(f"Restore target {target_dir} is not empty")
+        result = self.verify(name)
+        if not result["ok"]:
+            raise ValueError(f"Snapshot {name} failed verification: {'; '.join(result['problems'])}")
+
+        snapshot_dir = os.path.join(self.directory, name)
+        with open(os.path.join(snapshot_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        os.makedirs(os.path.join(target_dir, "partitions"), exist_ok=True)
+        for entry in manifest["files"]:
+            target = os.path.join(target_dir, entry["name"])
+            shutil.copyfile(os.path.join(snapshot_dir, entry["name"]), target)
+            if entry["frozen"]:
+                os.chmod(target, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        return os.path.join(target_dir, manifest["files"][0]["name"])
+
+    def restore_to(self, at: str, target_dir: str) -> Tuple[str, Dict, int]:
+        """Restore the database as of an ISO time: the snapshot before it plus archived batches up to it.
+
+        Returns (main file path, snapshot manifest, batches replayed).
+        """
+        from database import AirQualityDatabase
+
+        manifest = self.snapshot_at(at)
+        if not manifest:
+            raise ValueError(f"No snapshot at or before {at}")
+        path = self.restore(manifest["name"], target_dir)
+        replayed = 0
+        restored = AirQualityDatabase(path)
+        for readings in self.archive.batches(manifest["created_at"], at):
+            if not restored.save_ingest_batch(readings):
+                raise ValueError(f"Replaying archived batch {replayed + 1} failed")
+            replayed += 1
+        return path, manifest, replayed
+
+    def prune(self):
+        """Delete all but the newest `keep` snapshots (hard-linked files survive in later ones),
+        and archive segments older than the oldest snapshot kept"""
+        snapshots = self.snapshots()
+        for manifest in snapshots[:-self.keep]:
+            shutil.rmtree(os.path.join(self.directory, manifest["name"]), ignore_errors=True)
+        kept = snapshots[-self.keep:]
+        if kept:
+            self.archive.prune(kept[0]["created_at"])
+
+    def _loop(self, interval: float):
+        while not self.stop_event.wait(interval):
+            try:
+                manifest = self.snapshot()
+                print(f"💾 Backup {manifest['name']}: {manifest['copied_bytes'] / 1e6:.1f} MB copied "
+                      f"in {manifest['seconds']:.1f}s")
+            except Exception as e:
+                print(f"❌ Backup failed: {e}")
+
+    def start(self, interval: float):
+        """Take a snapshot every `interval` seconds on a background thread"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, args=(interval,), name="backup", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 5):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+
+if __name__ == "__main__":
+    from database import AirQualityDatabase
+
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    manager = BackupManager(AirQualityDatabase(), os.environ.get("BACKUP_DIR", "backups"))
+    command = sys.argv[1]
+    if command == "snapshot":
+        manifest = manager.snapshot()
+        reused = sum(1 for entry in manifest["files"] if entry["reused"])
+        print(f"💾 Snapshot {manifest['name']}: {len(manifest['files'])} files ({reused} reused), "
+              f"{manifest['copied_bytes'] / 1e6:.1f} MB copied in {manifest['seconds']:.2f}s")
+    elif command == "list":
+        for manifest in manager.snapshots():
+            size = sum(entry["size"] for entry in manifest["files"])
+            print(f"   {manifest['name']}  {manifest['created_at']}  schema v{manifest['schema_version']}  "
+                  f"{len(manifest['files'])} files  {size / 1e6:.1f} MB")
+    elif command == "verify":
+        result = manager.verify(sys.argv[2])
+        print(f"{'✅' if result['ok'] else '❌'} {result['name']}")
+        for problem in result["problems"]:
+            print(f"   {problem}")
+        sys.exit(0 if result["ok"] else 1)
+    elif command == "restore":
+        if "-" in sys.argv[2]:
+            try:
+                path, manifest, replayed = manager.restore_to(sys.argv[2], sys.argv[3])
+            except ValueError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            print(f"✅ Restored snapshot {manifest['name']} plus {replayed} archived batches to {path}")
+            sys.exit(0)
+        manifest = manager.snapshot_at("latest") if sys.argv[2] == "latest" else {"name": sys.argv[2]}
+        if not manifest:
+            print("❌ No snapshots yet")
+            sys.exit(1)
+        path = manager.restore(manifest["name"], sys.argv[3])
+        print(f"✅ Restored snapshot {manifest['name']} to {path}")
+    else:
+        print(__doc__)
+        sys.exit(1)
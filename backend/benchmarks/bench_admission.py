@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Admission Control Benchmark
+Tail latency of a cheap endpoint while slow endpoints saturate a fixed
+worker pool, with and without admission control
+
+Usage: python benchmarks/bench_admission.py [seconds]
+"""
+
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from flask import Flask, g, jsonify, request
+
+from admission import AdmissionController, ClientRateLimiter
+
+WORKER_THREADS = 8      # like a WSGI server with a bounded thread pool
+SLOW_CLIENTS = 24       # clients hammering the slow endpoint
+FAST_CLIENTS = 4        # clients polling the cheap endpoint
+SLOW_SECONDS = 0.2      # stand-in for an LLM call
+
+
+def build_app(admission):
+    app = Flask(__name__)
+    workers = threading.BoundedSemaphore(WORKER_THREADS)
+    wsgi_app = app.wsgi_app
+
+    def pooled(environ, start_response):
+        with workers:
+            return wsgi_app(environ, start_response)
+    app.wsgi_app = pooled
+
+    if admission:
+        @app.before_request
+        def admit_request():
+            rejection = admission.admit(request.endpoint, request.remote_addr or "unknown")
+            if rejection:
+                status, retry_after, reason = rejection
+                response = jsonify({"error": reason})
+                response.headers["Retry-After"] = str(retry_after)
+                return response, status
+            g.admitted_at = time.perf_counter()
+
+        @app.teardown_request
+        def release_request(error=None):
+            admitted_at = g.pop("admitted_at", None)
+            if admitted_at is not None:
+                admission.release(request.endpoint, time.perf_counter() - admitted_at)
+
+    @app.route("/current")
+    def current():
+        return jsonify({"aqi": 42})
+
+    @app.route("/insight")
+    def insight():
+        time.sleep(SLOW_SECONDS)
+        return jsonify({"insight": "..."})
+
+    return app
+
+
+def run(app, seconds):
+    stop = time.monotonic() + seconds
+    fast_latencies, slow_statuses = [], []
+
+    def client(path, sink, record):
+        test_client = app.test_client()
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            response = test_client.get(path)
+            sink.append(record(response, time.perf_counter() - started))
+            # Pollers pause between requests; shed clients back off briefly
+            if path == "/current" or response.status_code != 200:
+                time.sleep(0.005 if path == "/current" else 0.05)
+
+    threads = [threading.Thread(target=client, args=("/insight", slow_statuses, lambda r, t: r.status_code))
+               for _ in range(SLOW_CLIENTS)]
+    threads += [threading.Thread(target=client, args=("/current", fast_latencies, lambda r, t: t))
+                for _ in range(FAST_CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return fast_latencies, slow_statuses
+
+
+def report(label, fast_latencies, slow_statuses):
+    ordered = sorted(fast_latencies)
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    served = sum(1 for status in slow_statuses if status == 200)
+    print(f"   {label:<20} current p50 {statistics.median(ordered) * 1000:7.1f} ms  "
+          f"p99 {p99 * 1000:7.1f} ms  max {ordered[-1] * 1000:7.1f} ms  "
+          f"({len(ordered)} served) | insight served {served}, shed {len(slow_statuses) - served}")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print(f"🚦 {WORKER_THREADS} worker threads, {SLOW_CLIENTS} clients on a {SLOW_SECONDS * 1000:.0f} ms endpoint, "
+          f"{FAST_CLIENTS} polling a cheap one, {seconds:g}s each")
+    report("no admission", *run(build_app(None), seconds))
+    admission = AdmissionController(
+        {"critical": (0, 4, 16, 1.0), "low": (2, 3, 3, 0.0)},
+        {"current": "critical", "insight": "low"}, default_class="low"
+    )
+    report("admission control", *run(build_app(admission), seconds))
+
+    # Token bucket: a client far over its rate is cut off after the burst
+    limiter = ClientRateLimiter(rate=20, burst=40)
+    started = time.perf_counter()
+    greedy = sum(1 for _ in range(10000) if not limiter.take("greedy"))
+    elapsed = time.perf_counter() - started
+    print(f"\n🪣 Token bucket: 10000 back-to-back requests from one client, {greedy} admitted "
+          f"({elapsed / 10000 * 1e6:.2f} µs per check)")
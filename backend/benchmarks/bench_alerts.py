@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Alert Engine Benchmark
+Evaluate readings against 100k simulated users and compare with a naive scan
+
+Usage: python benchmarks/bench_alerts.py [users] [readings]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from alerts import AlertEngine
+from database import LOCATION_MAPPING
+
+
+def simulate_subscriptions(num_users):
+    """Each user watches 1-5 locations with a threshold between 40 and 200"""
+    locations = list(LOCATION_MAPPING)
+    return {
+        f"user_{i}": {
+            location_id: random.choice(range(40, 201, 5))
+            for location_id in random.sample(locations, random.randint(1, len(locations)))
+        }
+        for i in range(num_users)
+    }
+
+
+def naive_evaluate(subscriptions, active, previous, location_id, aqi_value, hysteresis):
+    """O(users) reference: check every user on every reading"""
+    alerts = 0
+    for user_id, thresholds in subscriptions.items():
+        threshold = thresholds.get(location_id)
+        if threshold is None:
+            continue
+        key = (location_id, user_id)
+        if aqi_value >= threshold and key not in active:
+            active.add(key)
+            alerts += 1
+        elif aqi_value < threshold - hysteresis:
+            active.discard(key)
+    return alerts
+
+
+def random_walk(num_readings):
+    locations = list(LOCATION_MAPPING)
+    aqi = {location_id: 80.0 for location_id in locations}
+    for _ in range(num_readings):
+        location_id = random.choice(locations)
+        aqi[location_id] = min(300.0, max(0.0, aqi[location_id] + random.gauss(0, 4)))
+        yield location_id, round(aqi[location_id])
+
+
+if __name__ == "__main__":
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    num_readings = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    random.seed(42)
+
+    print(f"🔔 Alert engine benchmark: {num_users} users, {num_readings} readings")
+    subscriptions = simulate_subscriptions(num_users)
+    readings = list(random_walk(num_readings))
+
+    engine = AlertEngine(hysteresis=5, queue_size=num_users * len(LOCATION_MAPPING))
+    started = time.perf_counter()
+    for user_id, thresholds in subscriptions.items():
+        engine.subscribe(user_id, thresholds)
+    print(f"   Index build: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    indexed_alerts = sum(len(engine.evaluate(location_id, aqi)) for location_id, aqi in readings)
+    indexed_elapsed = time.perf_counter() - started
+
+    naive_readings = readings[:max(1, num_readings // 10)]
+    active, previous = set(), {}
+    started = time.perf_counter()
+    for location_id, aqi in naive_readings:
+        naive_evaluate(subscriptions, active, previous, location_id, aqi, 5)
+    naive_elapsed = time.perf_counter() - started
+
+    indexed_us = indexed_elapsed / num_readings * 1e6
+    naive_us = naive_elapsed / len(naive_readings) * 1e6
+    print(f"   Indexed: {indexed_us:10.1f} µs/reading ({indexed_alerts} alerts)")
+    print(f"   Naive:   {naive_us:10.1f} µs/reading (over {len(naive_readings)} readings)")
+    print(f"   Speedup: {naive_us / indexed_us:.1f}x")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Anomaly Detector Benchmark
+Measure the per-reading cost the detector adds to the write path
+
+Usage: python benchmarks/bench_anomaly.py [readings]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from anomaly import AnomalyDetector
+from ingestion import NYC_STATIONS
+
+
+def synthetic_reading(spike=False):
+    reading = {
+        "aqi_value": random.randint(40, 120),
+        "pm25": random.uniform(10, 30),
+        "pm10": random.uniform(15, 40),
+        "o3": random.uniform(20, 60),
+        "no2": random.uniform(10, 35),
+        "so2": random.uniform(5, 15),
+        "co": random.uniform(0.5, 2.0),
+        "temperature": random.uniform(15, 25),
+        "humidity": random.uniform(50, 80)
+    }
+    if spike:
+        reading["pm25"] = 400.0
+    return reading
+
+
+if __name__ == "__main__":
+    num_readings = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    random.seed(42)
+    station_ids = [station["id"] for station in NYC_STATIONS]
+    detector = AnomalyDetector()
+
+    readings = [
+        (station_ids[i % len(station_ids)], synthetic_reading(spike=random.random() < 0.001))
+        for i in range(num_readings)
+    ]
+
+    print(f"🔎 Anomaly detector benchmark: {num_readings} readings over {len(station_ids)} stations")
+    flagged = quarantined = 0
+    started = time.perf_counter()
+    for station_id, reading in readings:
+        flags, quarantine = detector.screen("station", station_id, reading)
+        flagged += bool(flags)
+        quarantined += quarantine
+    elapsed = time.perf_counter() - started
+
+    print(f"   {elapsed / num_readings * 1e6:.1f} µs per reading ({len(detector.fields)} fields)")
+    print(f"   {flagged} readings flagged, {quarantined} quarantined")
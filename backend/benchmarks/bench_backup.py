@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Backup Benchmark
+Ingest throughput and commit latency with and without online snapshots
+running alongside, plus snapshot throughput
+
+Usage: python benchmarks/bench_backup.py [history_days] [seconds]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backup import BackupManager
+from database import AirQualityDatabase
+from ingestion import MockStationSource
+
+SOURCE = MockStationSource()
+
+
+def batch_at(reading_time):
+    """One reading per station, normalized like the ingestion poller does"""
+    readings = []
+    for raw in SOURCE.fetch():
+        raw["reading_time"] = reading_time
+        readings.append(SOURCE.normalize(raw))
+    return readings
+
+
+def write_load(db, start, seconds, stop_event=None):
+    """Save one batch per simulated minute as fast as possible -> commit latencies"""
+    latencies = []
+    reading_time = start
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        reading_time += timedelta(minutes=1)
+        batch = batch_at(reading_time)
+        started = time.perf_counter()
+        db.save_ingest_batch(batch)
+        latencies.append(time.perf_counter() - started)
+    if stop_event:
+        stop_event.set()
+    return latencies, reading_time
+
+
+def report(label, latencies, seconds):
+    ordered = sorted(latencies)
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    print(f"   {label:<22} {len(ordered) / seconds:7.0f} batches/s  "
+          f"p50 {statistics.median(ordered) * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms  "
+          f"max {ordered[-1] * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    history_days = int(sys.argv[1]) if len(sys.argv) > 1 else 90
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db = AirQualityDatabase(os.path.join(workdir, "air_quality.db"))
+        backups = BackupManager(db, os.path.join(workdir, "backups"))
+
+        # History every 10 minutes, one transaction per day; older months freeze as new ones appear
+        now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        reading_time = now - timedelta(days=history_days)
+        started = time.perf_counter()
+        while reading_time < now:
+            day = []
+            for _ in range(144):
+                day.extend(batch_at(reading_time))
+                reading_time += timedelta(minutes=10)
+            db.save_ingest_batch(day)
+        months = db.partitions.months()
+        frozen = sum(1 for month in months if db.partitions.is_frozen(month))
+        print(f"📦 {history_days} days of history in {len(months)} partitions ({frozen} frozen) "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        print(f"\n💾 Ingest for {seconds:g}s each")
+        latencies, reading_time = write_load(db, reading_time, seconds)
+        report("no backup", latencies, seconds)
+
+        snapshots = []
+        stop_event = threading.Event()
+
+        def backup_loop():
+            while not stop_event.is_set():
+                snapshots.append(backups.snapshot())
+                time.sleep(1.0)  # snapshot names have one-second resolution
+
+        backup_thread = threading.Thread(target=backup_loop)
+        backup_thread.start()
+        latencies, reading_time = write_load(db, reading_time, seconds, stop_event)
+        backup_thread.join()
+        report("during snapshots", latencies, seconds)
+
+        copied = sum(manifest["copied_bytes"] for manifest in snapshots)
+        busy = sum(manifest["seconds"] for manifest in snapshots)
+        reused = sum(entry["reused"] for manifest in snapshots for entry in manifest["files"])
+        total_files = sum(len(manifest["files"]) for manifest in snapshots)
+        print(f"\n📸 {len(snapshots)} snapshots, {copied / 1e6:.1f} MB copied at {copied / 1e6 / busy:.1f} MB/s "
+              f"(incl. verification), {reused}/{total_files} files hard-linked from earlier snapshots")
+        result = backups.verify(snapshots[-1]["name"])
+        print(f"   verify {result['name']}: {'ok' if result['ok'] else result['problems']}")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Cold Storage Benchmark
+Size of frozen partitions and cost of a history range scan with readings
+packed into compressed cold blocks vs plain rows
+
+Usage: python benchmarks/bench_coldstore.py [history_days]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from coldstore import decode_block, encode_block
+from database import AirQualityDatabase
+from ingestion import MockStationSource, NYC_STATIONS
+
+SOURCE = MockStationSource()
+
+
+def batch_at(reading_time):
+    readings = []
+    for raw in SOURCE.fetch():
+        raw["reading_time"] = reading_time
+        readings.append(SOURCE.normalize(raw))
+    return readings
+
+
+def timed(fn, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat, result
+
+
+if __name__ == "__main__":
+    history_days = int(sys.argv[1]) if len(sys.argv) > 1 else 75
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Same readings into two databases: one freezes (and cold-encodes) all but the
+        # current month, the other keeps every month as plain rows
+        cold = AirQualityDatabase(os.path.join(workdir, "cold.db"), writable_months=1)
+        plain = AirQualityDatabase(os.path.join(workdir, "plain.db"),
+                                   partition_dir=os.path.join(workdir, "plain_partitions"), writable_months=120)
+        now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        reading_time = now - timedelta(days=history_days)
+        while reading_time < now:
+            day = []
+            for _ in range(144):
+                day.extend(batch_at(reading_time))
+                reading_time += timedelta(minutes=10)
+            cold.save_ingest_batch(day)
+            plain.save_ingest_batch(day)
+
+        frozen = [month for month in cold.partitions.months() if cold.partitions.is_frozen(month)]
+        cold_bytes = sum(os.path.getsize(cold.partitions.path(month)) for month in frozen)
+        plain_bytes = sum(os.path.getsize(plain.partitions.path(month)) for month in frozen)
+        print(f"\n🧊 {len(frozen)} frozen months: {plain_bytes / 1e6:.1f} MB as rows -> "
+              f"{cold_bytes / 1e6:.1f} MB as cold blocks ({plain_bytes / cold_bytes:.1f}x smaller)")
+
+        # Codec on its own: one station-day block
+        month = frozen[-1]
+        conn = sqlite3.connect(plain.partitions.path(month))
+        cursor = conn.execute("SELECT * FROM nyc_station_readings WHERE station_id = ? AND reading_time LIKE ?",
+                              (NYC_STATIONS[0]["id"], f"{month[:4]}-{month[5:]}-10%"))
+        columns, rows = [description[0] for description in cursor.description], cursor.fetchall()
+        conn.close()
+        encode_seconds, payload = timed(lambda: encode_block(columns, rows))
+        decode_seconds, _ = timed(lambda: decode_block(payload))
+        print(f"📦 One station-day block: {len(rows)} rows, {len(payload)} bytes "
+              f"({len(payload) / len(rows):.1f} B/row), encode {encode_seconds * 1000:.2f} ms, "
+              f"decode {decode_seconds * 1000:.2f} ms")
+
+        # A week of one station's history inside a frozen month
+        since = f"{month[:4]}-{month[5:]}-08T00:00:00Z"
+        until = f"{month[:4]}-{month[5:]}-14T23:59:59Z"
+        station_id = NYC_STATIONS[0]["id"]
+        conn = sqlite3.connect(cold.partitions.path(month))
+        block_bytes = conn.execute("""
+            SELECT SUM(LENGTH(payload)) FROM cold_blocks
+            WHERE table_name = 'nyc_station_readings' AND source_id = ? AND day >= ? AND day <= ?
+        """, (station_id, since[:10], until[:10])).fetchone()[0]
+        conn.close()
+        conn = sqlite3.connect(plain.partitions.path(month))
+        table_bytes, table_rows = conn.execute("""
+            SELECT (SELECT SUM(pgsize) FROM dbstat WHERE name = 'nyc_station_readings'),
+                   (SELECT COUNT(*) FROM nyc_station_readings)
+        """).fetchone()
+        conn.close()
+
+        plain_seconds, plain_rows = timed(lambda: plain.get_station_history(station_id, since, until))
+        cold.cold_block_cache.clear()
+        first_seconds, cold_rows = timed(lambda: cold.get_station_history(station_id, since, until), repeat=1)
+        cached_seconds, _ = timed(lambda: cold.get_station_history(station_id, since, until))
+        uncached_seconds, _ = timed(lambda: (cold.cold_block_cache.clear(),
+                                             cold.get_station_history(station_id, since, until)))
+        print(f"\n🔎 7-day station history ({len(cold_rows)} rows, identical: "
+              f"{[r['reading_time'] for r in cold_rows] == [r['reading_time'] for r in plain_rows]})")
+        print(f"   data read      rows ~{len(plain_rows) * table_bytes / table_rows / 1024:.0f} KB"
+              f"   cold blocks {block_bytes / 1024:.0f} KB")
+        print(f"   plain rows     {plain_seconds * 1000:7.2f} ms")
+        print(f"   cold, decoded  {uncached_seconds * 1000:7.2f} ms")
+        print(f"   cold, cached   {cached_seconds * 1000:7.2f} ms")
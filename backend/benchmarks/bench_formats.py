@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Response Format Benchmark
+Report payload bytes and encode time per format for a large history response
+
+Usage: python benchmarks/bench_formats.py [rows]
+"""
+
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from formats import available_formats, encode_rows, orjson
+
+
+def synthetic_history(num_rows):
+    """Rows shaped like get_location_history() output"""
+    start = datetime(2025, 9, 14, tzinfo=timezone.utc)
+    rows = []
+    for i in range(num_rows):
+        aqi = random.randint(20, 160)
+        reading_time = (start + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        rows.append({
+            "id": i + 1,
+            "timestamp": reading_time.replace("T", " ").rstrip("Z"),
+            "aqi_value": aqi,
+            "aqi_category": "good" if aqi <= 50 else "moderate" if aqi <= 100 else "unhealthy_sensitive",
+            "primary_pollutant": "PM2.5",
+            "pm25": round(random.uniform(5, 40), 1),
+            "pm10": round(random.uniform(10, 60), 1),
+            "o3": round(random.uniform(15, 70), 1),
+            "no2": round(random.uniform(5, 45), 1),
+            "so2": round(random.uniform(2, 20), 1),
+            "co": round(random.uniform(0.2, 3.0), 1),
+            "temperature": round(random.uniform(5, 30), 1),
+            "humidity": round(random.uniform(30, 90), 1),
+            "latitude": 40.7589,
+            "longitude": -73.9851,
+            "reading_time": reading_time,
+            "data_source": "api"
+        })
+    return rows
+
+
+def time_encode(encode, repeat=5):
+    best, body = float("inf"), b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = encode()
+        best = min(best, time.perf_counter() - started)
+    return len(body), best
+
+
+if __name__ == "__main__":
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    random.seed(42)
+    rows = synthetic_history(num_rows)
+    meta = {"location": "home", "hours": 24}
+
+    print(f"📦 Response format benchmark: {num_rows} history rows")
+    print(f"   {'format':<22}{'bytes':>12}{'encode µs':>14}{'vs stdlib':>12}")
+
+    cases = [("stdlib json (before)", lambda: json.dumps({**meta, "data": rows}).encode())]
+    for fmt in available_formats():
+        label = f"{fmt} (orjson)" if fmt in ("json", "columnar") and orjson else fmt
+        cases.append((label, lambda fmt=fmt: encode_rows(fmt, rows, "data", meta)))
+
+    baseline = None
+    for label, encode in cases:
+        size, seconds = time_encode(encode)
+        baseline = baseline or size
+        print(f"   {label:<22}{size:>12,}{seconds * 1e6:>14,.0f}{size / baseline:>11.2f}x")
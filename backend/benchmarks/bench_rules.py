@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Rule Engine Benchmark
+Health recommendations and fallback insights evaluated one reading at a time
+vs as a single batch
+
+Usage: python benchmarks/bench_rules.py [readings]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rules import AQI_CATEGORIES, RuleEngine
+
+LABELS = {
+    "good": "Good",
+    "moderate": "Moderate",
+    "unhealthy_sensitive": "Unhealthy for Sensitive Groups",
+    "unhealthy": "Unhealthy",
+    "very_unhealthy": "Very Unhealthy",
+    "hazardous": "Hazardous"
+}
+
+
+def make_readings(count):
+    """Readings with both category spellings found in the database"""
+    rng = random.Random(42)
+    readings = []
+    for i in range(count):
+        category = rng.choice(AQI_CATEGORIES)
+        readings.append({
+            "location": f"Location {i % 50}",
+            "aqi_value": rng.uniform(0, 350),
+            "aqi_category": category if rng.random() < 0.5 else LABELS[category],
+            "primary_pollutant": rng.choice(["PM2.5", "O3", "NO2", "CO"]),
+            "co": rng.uniform(0, 3),
+            "pm25": rng.uniform(0, 40),
+            "temperature": rng.uniform(-5, 38)
+        })
+    return readings
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    readings = make_readings(count)
+
+    started = time.perf_counter()
+    engine = RuleEngine()
+    compile_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    one_by_one = [engine.evaluate_one(reading) for reading in readings]
+    single_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = engine.evaluate(readings)
+    batch_seconds = time.perf_counter() - started
+
+    matched = sum(1 for result in batch if result["insight"].split("\n")[0].startswith(
+        ("Air quality is excellent", "Air quality is acceptable")))
+    print(f"\n🧮 {count} readings, rules compiled in {compile_seconds * 1000:.2f} ms "
+          f"(identical results: {batch == one_by_one})")
+    print(f"   one at a time  {single_seconds * 1000:8.1f} ms  ({single_seconds / count * 1e6:.2f} µs/reading)")
+    print(f"   one batch      {batch_seconds * 1000:8.1f} ms  ({batch_seconds / count * 1e6:.2f} µs/reading, "
+          f"{single_seconds / batch_seconds:.1f}x faster)")
+    print(f"   good/moderate insights: {matched} ({matched / count:.0%})")
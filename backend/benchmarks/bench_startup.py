@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Measure cold start of fresh interpreters: importing the app, database init
+on a fresh vs an up-to-date schema, and the lazily imported modules
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Each snippet prints the seconds spent in the measured step
+SNIPPETS = {
+    "import app (full startup)": """
+import time
+started = time.perf_counter()
+import app
+print(time.perf_counter() - started)
+""",
+    "database init, up-to-date schema": """
+import time
+from database import AirQualityDatabase
+started = time.perf_counter()
+AirQualityDatabase("air_quality.db")
+print(time.perf_counter() - started)
+""",
+    "database init, empty file (all migrations)": """
+import os, time
+from database import AirQualityDatabase
+started = time.perf_counter()
+AirQualityDatabase("fresh.db", partition_dir="fresh_partitions")
+print(time.perf_counter() - started)
+""",
+    "import formats (pyarrow deferred)": """
+import time
+started = time.perf_counter()
+import formats
+print(time.perf_counter() - started)
+""",
+    "import model.aqi_threshold_predictor": """
+import time
+started = time.perf_counter()
+import model.aqi_threshold_predictor
+print(time.perf_counter() - started)
+"""
+}
+
+
+def run_snippet(code, workdir):
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(BACKEND_DIR), PYTHONDONTWRITEBYTECODE="")
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - started
+    return float(result.stdout.strip().splitlines()[-1]), wall
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Work on a copy so the benchmark never migrates or writes the real database
+        source_db = os.path.join(BACKEND_DIR, "air_quality.db")
+        if os.path.exists(source_db):
+            shutil.copy(source_db, workdir)
+        source_partitions = os.path.join(BACKEND_DIR, "partitions")
+        if os.path.isdir(source_partitions):
+            shutil.copytree(source_partitions, os.path.join(workdir, "partitions"))
+        # Bring the copy up to date (and warm the bytecode cache) before timing
+        run_snippet(SNIPPETS["import app (full startup)"], workdir)
+
+        print(f"🚀 Startup benchmark: median of {runs} fresh interpreters")
+        print(f"   {'step':<44}{'step ms':>10}{'process ms':>12}")
+        for label, code in SNIPPETS.items():
+            steps, walls = [], []
+            for _ in range(runs):
+                if "fresh.db" in code:
+                    for leftover in ("fresh.db", "fresh_partitions"):
+                        path = os.path.join(workdir, leftover)
+                        if os.path.isdir(path):
+                            shutil.rmtree(path)
+                        elif os.path.exists(path):
+                            os.remove(path)
+                step, wall = run_snippet(code, workdir)
+                steps.append(step)
+                walls.append(wall)
+            print(f"   {label:<44}{statistics.median(steps) * 1000:>10.1f}{statistics.median(walls) * 1000:>12.1f}")
@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    """Small thread-safe LRU map used for read-through caches in front of SQLite.
+
+    A read-through caller takes a token() before reading and passes it to
+    put(): the put is dropped if the key was invalidated in between, so a
+    value read before a concurrent write cannot be cached after it.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Per-key invalidation counts; cleared (bumping the epoch) when they outgrow maxsize
+        self.generations = {}
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Optional[Any]:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return default
+
+    def token(self, key: Hashable) -> Tuple[int, int]:
+        with self.lock:
+            return self.epoch, self.generations.get(key, 0)
+
+    def put(self, key: Hashable, value: Any, token: Optional[Tuple[int, int]] = None):
+        with self.lock:
+            if token is not None and token != (self.epoch, self.generations.get(key, 0)):
+                return
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self.lock:
+            self.entries.pop(key, None)
+            if len(self.generations) >= self.maxsize:
+                self.generations.clear()
+                self.epoch += 1
+            self.generations[key] = self.generations.get(key, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,203 @@
+import json
+import sqlite3
+import struct
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Text time columns stored as epoch-second deltas: name -> (date/time separator, suffix)
+TIME_COLUMNS = {
+    "reading_time": ("T", "Z"),
+    "timestamp": (" ", "")
+}
+
+# REAL columns keep the fewest decimals (up to this many) that reproduce every value in the block
+MAX_DECIMALS = 6
+
+COMPRESSION_LEVEL = 9
+
+HEADER_LENGTH = struct.Struct("<I")
+
+
+def _pack_ints(values: np.ndarray) -> Tuple[Dict, bytes]:
+    """Delta-encode int64 values into the narrowest integer dtype"""
+    deltas = np.diff(values)
+    dtype = np.int64
+    if len(deltas):
+        low, high = int(deltas.min()), int(deltas.max())
+        for candidate in (np.int8, np.int16, np.int32):
+            info = np.iinfo(candidate)
+            if info.min <= low and high <= info.max:
+                dtype = candidate
+                break
+    return {"first": int(values[0]), "dtype": np.dtype(dtype).str}, deltas.astype(dtype).tobytes()
+
+
+def _unpack_ints(spec: Dict, data: bytes, rows: int) -> np.ndarray:
+    values = np.empty(rows, dtype=np.int64)
+    values[0] = spec["first"]
+    np.cumsum(np.frombuffer(data, dtype=spec["dtype"]), out=values[1:])
+    values[1:] += spec["first"]
+    return values
+
+
+def _decimals(values: np.ndarray) -> int:
+    for decimals in range(MAX_DECIMALS + 1):
+        scaled = np.round(values * 10 ** decimals)
+        if np.array_equal(scaled / 10 ** decimals, values):
+            return decimals
+    return MAX_DECIMALS
+
+
+def _epoch_seconds(values: List, separator: str, suffix: str) -> Optional[np.ndarray]:
+    """Parse time strings to epoch seconds, or None unless every value round-trips exactly"""
+    if not all(isinstance(v, str) and len(v) == 19 + len(suffix) for v in values):
+        return None
+    try:
+        epochs = np.array([v[:10] + "T" + v[11:19] for v in values], dtype="datetime64[s]")
+    except ValueError:
+        return None
+    text = np.char.add(np.char.replace(np.datetime_as_string(epochs, unit="s"), "T", separator), suffix)
+    if not np.array_equal(text, np.array(values)):
+        return None
+    return epochs.astype(np.int64)
+
+
+def _encode_column(name: str, values: List) -> Tuple[Dict, bytes]:
+    kinds = {type(v) for v in values}
+    if name in TIME_COLUMNS and kinds == {str}:
+        separator, suffix = TIME_COLUMNS[name]
+        epochs = _epoch_seconds(values, separator, suffix)
+        if epochs is not None:
+            spec, data = _pack_ints(epochs)
+            return {**spec, "kind": "time", "separator": separator, "suffix": suffix}, data
+    if kinds == {int}:
+        spec, data = _pack_ints(np.array(values, dtype=np.int64))
+        return {**spec, "kind": "int"}, data
+    if kinds == {float}:
+        array = np.array(values, dtype=np.float64)
+        if np.isfinite(array).all():
+            decimals = _decimals(array)
+            spec, data = _pack_ints(np.round(array * 10 ** decimals).astype(np.int64))
+            return {**spec, "kind": "real", "decimals": decimals}, data
+    # Categories, constant per-source text, NULLs and anything mixed: dictionary of distinct values
+    dictionary, codes = [], {}
+    indexes = np.empty(len(values), dtype=np.uint32)
+    for i, value in enumerate(values):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(dictionary)
+            dictionary.append(value)
+        indexes[i] = code
+    dtype = np.uint8 if len(dictionary) <= 256 else np.uint16 if len(dictionary) <= 65536 else np.uint32
+    return {"kind": "dict", "values": dictionary, "dtype": np.dtype(dtype).str}, indexes.astype(dtype).tobytes()
+
+
+def _decode_column(spec: Dict, data: bytes, rows: int) -> List:
+    kind = spec["kind"]
+    if kind == "dict":
+        dictionary = spec["values"]
+        return [dictionary[i] for i in np.frombuffer(data, dtype=spec["dtype"]).tolist()]
+    values = _unpack_ints(spec, data, rows)
+    if kind == "int":
+        return values.tolist()
+    if kind == "real":
+        return (values / 10 ** spec["decimals"]).tolist()
+    text = np.datetime_as_string(values.astype("datetime64[s]"), unit="s")
+    return np.char.add(np.char.replace(text, "T", spec["separator"]), spec["suffix"]).tolist()
+
+
+def encode_block(columns: List[str], rows: List[tuple]) -> bytes:
+    """Columnar, delta/quantized/dictionary-encoded, zlib-compressed block of rows.
+
+    Lossless for the values SQLite returns: a REAL column is only scaled
+    to as many decimals as it actually uses (at most MAX_DECIMALS).
+    """
+    header, body = {"rows": len(rows), "columns": []}, []
+    for name, values in zip(columns, zip(*rows)):
+        spec, data = _encode_column(name, list(values))
+        spec.update(name=name, length=len(data))
+        header["columns"].append(spec)
+        body.append(data)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    return zlib.compress(HEADER_LENGTH.pack(len(header_bytes)) + header_bytes + b"".join(body), COMPRESSION_LEVEL)
+
+
+def decode_block(payload: bytes) -> Tuple[List[str], List[tuple]]:
+    """Inverse of encode_block -> (columns, rows)"""
+    raw = zlib.decompress(payload)
+    header_length = HEADER_LENGTH.unpack_from(raw)[0]
+    offset = HEADER_LENGTH.size + header_length
+    header = json.loads(raw[HEADER_LENGTH.size:offset])
+    columns, decoded = [], []
+    for spec in header["columns"]:
+        columns.append(spec["name"])
+        decoded.append(_decode_column(spec, raw[offset:offset + spec["length"]], header["rows"]))
+        offset += spec["length"]
+    return columns, list(zip(*decoded))
+
+
+def _remap_rows(table: str, block_columns: List[str], block_rows: List[tuple], columns: List[str]) -> List[tuple]:
+    """Block rows written under an older schema, laid out in the table's current columns.
+
+    Columns added since get NULL (SQLite's value for rows that predate an
+    ADD COLUMN); a column that was dropped while still holding values
+    raises rather than silently losing them.
+    """
+    positions = {name: i for i, name in enumerate(block_columns)}
+    for name, position in positions.items():
+        if name not in columns and any(row[position] is not None for row in block_rows):
+            raise ValueError(f"Cold block for {table} has values in column {name}, which the table no longer has")
+    return [tuple(row[positions[name]] if name in positions else None for name in columns) for row in block_rows]
+
+
+def compact_table(conn: sqlite3.Connection, table: str, source_column: Optional[str] = None,
+                  time_column: str = "reading_time") -> Tuple[int, int]:
+    """Move a table's rows into per-(source, day) blocks in cold_blocks -> (rows, blocks).
+
+    Rows for a day that already has a block are merged into it (older blocks
+    are re-mapped onto the current columns). The table's table_stats
+    counters are kept, since the rows still exist logically.
+    """
+    cursor = conn.execute(f"SELECT * FROM {table} ORDER BY {time_column}, id")
+    columns = [description[0] for description in cursor.description]
+    source_index = columns.index(source_column) if source_column else None
+    time_index = columns.index(time_column)
+    id_index = columns.index("id")
+
+    groups: Dict[Tuple[str, str], List[tuple]] = {}
+    row_count = 0
+    for row in cursor:
+        source_id = row[source_index] if source_index is not None else ""
+        groups.setdefault((source_id, row[time_index][:10]), []).append(row)
+        row_count += 1
+    if not row_count:
+        return 0, 0
+
+    stats = conn.execute("SELECT row_count, min_time, max_time FROM table_stats WHERE table_name = ?",
+                         (table,)).fetchone()
+    for (source_id, day), rows in groups.items():
+        existing = conn.execute(
+            "SELECT payload FROM cold_blocks WHERE table_name = ? AND source_id = ? AND day = ?",
+            (table, source_id, day)
+        ).fetchone()
+        if existing:
+            block_columns, block_rows = decode_block(existing[0])
+            if block_columns != columns:
+                block_rows = _remap_rows(table, block_columns, block_rows, columns)
+            # Rows written after a thaw replace block rows with the same reading time
+            new_times = {row[time_index] for row in rows}
+            rows = sorted([row for row in block_rows if row[time_index] not in new_times] + rows,
+                          key=lambda row: (row[time_index], row[id_index]))
+        conn.execute("""
+            INSERT OR REPLACE INTO cold_blocks
+            (table_name, source_id, day, first_time, last_time, row_count, payload)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (table, source_id, day, rows[0][time_index], rows[-1][time_index], len(rows),
+              encode_block(columns, rows)))
+    conn.execute(f"DELETE FROM {table}")
+    if stats:
+        conn.execute("UPDATE table_stats SET row_count = ?, min_time = ?, max_time = ? WHERE table_name = ?",
+                     (*stats, table))
+    return row_count, len(groups)
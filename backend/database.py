@@ -1,28 +1,284 @@
 import sqlite3
 import json
-from datetime import datetime
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
+from cache import LRUCache
+from coldstore import compact_table, decode_block
+from dedup import RecentKeyCache
+from anomaly import QUARANTINE_KINDS
+from migrations import apply_migrations
+from partitions import MAX_ATTACHED, PartitionManager, partition_month
+
+# Columns written for every location reading, in insert order
+LOCATION_COLUMNS = [
+    "aqi_value", "aqi_category", "primary_pollutant", "pm25", "pm10", "o3", "no2", "so2", "co",
+    "temperature", "humidity", "latitude", "longitude", "reading_time", "data_source"
+]
+
+# Columns written for every station reading (history and latest snapshot), in insert order
+STATION_COLUMNS = [
+    "station_id", "location", "latitude", "longitude", "aqi_value", "aqi_category",
+    "primary_pollutant", "pm25", "pm10", "o3", "no2", "so2", "co", "temperature", "humidity",
+    "reading_time", "data_source"
+]
+
+LOCATION_IDS = ["home", "work", "football", "studio", "daycare"]
+
+# Time-series reading tables, stored in the monthly partition files (table -> time column)
+PARTITIONED_TABLES = {
+    **{f"{location_id}_air_quality": "reading_time" for location_id in LOCATION_IDS},
+    "nyc_station_readings": "reading_time"
+}
+
+# Column identifying the source of each cold block, for tables holding several sources
+COLD_SOURCE_COLUMNS = {"nyc_station_readings": "station_id"}
+
+# Readings stamped further ahead of the current UTC time than this are dropped
+MAX_CLOCK_SKEW = timedelta(minutes=10)
+
+# Main-file tables whose statistics are maintained by triggers, with the column used for min/max time
+STATS_TABLES = {
+    "nyc_stations": "reading_time",
+    "user_profiles": "created_at",
+    "reading_flags": "reading_time"
+}
+
+# Columns of a stored anomaly flag, in insert order
+FLAG_COLUMNS = [
+    "source_type", "source_id", "reading_time", "field", "value", "kind", "score",
+    "baseline_mean", "baseline_median", "baseline_std", "action", "reading"
+]
+
+# Insert or update a profile in place; unlike INSERT OR REPLACE this keeps id and created_at
+PROFILE_UPSERT_SQL = """
+    INSERT INTO user_profiles (user_id, age, sex, smoking_status, health_conditions, updated_at)
+    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(user_id) DO UPDATE SET
+        age = excluded.age,
+        sex = excluded.sex,
+        smoking_status = excluded.smoking_status,
+        health_conditions = excluded.health_conditions,
+        updated_at = CURRENT_TIMESTAMP
+"""
 
 class AirQualityDatabase:
-    def __init__(self, db_path: str = "air_quality.db"):
+    def __init__(self, db_path: str = "air_quality.db", recent_keys: int = 50000,
+                 size_cache_seconds: float = 300, profile_cache_size: int = 10000,
+                 partition_dir: Optional[str] = None, writable_months: int = 2,
+                 cold_block_cache_size: int = 2048):
         self.db_path = db_path
+        # Readings live in one file per month next to the main database
+        self.partitions = PartitionManager(
+            partition_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), "partitions"),
+            os.path.splitext(os.path.basename(db_path))[0],
+            self._init_partition,
+            writable_months=writable_months,
+            compact=self._compact_partition
+        )
+        # Parsed profiles keyed by user_id, invalidated on every write
+        self.profile_cache = LRUCache(profile_cache_size)
+        # Callbacks run after location readings are committed: fn(location_id, readings)
+        self.save_listeners = []
+        # Callbacks run after station readings are committed: fn(station_id, readings)
+        self.station_save_listeners = []
+        # Callbacks run once per committed ingest batch: fn(readings)
+        self.batch_listeners = []
+        # Recently written (table, reading_time) keys, used to drop re-deliveries before SQLite
+        self.recent_keys = RecentKeyCache(recent_keys)
+        # Optional AnomalyDetector screening readings before they are written
+        self.anomaly_detector = None
+        # On-disk sizes need a page walk, so a background thread refreshes them off the request path
+        self.size_cache_seconds = size_cache_seconds
+        self._table_sizes = {}  # file key ('main' or partition month) -> (computed_at, sizes)
+        self._size_refresh = threading.Event()
+        self._size_thread = None
+        self._size_lock = threading.Lock()
+        # Decoded cold blocks of frozen partitions, keyed by (month, file version, table, source_id, day)
+        self.cold_block_cache = LRUCache(cold_block_cache_size)
         self.init_database()
+        self.repair_station_snapshots()
     
     def init_database(self):
-        """Initialize the database with tables for each location"""
+        """Bring the main database file up to the current schema version.
+
+        Migrations only run when the recorded version is behind, so a normal
+        start is one query rather than the full DDL. Add schema changes as a
+        new migration at the end of the list.
+        """
         conn = sqlite3.connect(self.db_path)
+        apply_migrations(conn, [
+            (1, "baseline schema", self._create_schema),
+            (2, "move readings into monthly partitions", self._migrate_to_partitions),
+            (3, "write-ahead logging", self._enable_wal)
+        ])
+        conn.close()
+        print("✅ Database initialized successfully")
+    
+    def _create_schema(self, conn: sqlite3.Connection):
+        """Main-file tables; idempotent so it also upgrades databases that predate versioning"""
         cursor = conn.cursor()
         
-        # Create tables for each location
-        locations = [
-            ("home", "Home"),
-            ("work", "Work"), 
-            ("football", "Football Center"),
-            ("studio", "Studio"),
-            ("daycare", "Daycare")
-        ]
+        # Latest snapshot per NYC monitoring station (one row per station, upserted)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS nyc_stations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                station_id TEXT UNIQUE NOT NULL,
+                location TEXT NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                aqi_value INTEGER NOT NULL,
+                aqi_category TEXT NOT NULL,
+                primary_pollutant TEXT NOT NULL,
+                pm25 REAL NOT NULL,
+                pm10 REAL NOT NULL,
+                o3 REAL NOT NULL,
+                no2 REAL NOT NULL,
+                so2 REAL,
+                co REAL,
+                temperature REAL,
+                humidity REAL,
+                reading_time TEXT NOT NULL,
+                data_source TEXT DEFAULT 'api',
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Older snapshot tables predate some of the pollutant columns
+        cursor.execute("PRAGMA table_info(nyc_stations)")
+        existing_columns = {row[1] for row in cursor.fetchall()}
+        for column, column_type in [("so2", "REAL"), ("co", "REAL"), ("temperature", "REAL"),
+                                    ("humidity", "REAL"), ("data_source", "TEXT DEFAULT 'api'")]:
+            if column not in existing_columns:
+                cursor.execute(f"ALTER TABLE nyc_stations ADD COLUMN {column} {column_type}")
+        
+        # Create user profiles table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_profiles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT UNIQUE NOT NULL,
+                age INTEGER,
+                sex TEXT,
+                smoking_status TEXT,
+                health_conditions TEXT, -- JSON array
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Per-user AQI alert subscriptions, one threshold per (user, location)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS alert_subscriptions (
+                user_id TEXT NOT NULL,
+                location_id TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, location_id)
+            )
+        """)
+        
+        # Weekly schedules for exposure: blocks of minutes spent at a location, later blocks win
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_schedules (
+                user_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                location_id TEXT NOT NULL,
+                days TEXT NOT NULL, -- weekday digits, 0 = Monday, e.g. '01234'
+                start_minute INTEGER NOT NULL,
+                end_minute INTEGER NOT NULL,
+                PRIMARY KEY (user_id, position)
+            )
+        """)
+        
+        # Anomaly flags raised on the write path; quarantined readings keep their payload here
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS reading_flags (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source_type TEXT NOT NULL, -- 'station' or 'location'
+                source_id TEXT NOT NULL,
+                reading_time TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value REAL,
+                kind TEXT NOT NULL, -- spike, stuck, out_of_range
+                score REAL,
+                baseline_mean REAL,
+                baseline_median REAL,
+                baseline_std REAL,
+                action TEXT NOT NULL, -- flagged or quarantined
+                reading TEXT, -- JSON, only for quarantined readings
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (source_type, source_id, reading_time, field, kind)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_reading_flags_time ON reading_flags (reading_time)")
+        
+        self._init_table_stats(cursor, STATS_TABLES)
+    
+    def _init_partition(self, conn: sqlite3.Connection):
+        """Bring a monthly partition up to the current partition schema version"""
+        apply_migrations(conn, [
+            (1, "baseline partition schema", self._create_partition_schema),
+            (2, "write-ahead logging", self._enable_wal),
+            (3, "cold storage blocks", self._create_cold_blocks)
+        ], label="partition")
+    
+    def _create_cold_blocks(self, conn: sqlite3.Connection):
+        """Compressed per-(source, day) blocks holding a frozen partition's readings"""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cold_blocks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                source_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                first_time TEXT NOT NULL,
+                last_time TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                payload BLOB NOT NULL,
+                UNIQUE (table_name, source_id, day)
+            )
+        """)
+    
+    def _compact_partition(self, conn: sqlite3.Connection):
+        """Pack every reading table of a partition that is about to freeze into cold blocks"""
+        self._init_partition(conn)
+        packed_rows, packed_blocks = 0, 0
+        for table in PARTITIONED_TABLES:
+            rows, blocks = compact_table(conn, table, COLD_SOURCE_COLUMNS.get(table))
+            packed_rows += rows
+            packed_blocks += blocks
+        if packed_rows:
+            print(f"📦 Packed {packed_rows} readings into {packed_blocks} cold blocks")
+    
+    def compact_frozen_partitions(self) -> List[str]:
+        """Cold-encode partitions frozen before cold storage existed; returns the months changed"""
+        compacted = []
+        for month in self.partitions.months():
+            if not self.partitions.is_frozen(month):
+                continue
+            conn = self.partitions.connect_read(month)
+            try:
+                raw_rows = sum(conn.execute(f"SELECT EXISTS (SELECT 1 FROM {table})").fetchone()[0]
+                               for table in PARTITIONED_TABLES)
+            finally:
+                conn.close()
+            if raw_rows:
+                self.partitions.thaw(month)
+                self.partitions.freeze(month)
+                self._table_sizes.pop(month, None)
+                compacted.append(month)
+        return compacted
+    
+    def _enable_wal(self, conn: sqlite3.Connection):
+        """WAL lets readers and online backups run alongside writers (persists in the file)"""
+        conn.execute("PRAGMA journal_mode = WAL")
+    
+    def _create_partition_schema(self, conn: sqlite3.Connection):
+        """Create the reading tables (and their stats triggers) in a monthly partition"""
+        cursor = conn.cursor()
         
-        for location_id, location_name in locations:
+        for location_id in LOCATION_IDS:
             cursor.execute(f"""
                 CREATE TABLE IF NOT EXISTS {location_id}_air_quality (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -44,12 +300,17 @@ class AirQualityDatabase:
                     data_source TEXT DEFAULT 'api'
                 )
             """)
+            # One row per reading_time
+            cursor.execute(f"""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_{location_id}_reading_time
+                ON {location_id}_air_quality (reading_time)
+            """)
         
-        # Create a general stations table for NYC monitoring stations
+        # Append-only station history, one row per (station, reading_time)
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS nyc_stations (
+            CREATE TABLE IF NOT EXISTS nyc_station_readings (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                station_id TEXT UNIQUE NOT NULL,
+                station_id TEXT NOT NULL,
                 location TEXT NOT NULL,
                 latitude REAL NOT NULL,
                 longitude REAL NOT NULL,
@@ -60,116 +321,688 @@ class AirQualityDatabase:
                 pm10 REAL NOT NULL,
                 o3 REAL NOT NULL,
                 no2 REAL NOT NULL,
+                so2 REAL NOT NULL,
+                co REAL NOT NULL,
+                temperature REAL NOT NULL,
+                humidity REAL NOT NULL,
                 reading_time TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                data_source TEXT DEFAULT 'api',
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (station_id, reading_time)
             )
         """)
         
-        # Create user profiles table
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_nyc_station_readings_time ON nyc_station_readings (reading_time)")
+        
+        self._init_table_stats(cursor, PARTITIONED_TABLES)
+    
+    def _migrate_to_partitions(self, conn: sqlite3.Connection):
+        """Move reading tables left in the main file by older versions into monthly partitions.
+
+        Months are copied oldest first (so a month is complete before newer
+        ones push it out of the writable window), keeping the newest row per
+        reading_time where older databases hold duplicates; the legacy tables
+        and their counters are then dropped. Safe to re-run after an interruption.
+        """
+        legacy = [
+            name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            if name in PARTITIONED_TABLES
+        ]
+        if not legacy:
+            return
+        
+        columns = {
+            table: ", ".join(row[1] for row in conn.execute(f"PRAGMA table_info({table})") if row[1] != "id")
+            for table in legacy
+        }
+        months = sorted({
+            partition_month(reading_time)
+            for table in legacy
+            for (reading_time,) in conn.execute(f"""
+                SELECT MIN(reading_time) FROM {table} GROUP BY substr(reading_time, 1, 7)
+            """)
+        })
+        
+        for month in months:
+            schema = self.partitions.attach(conn, month)
+            prefix = f"{month[:4]}-{month[5:]}"
+            with conn:
+                for table in legacy:
+                    conn.execute(f"""
+                        INSERT OR IGNORE INTO {schema}.{table} ({columns[table]})
+                        SELECT {columns[table]} FROM main.{table}
+                        WHERE substr(reading_time, 1, 7) = ?
+                        ORDER BY id DESC
+                    """, (prefix,))
+            conn.execute(f"DETACH DATABASE {schema}")
+        self.partitions.freeze_expired()
+        
+        with conn:
+            for table in legacy:
+                conn.execute(f"DROP TABLE main.{table}")
+                conn.execute("DELETE FROM table_stats WHERE table_name = ?", (table,))
+                conn.execute("DELETE FROM table_ingest_minutes WHERE table_name = ?", (table,))
+        conn.execute("VACUUM")
+        print(f"📦 Moved {len(legacy)} reading tables into {len(months)} monthly partition(s)")
+    
+    def _init_table_stats(self, cursor: sqlite3.Cursor, tables: Dict[str, str]):
+        """Create the counter tables and the triggers that keep them current for `tables`.
+
+        Counters are seeded with one full count the first time a table is
+        tracked; after that every insert/delete adjusts them incrementally.
+        """
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_profiles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT UNIQUE NOT NULL,
-                age INTEGER,
-                sex TEXT,
-                smoking_status TEXT,
-                health_conditions TEXT, -- JSON array
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            CREATE TABLE IF NOT EXISTS table_stats (
+                table_name TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL DEFAULT 0,
+                min_time TEXT,
+                max_time TEXT,
+                last_insert_at TEXT
             )
         """)
         
-        conn.commit()
-        conn.close()
-        print("✅ Database initialized successfully")
-    
-    def save_location_data(self, location_id: str, data: Dict) -> bool:
-        """Save air quality data for a specific location"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+        # Per-minute insert counts for the last hour, used for the ingest rate
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS table_ingest_minutes (
+                table_name TEXT NOT NULL,
+                minute TEXT NOT NULL,
+                inserts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (table_name, minute)
+            ) WITHOUT ROWID
+        """)
+        
+        # Keep min/max recomputation on delete an index lookup
+        if "user_profiles" in tables:
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_profiles_created_at ON user_profiles (created_at)")
+        
+        for table, time_column in tables.items():
+            cursor.execute("SELECT 1 FROM table_stats WHERE table_name = ?", (table,))
+            if not cursor.fetchone():
+                cursor.execute(f"""
+                    INSERT INTO table_stats (table_name, row_count, min_time, max_time)
+                    SELECT ?, COUNT(*), MIN({time_column}), MAX({time_column}) FROM {table}
+                """, (table,))
+            
+            recompute_bounds = f"""
+                UPDATE table_stats SET
+                    min_time = (SELECT MIN({time_column}) FROM {table}),
+                    max_time = (SELECT MAX({time_column}) FROM {table})
+                WHERE table_name = '{table}'
+            """
             
             cursor.execute(f"""
-                INSERT INTO {location_id}_air_quality 
-                (aqi_value, aqi_category, primary_pollutant, pm25, pm10, o3, no2, so2, co, 
-                 temperature, humidity, latitude, longitude, reading_time, data_source)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                data['aqi_value'],
-                data['aqi_category'],
-                data['primary_pollutant'],
-                data['pm25'],
-                data['pm10'],
-                data['o3'],
-                data['no2'],
-                data['so2'],
-                data['co'],
-                data['temperature'],
-                data['humidity'],
-                data['latitude'],
-                data['longitude'],
-                data['reading_time'],
-                data.get('data_source', 'api')
-            ))
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_insert AFTER INSERT ON {table}
+                BEGIN
+                    UPDATE table_stats SET
+                        row_count = row_count + 1,
+                        min_time = CASE WHEN min_time IS NULL OR NEW.{time_column} < min_time
+                                        THEN NEW.{time_column} ELSE min_time END,
+                        max_time = CASE WHEN max_time IS NULL OR NEW.{time_column} > max_time
+                                        THEN NEW.{time_column} ELSE max_time END,
+                        last_insert_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+                    WHERE table_name = '{table}';
+                    INSERT INTO table_ingest_minutes (table_name, minute, inserts)
+                    VALUES ('{table}', strftime('%Y-%m-%dT%H:%M', 'now'), 1)
+                    ON CONFLICT(table_name, minute) DO UPDATE SET inserts = inserts + 1;
+                    DELETE FROM table_ingest_minutes
+                    WHERE table_name = '{table}' AND minute < strftime('%Y-%m-%dT%H:%M', 'now', '-60 minutes');
+                END
+            """)
             
-            conn.commit()
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_delete AFTER DELETE ON {table}
+                BEGIN
+                    UPDATE table_stats SET row_count = row_count - 1 WHERE table_name = '{table}';
+                    {recompute_bounds}
+                    AND (OLD.{time_column} <= min_time OR OLD.{time_column} >= max_time);
+                END
+            """)
+            
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_update AFTER UPDATE OF {time_column} ON {table}
+                WHEN OLD.{time_column} IS NOT NEW.{time_column}
+                BEGIN
+                    {recompute_bounds};
+                END
+            """)
+    
+    def _location_upsert_sql(self, location_id: str, schema: str = "main") -> str:
+        """Idempotent insert keyed on reading_time: re-deliveries update in place"""
+        columns = ", ".join(LOCATION_COLUMNS)
+        placeholders = ", ".join("?" for _ in LOCATION_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in LOCATION_COLUMNS if c != "reading_time")
+        return f"""
+            INSERT INTO {schema}.{location_id}_air_quality ({columns})
+            VALUES ({placeholders})
+            ON CONFLICT(reading_time) DO UPDATE SET {updates}
+        """
+    
+    def _location_row(self, data: Dict) -> tuple:
+        return tuple(data.get(c, 'api') if c == "data_source" else data[c] for c in LOCATION_COLUMNS)
+    
+    def _writable_rows(self, rows: List[tuple], reading_time_index: int) -> List[tuple]:
+        """Drop rows dated in the future (beyond MAX_CLOCK_SKEW) and late rows for frozen (read-only) months"""
+        latest = (datetime.now(timezone.utc) + MAX_CLOCK_SKEW).strftime("%Y-%m-%dT%H:%M:%SZ")
+        future = [row for row in rows if row[reading_time_index] > latest]
+        if future:
+            rows = [row for row in rows if row[reading_time_index] <= latest]
+            print(f"⚠️  Dropped {len(future)} readings dated in the future "
+                  f"(latest {max(row[reading_time_index] for row in future)})")
+        months = {partition_month(row[reading_time_index]) for row in rows}
+        frozen = {month for month in months if self.partitions.is_frozen(month)}
+        if not frozen:
+            return rows
+        kept = [row for row in rows if partition_month(row[reading_time_index]) not in frozen]
+        print(f"⚠️  Dropped {len(rows) - len(kept)} readings for frozen partition(s) {', '.join(sorted(frozen))}")
+        return kept
+    
+    def _filter_new_rows(self, location_id: str, rows: List[tuple]) -> List[tuple]:
+        """Drop rows already written with identical values (per the recent-key cache)"""
+        reading_time_index = LOCATION_COLUMNS.index("reading_time")
+        return [
+            row for row in rows
+            if not self.recent_keys.is_duplicate((location_id, row[reading_time_index]), row)
+        ]
+    
+    def _remember_rows(self, location_id: str, rows: List[tuple]):
+        reading_time_index = LOCATION_COLUMNS.index("reading_time")
+        for row in rows:
+            self.recent_keys.remember((location_id, row[reading_time_index]), row)
+    
+    def set_anomaly_detector(self, detector):
+        """Screen every new reading with `detector` (an anomaly.AnomalyDetector) before writing"""
+        self.anomaly_detector = detector
+    
+    def _screen_rows(self, source_type: str, source_ids: List[str], rows: List[tuple],
+                     columns: List[str]):
+        """Run new rows through the anomaly detector.
+
+        Returns (rows to write, flag rows, quarantined (source_id, reading_time)
+        keys, released (source_id, reading_time, field) keys). When a run of
+        spikes is confirmed as a level shift, its earlier readings are
+        released: ones in this batch are written with it, and ones
+        quarantined by earlier batches are returned for _load_released().
+        """
+        if self.anomaly_detector is None or not rows:
+            return rows, [], set(), []
+        
+        screened, flag_rows, released = [], [], []
+        for source_id, row in zip(source_ids, rows):
+            reading = dict(zip(columns, row))
+            flags, quarantine = self.anomaly_detector.screen(source_type, source_id, reading)
+            key = (source_id, reading["reading_time"])
+            screened.append((key, row, quarantine))
+            action = "quarantined" if quarantine else "flagged"
+            payload = json.dumps(reading) if quarantine else None
+            for flag in flags:
+                released.extend((source_id, reading_time, flag["field"]) for reading_time in flag.get("released", []))
+                flag_rows.append([
+                    source_type, source_id, reading["reading_time"], flag["field"], flag["value"],
+                    flag["kind"], flag["score"], flag["baseline_mean"], flag["baseline_median"],
+                    flag["baseline_std"], action, payload
+                ])
+        
+        # Releases of readings quarantined earlier in this same batch
+        held = {key for key, _, quarantine in screened if quarantine}
+        earlier = []
+        for source_id, reading_time, field in released:
+            if (source_id, reading_time) not in held:
+                earlier.append((source_id, reading_time, field))
+                continue
+            for flag_row in flag_rows:
+                if flag_row[1:4] == [source_id, reading_time, field] and flag_row[5] == "spike":
+                    flag_row[10] = "flagged"
+        still_held = {
+            tuple(flag_row[1:3]) for flag_row in flag_rows
+            if flag_row[10] == "quarantined" and flag_row[5] in QUARANTINE_KINDS
+        }
+        kept, quarantined = [], set()
+        for key, row, quarantine in screened:
+            if quarantine and key in still_held:
+                quarantined.add(key)
+            else:
+                kept.append(row)
+        for flag_row in flag_rows:
+            if flag_row[10] == "flagged" or tuple(flag_row[1:3]) not in still_held:
+                flag_row[10], flag_row[11] = "flagged", None
+        return kept, [tuple(flag_row) for flag_row in flag_rows], quarantined, earlier
+    
+    def _load_released(self, source_type: str, released: List[tuple], columns: List[str]):
+        """Readings quarantined by earlier batches that a confirmed level shift lets through.
+
+        Returns (rows in `columns` order for readings left with no
+        quarantining flag, (source_type, source_id, reading_time, field, kind)
+        flags to downgrade to 'flagged' in the same transaction as the write).
+        """
+        if not released:
+            return [], []
+        conn = sqlite3.connect(self.db_path)
+        try:
+            held = {}
+            for source_id, reading_time in {(source_id, reading_time) for source_id, reading_time, _ in released}:
+                held[(source_id, reading_time)] = conn.execute("""
+                    SELECT field, kind, reading FROM reading_flags
+                    WHERE source_type = ? AND source_id = ? AND reading_time = ? AND action = 'quarantined'
+                """, (source_type, source_id, reading_time)).fetchall()
+        finally:
             conn.close()
+        
+        released_fields = {}
+        for source_id, reading_time, field in released:
+            released_fields.setdefault((source_id, reading_time), set()).add(field)
+        rows, downgrades = [], []
+        for key, flags in held.items():
+            if not flags:
+                continue
+            holding = [
+                (field, kind) for field, kind, _ in flags
+                if kind in QUARANTINE_KINDS and not (kind == "spike" and field in released_fields[key])
+            ]
+            if holding:
+                # Still held for another field: only the released spikes are downgraded
+                downgrades.extend((source_type, *key, field, "spike") for field, kind, _ in flags
+                                  if kind == "spike" and field in released_fields[key])
+                continue
+            reading = json.loads(flags[0][2])
+            rows.append(tuple(reading[c] for c in columns))
+            downgrades.extend((source_type, *key, field, kind) for field, kind, _ in flags)
+        return rows, downgrades
+    
+    def _write_flags(self, conn: sqlite3.Connection, flag_rows: List[tuple], downgrades: List[tuple] = ()):
+        if downgrades:
+            # Released readings are written now, so their flags no longer hold a payload
+            conn.executemany("""
+                UPDATE reading_flags SET action = 'flagged', reading = NULL
+                WHERE source_type = ? AND source_id = ? AND reading_time = ? AND field = ? AND kind = ?
+            """, downgrades)
+        if not flag_rows:
+            return
+        columns = ", ".join(FLAG_COLUMNS)
+        placeholders = ", ".join("?" for _ in FLAG_COLUMNS)
+        conn.executemany(f"""
+            INSERT INTO reading_flags ({columns})
+            VALUES ({placeholders})
+            ON CONFLICT(source_type, source_id, reading_time, field, kind) DO NOTHING
+        """, flag_rows)
+    
+    def add_save_listener(self, listener):
+        """Register fn(location_id, readings) to run after location readings are committed"""
+        self.save_listeners.append(listener)
+    
+    def _notify_saved(self, location_id: str, rows: List[tuple]):
+        if not rows or not self.save_listeners:
+            return
+        readings = [dict(zip(LOCATION_COLUMNS, row)) for row in rows]
+        for listener in self.save_listeners:
+            try:
+                listener(location_id, readings)
+            except Exception as e:
+                print(f"❌ Error in save listener for {location_id}: {e}")
+    
+    def add_station_save_listener(self, listener):
+        """Register fn(station_id, readings) to run after station readings are committed"""
+        self.station_save_listeners.append(listener)
+    
+    def _notify_station_saved(self, rows: List[tuple]):
+        if not rows or not self.station_save_listeners:
+            return
+        by_station = {}
+        for row in rows:
+            by_station.setdefault(row[0], []).append(dict(zip(STATION_COLUMNS, row)))
+        for station_id, readings in by_station.items():
+            for listener in self.station_save_listeners:
+                try:
+                    listener(station_id, readings)
+                except Exception as e:
+                    print(f"❌ Error in station save listener for {station_id}: {e}")
+    
+    def add_batch_listener(self, listener):
+        """Register fn(readings) to run once after each ingest batch is committed"""
+        self.batch_listeners.append(listener)
+    
+    def save_location_data(self, location_id: str, data: Dict) -> bool:
+        """Save air quality data for a specific location (idempotent per reading_time)"""
+        try:
+            rows = self._writable_rows([self._location_row(data)], LOCATION_COLUMNS.index("reading_time"))
+            rows = self._filter_new_rows(location_id, rows)
+            if not rows:
+                return True
+            checked = rows
+            rows, flag_rows, _, released = self._screen_rows(
+                "location", [location_id] * len(rows), rows, LOCATION_COLUMNS
+            )
+            released_rows, downgrades = self._load_released("location", released, LOCATION_COLUMNS)
+            reading_time_index = LOCATION_COLUMNS.index("reading_time")
+            rows = sorted(released_rows + rows, key=lambda row: row[reading_time_index])
+            
+            self._write_readings({location_id: rows}, [], flag_rows, downgrades)
+            self._remember_rows(location_id, checked)
+            self._notify_saved(location_id, rows)
             return True
         except Exception as e:
             print(f"❌ Error saving {location_id} data: {e}")
             return False
     
-    def save_station_data(self, station_data: List[Dict]) -> bool:
-        """Save NYC monitoring station data"""
+    def _station_row(self, station: Dict) -> tuple:
+        return tuple(
+            station['id'] if c == "station_id" else station.get(c, 'api') if c == "data_source" else station[c]
+            for c in STATION_COLUMNS
+        )
+    
+    def _station_history_sql(self, schema: str = "main") -> str:
+        """Append to the station history; a re-delivered (station, reading_time) updates in place"""
+        columns = ", ".join(STATION_COLUMNS)
+        placeholders = ", ".join("?" for _ in STATION_COLUMNS)
+        updates = ", ".join(
+            f"{c} = excluded.{c}" for c in STATION_COLUMNS if c not in ("station_id", "reading_time")
+        )
+        return f"""
+            INSERT INTO {schema}.nyc_station_readings ({columns})
+            VALUES ({placeholders})
+            ON CONFLICT(station_id, reading_time) DO UPDATE SET {updates}
+        """
+    
+    def _station_snapshot_sql(self) -> str:
+        """Upsert the latest snapshot, only moving it forward; late older readings stay history-only"""
+        columns = ", ".join(STATION_COLUMNS)
+        placeholders = ", ".join("?" for _ in STATION_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in STATION_COLUMNS if c != "station_id")
+        return f"""
+            INSERT INTO main.nyc_stations ({columns})
+            VALUES ({placeholders})
+            ON CONFLICT(station_id) DO UPDATE SET {updates}, timestamp = CURRENT_TIMESTAMP
+            WHERE excluded.reading_time >= nyc_stations.reading_time
+        """
+    
+    def repair_station_snapshots(self) -> int:
+        """Roll nyc_stations forward to the newest history row per station; returns stations repaired.
+
+        Only needed after a commit torn between a partition and the main file
+        (see _write_readings). Only writable partitions are checked, with one
+        index seek per station plus a range scan from the newest snapshot
+        for stations missing from it, so a normal start stays cheap.
+        """
+        columns = ", ".join(STATION_COLUMNS)
+        conn = sqlite3.connect(self.db_path)
         try:
+            snapshot = dict(conn.execute("SELECT station_id, reading_time FROM nyc_stations").fetchall())
+            newest_snapshot = max(snapshot.values(), default="")
+            first_month = partition_month(min(snapshot.values(), default="0000-00"))
+            time_index = STATION_COLUMNS.index("reading_time")
+            newest = {}
+            for month in self.partitions.months():
+                if month < first_month or self.partitions.is_frozen(month):
+                    continue
+                reader = self.partitions.connect_read(month)
+                try:
+                    candidates = [
+                        reader.execute(f"""
+                            SELECT {columns} FROM nyc_station_readings
+                            WHERE station_id = ? AND reading_time > ?
+                            ORDER BY reading_time DESC LIMIT 1
+                        """, (station_id, reading_time)).fetchone()
+                        for station_id, reading_time in snapshot.items()
+                    ]
+                    candidates += [
+                        row for row in reader.execute(f"""
+                            SELECT {columns} FROM nyc_station_readings WHERE reading_time >= ?
+                        """, (newest_snapshot,))
+                        if row[0] not in snapshot
+                    ]
+                finally:
+                    reader.close()
+                for row in candidates:
+                    if row and (row[0] not in newest or row[time_index] > newest[row[0]][time_index]):
+                        newest[row[0]] = row
+            if newest:
+                with conn:
+                    conn.executemany(self._station_snapshot_sql(), list(newest.values()))
+                print(f"🔧 Rolled {len(newest)} station snapshot(s) forward from history")
+        finally:
+            conn.close()
+        return len(newest)
+    
+    def _write_readings(self, location_rows: Dict[str, List[tuple]], station_rows: List[tuple],
+                        flag_rows: List[tuple], flag_downgrades: List[tuple] = ()):
+        """Write readings into their monthly partitions, and the station snapshot and flags into the main file.
+
+        The partitions involved are attached to one connection and written in
+        one transaction (larger backfills go in chunks of MAX_ATTACHED
+        months). The files are in WAL mode, where SQLite only guarantees
+        atomicity per file: a crash mid-commit can keep the history rows but
+        lose the snapshot or flags. repair_station_snapshots() rolls the
+        snapshot forward from the history on startup.
+        """
+        location_time_index = LOCATION_COLUMNS.index("reading_time")
+        station_time_index = STATION_COLUMNS.index("reading_time")
+        by_month = {}
+        for location_id, rows in location_rows.items():
+            for row in rows:
+                month_location_rows, _ = by_month.setdefault(partition_month(row[location_time_index]), ({}, []))
+                month_location_rows.setdefault(location_id, []).append(row)
+        for row in station_rows:
+            by_month.setdefault(partition_month(row[station_time_index]), ({}, []))[1].append(row)
+        
+        months = sorted(by_month)
+        chunks = [months[i:i + MAX_ATTACHED] for i in range(0, len(months), MAX_ATTACHED)] or [[]]
+        for position, chunk in enumerate(chunks):
             conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            for station in station_data:
-                cursor.execute("""
-                    INSERT OR REPLACE INTO nyc_stations 
-                    (station_id, location, latitude, longitude, aqi_value, aqi_category, 
-                     primary_pollutant, pm25, pm10, o3, no2, so2, co, reading_time)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    station['id'],
-                    station['location'],
-                    station['latitude'],
-                    station['longitude'],
-                    station['aqi_value'],
-                    station['aqi_category'],
-                    station['primary_pollutant'],
-                    station['pm25'],
-                    station['pm10'],
-                    station['o3'],
-                    station['no2'],
-                    station['reading_time']
-                ))
+            try:
+                schemas = {month: self.partitions.attach(conn, month) for month in chunk}
+                with conn:
+                    for month, schema in schemas.items():
+                        month_location_rows, month_station_rows = by_month[month]
+                        for location_id, rows in month_location_rows.items():
+                            conn.executemany(self._location_upsert_sql(location_id, schema), rows)
+                        if month_station_rows:
+                            conn.executemany(self._station_history_sql(schema), month_station_rows)
+                    # Main-file writes commit with the last chunk
+                    if position == len(chunks) - 1:
+                        if station_rows:
+                            conn.executemany(self._station_snapshot_sql(), station_rows)
+                        self._write_flags(conn, flag_rows, flag_downgrades)
+            finally:
+                conn.close()
+        self.partitions.freeze_expired()
+    
+    def _filter_new_station_rows(self, rows: List[tuple]) -> List[tuple]:
+        reading_time_index = STATION_COLUMNS.index("reading_time")
+        return [
+            row for row in rows
+            if not self.recent_keys.is_duplicate(("station", row[0], row[reading_time_index]), row)
+        ]
+    
+    def _remember_station_rows(self, rows: List[tuple]):
+        reading_time_index = STATION_COLUMNS.index("reading_time")
+        for row in rows:
+            self.recent_keys.remember(("station", row[0], row[reading_time_index]), row)
+    
+    def save_station_data(self, station_data: List[Dict]) -> bool:
+        """Save NYC monitoring station data (history + latest snapshot, see _write_readings)"""
+        try:
+            rows = self._writable_rows([self._station_row(s) for s in station_data], STATION_COLUMNS.index("reading_time"))
+            rows = self._filter_new_station_rows(rows)
+            if not rows:
+                return True
+            checked = rows
+            rows, flag_rows, _, released = self._screen_rows("station", [row[0] for row in rows], rows, STATION_COLUMNS)
+            released_rows, downgrades = self._load_released("station", released, STATION_COLUMNS)
+            reading_time_index = STATION_COLUMNS.index("reading_time")
+            rows = sorted(released_rows + rows, key=lambda row: row[reading_time_index])
             
-            conn.commit()
-            conn.close()
+            self._write_readings({}, rows, flag_rows, downgrades)
+            self._remember_station_rows(checked)
+            self._notify_station_saved(rows)
             return True
         except Exception as e:
             print(f"❌ Error saving station data: {e}")
             return False
+
+    def save_ingest_batch(self, readings: List[Dict]) -> bool:
+        """Bulk-save a batch of normalized station readings from the ingestion poller.
+
+        Readings are filtered against recently written keys and screened by
+        the anomaly detector (once, per station); quarantined readings are
+        left out of every reading table until a confirmed level shift
+        releases them. The rest are grouped per mapped
+        location and written, with station history, the station snapshot and
+        any flags, with executemany in one transaction over the monthly
+        partitions involved (atomic per file, see _write_readings). Late
+        readings for frozen months are dropped.
+        """
+        reading_time_index = STATION_COLUMNS.index("reading_time")
+        station_rows = self._writable_rows([self._station_row(r) for r in readings], reading_time_index)
+        if len(station_rows) < len(readings):
+            writable = {(row[0], row[reading_time_index]) for row in station_rows}
+            readings = [r for r in readings if (r['id'], r['reading_time']) in writable]
+        checked_station_rows = self._filter_new_station_rows(station_rows)
+        station_rows, flag_rows, quarantined, released = self._screen_rows(
+            "station", [row[0] for row in checked_station_rows], checked_station_rows, STATION_COLUMNS
+        )
+        if quarantined:
+            readings = [r for r in readings if (r['id'], r['reading_time']) not in quarantined]
+        # Readings held by earlier batches that a confirmed level shift lets through
+        released_rows, downgrades = self._load_released("station", released, STATION_COLUMNS)
+        if released_rows:
+            station_rows = sorted(released_rows + station_rows, key=lambda row: row[reading_time_index])
+            released_readings = []
+            for row in released_rows:
+                reading = dict(zip(STATION_COLUMNS, row))
+                reading["id"] = reading.pop("station_id")
+                released_readings.append(reading)
+            readings = sorted(released_readings + readings, key=lambda r: r['reading_time'])
+        
+        rows_by_location = {}
+        for reading in readings:
+            location_id = STATION_TO_LOCATION.get(reading['id'])
+            if location_id:
+                rows_by_location.setdefault(location_id, []).append(self._location_row(reading))
+        
+        rows_by_location = {
+            location_id: self._filter_new_rows(location_id, rows)
+            for location_id, rows in rows_by_location.items()
+        }
+
+        try:
+            self._write_readings(rows_by_location, station_rows, flag_rows, downgrades)
+        except Exception as e:
+            print(f"❌ Error saving ingest batch: {e}")
+            return False
+        
+        for location_id, rows in rows_by_location.items():
+            self._remember_rows(location_id, rows)
+        self._remember_station_rows(checked_station_rows)
+        
+        for location_id, rows in rows_by_location.items():
+            self._notify_saved(location_id, rows)
+        self._notify_station_saved(station_rows)
+        
+        for listener in self.batch_listeners:
+            try:
+                listener(readings)
+            except Exception as e:
+                print(f"❌ Error in ingest batch listener: {e}")
+
+        return True
+    
+    def _open_cold(self, conn: sqlite3.Connection, month: str, table: str, source_id: Optional[str],
+                   since: Optional[str], until: Optional[str]) -> Optional[sqlite3.Connection]:
+        """In-memory copy of `table` with a partition's cold-block and raw rows in range.
+
+        Only blocks for the source and days asked for are read and decoded
+        (decoded blocks of frozen partitions are cached). Returns None when
+        no cold block is in range, so the raw table can be queried directly.
+        """
+        filters = ["table_name = ?", "day >= ?", "day <= ?"]
+        params = [table, since[:10] if since else "", until[:10] if until else "9999"]
+        if source_id is not None:
+            filters.append("source_id = ?")
+            params.append(source_id)
+        try:
+            blocks = conn.execute(f"SELECT id, source_id, day FROM cold_blocks WHERE {' AND '.join(filters)}",
+                                  params).fetchall()
+        except sqlite3.OperationalError:
+            # Partition frozen before cold storage existed
+            return None
+        if not blocks:
+            return None
+        
+        # Rows written after a thaw are still in the raw table, and win over block rows
+        source_column = COLD_SOURCE_COLUMNS.get(table)
+        raw_filters, raw_params = ["reading_time >= ?", "reading_time <= ?"], [since or "", until or "9999"]
+        if source_id is not None:
+            raw_filters.append(f"{source_column} = ?")
+            raw_params.append(source_id)
+        cursor = conn.execute(f"SELECT * FROM {table} WHERE {' AND '.join(raw_filters)}", raw_params)
+        columns = [description[0] for description in cursor.description]
+        rows = cursor.fetchall()
+        key_indexes = [columns.index(column) for column in (source_column, "reading_time") if column]
+        raw_keys = {tuple(row[i] for i in key_indexes) for row in rows}
+        
+        frozen = self.partitions.is_frozen(month)
+        # A re-frozen partition has a new mtime, so its old cache entries are never hit again
+        version = os.stat(self.partitions.path(month)).st_mtime_ns
+        for block_id, block_source, day in blocks:
+            key = (month, version, table, block_source, day)
+            cached = self.cold_block_cache.get(key) if frozen else None
+            if cached is None:
+                payload = conn.execute("SELECT payload FROM cold_blocks WHERE id = ?", (block_id,)).fetchone()[0]
+                cached = decode_block(payload)[1]
+                if frozen:
+                    self.cold_block_cache.put(key, cached)
+            if raw_keys:
+                cached = [row for row in cached if tuple(row[i] for i in key_indexes) not in raw_keys]
+            rows.extend(cached)
+        
+        # Bare columns: the rows are already typed, and constraints would only slow the load
+        cold = sqlite3.connect(":memory:")
+        cold.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+        cold.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(columns))})", rows)
+        return cold
+    
+    def _query_partitions(self, months: List[str], query: str, params: tuple = (),
+                          limit: Optional[int] = None, table: Optional[str] = None,
+                          source_id: Optional[str] = None, since: Optional[str] = None,
+                          until: Optional[str] = None):
+        """Run `query` on each month's partition in the given order and concatenate the rows.
+
+        With `limit`, the query must end in LIMIT ? (filled with the rows
+        still needed) and later months are skipped once enough rows are
+        collected. `table` (plus the optional source and reading_time range)
+        names what the query reads, so months whose readings were packed
+        into cold blocks answer it from the decoded blocks instead.
+        Returns (columns, rows).
+        """
+        columns, rows = [], []
+        for month in months:
+            conn = self.partitions.connect_read(month)
+            cold = None
+            try:
+                if table:
+                    cold = self._open_cold(conn, month, table, source_id, since, until)
+                source = cold if cold is not None else conn
+                cursor = source.execute(query, params + ((limit - len(rows),) if limit is not None else ()))
+                rows.extend(cursor.fetchall())
+                columns = [description[0] for description in cursor.description]
+            finally:
+                if cold is not None:
+                    cold.close()
+                conn.close()
+            if limit is not None and len(rows) >= limit:
+                break
+        return columns, rows
     
     def get_latest_location_data(self, location_id: str) -> Optional[Dict]:
         """Get the latest air quality data for a location"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(f"""
+            # Newest partition first, served from the unique reading_time index
+            columns, rows = self._query_partitions(self.partitions.months()[::-1], f"""
                 SELECT * FROM {location_id}_air_quality 
-                ORDER BY timestamp DESC LIMIT 1
-            """)
-            
-            row = cursor.fetchone()
-            conn.close()
+                ORDER BY reading_time DESC LIMIT ?
+            """, limit=1, table=f"{location_id}_air_quality")
             
-            if row:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, row))
+            if rows:
+                return dict(zip(columns, rows[0]))
             return None
         except Exception as e:
             print(f"❌ Error getting {location_id} data: {e}")
@@ -178,33 +1011,69 @@ class AirQualityDatabase:
     def get_location_history(self, location_id: str, hours: int = 24) -> List[Dict]:
         """Get historical data for a location"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # For demo purposes, return all data from September 14-20, 2025
-            cursor.execute(f"""
+            since, until = '2025-09-14T00:00:00Z', '2025-09-20T23:59:59Z'
+            columns, rows = self._query_partitions(self.partitions.months_between(since, until)[::-1], f"""
                 SELECT * FROM {location_id}_air_quality 
-                WHERE reading_time >= '2025-09-14T00:00:00Z' 
-                AND reading_time <= '2025-09-20T23:59:59Z'
+                WHERE reading_time >= ? 
+                AND reading_time <= ?
                 ORDER BY reading_time DESC
-            """)
+            """, (since, until), table=f"{location_id}_air_quality", since=since, until=until)
             
-            rows = cursor.fetchall()
-            conn.close()
-            
-            columns = [description[0] for description in cursor.description]
             return [dict(zip(columns, row)) for row in rows]
         except Exception as e:
             print(f"❌ Error getting {location_id} history: {e}")
             return []
     
+    def get_recent_location_rows(self, location_id: str, columns: List[str], limit: int) -> List[tuple]:
+        """Newest `limit` readings for a location as (reading_time, *columns) tuples, oldest first"""
+        try:
+            _, rows = self._query_partitions(self.partitions.months()[::-1], f"""
+                SELECT reading_time, {", ".join(columns)} FROM {location_id}_air_quality
+                ORDER BY reading_time DESC LIMIT ?
+            """, limit=limit, table=f"{location_id}_air_quality")
+            
+            return rows[::-1]
+        except Exception as e:
+            print(f"❌ Error getting recent {location_id} rows: {e}")
+            return []
+    
+    def get_recent_station_rows(self, station_id: str, columns: List[str], limit: int) -> List[tuple]:
+        """Newest `limit` readings for a station as (reading_time, *columns) tuples, oldest first"""
+        try:
+            _, rows = self._query_partitions(self.partitions.months()[::-1], f"""
+                SELECT reading_time, {", ".join(columns)} FROM nyc_station_readings
+                WHERE station_id = ?
+                ORDER BY reading_time DESC LIMIT ?
+            """, (station_id,), limit=limit, table="nyc_station_readings", source_id=station_id)
+            
+            return rows[::-1]
+        except Exception as e:
+            print(f"❌ Error getting recent {station_id} rows: {e}")
+            return []
+    
+    def get_location_rows_between(self, location_id: str, columns: List[str], since: str,
+                                  until: str) -> List[tuple]:
+        """Readings with since <= reading_time < until as (reading_time, *columns) tuples, oldest first"""
+        try:
+            _, rows = self._query_partitions(self.partitions.months_between(since, until), f"""
+                SELECT reading_time, {", ".join(columns)} FROM {location_id}_air_quality
+                WHERE reading_time >= ? AND reading_time < ?
+                ORDER BY reading_time
+            """, (since, until), table=f"{location_id}_air_quality", since=since, until=until)
+            
+            return rows
+        except Exception as e:
+            print(f"❌ Error getting {location_id} rows: {e}")
+            return []
+    
     def get_all_stations_data(self) -> List[Dict]:
-        """Get all NYC station data"""
+        """Get the latest snapshot of every NYC station"""
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            cursor.execute("SELECT * FROM nyc_stations ORDER BY timestamp DESC")
+            cursor.execute("SELECT * FROM nyc_stations ORDER BY station_id")
             rows = cursor.fetchall()
             conn.close()
             
@@ -214,34 +1083,83 @@ class AirQualityDatabase:
             print(f"❌ Error getting stations data: {e}")
             return []
     
+    def get_station_history(self, station_id: str, since: str, until: Optional[str] = None) -> List[Dict]:
+        """Get a station's readings with reading_time in [since, until], oldest first"""
+        try:
+            until = until or "9999-12-31T23:59:59Z"
+            columns, rows = self._query_partitions(self.partitions.months_between(since, until), """
+                SELECT * FROM nyc_station_readings
+                WHERE station_id = ? AND reading_time >= ? AND reading_time <= ?
+                ORDER BY reading_time
+            """, (station_id, since, until), table="nyc_station_readings", source_id=station_id,
+                since=since, until=until)
+            
+            return [dict(zip(columns, row)) for row in rows]
+        except Exception as e:
+            print(f"❌ Error getting {station_id} history: {e}")
+            return []
+    
+    def _profile_row(self, user_id: str, profile_data: Dict) -> tuple:
+        return (
+            user_id,
+            profile_data.get('age'),
+            profile_data.get('sex'),
+            profile_data.get('smoking_status'),
+            json.dumps(profile_data.get('health_conditions', []))
+        )
+    
     def save_user_profile(self, user_id: str, profile_data: Dict) -> bool:
-        """Save user profile data"""
+        """Save user profile data (upsert that keeps the original created_at)"""
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            cursor.execute("""
-                INSERT OR REPLACE INTO user_profiles 
-                (user_id, age, sex, smoking_status, health_conditions, updated_at)
-                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (
-                user_id,
-                profile_data.get('age'),
-                profile_data.get('sex'),
-                profile_data.get('smoking_status'),
-                json.dumps(profile_data.get('health_conditions', []))
-            ))
+            cursor.execute(PROFILE_UPSERT_SQL, self._profile_row(user_id, profile_data))
             
             conn.commit()
             conn.close()
+            self.profile_cache.invalidate(user_id)
             return True
         except Exception as e:
             print(f"❌ Error saving user profile: {e}")
             return False
     
+    def import_user_profiles(self, profiles: List[Dict]) -> Dict:
+        """Bulk-upsert profiles in a single transaction.
+
+        Each profile needs a 'userId' (or 'user_id'); entries without one are
+        skipped. Returns the number imported and skipped; database errors
+        are raised, since they are not the input's fault.
+        """
+        rows = []
+        skipped = 0
+        for profile in profiles:
+            user_id = profile.get('userId') or profile.get('user_id')
+            if not user_id:
+                skipped += 1
+                continue
+            rows.append(self._profile_row(str(user_id), profile))
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                conn.executemany(PROFILE_UPSERT_SQL, rows)
+        finally:
+            conn.close()
+        
+        for row in rows:
+            self.profile_cache.invalidate(row[0])
+        return {"imported": len(rows), "skipped": skipped}
+    
     def get_user_profile(self, user_id: str) -> Optional[Dict]:
-        """Get user profile data"""
+        """Get user profile data (served from the LRU cache when warm)"""
+        profile = self.profile_cache.get(user_id)
+        if profile is not None:
+            return dict(profile, health_conditions=list(profile['health_conditions'] or []))
+        
         try:
+            # Taken before the read, so a save landing in between keeps this row out of the cache
+            token = self.profile_cache.token(user_id)
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
@@ -255,33 +1173,274 @@ class AirQualityDatabase:
                 # Parse health_conditions JSON
                 if profile['health_conditions']:
                     profile['health_conditions'] = json.loads(profile['health_conditions'])
-                return profile
+                self.profile_cache.put(user_id, profile, token)
+                return dict(profile, health_conditions=list(profile['health_conditions'] or []))
             return None
         except Exception as e:
             print(f"❌ Error getting user profile: {e}")
             return None
     
-    def get_database_stats(self) -> Dict:
-        """Get database statistics"""
+    def save_alert_subscriptions(self, user_id: str, thresholds: Dict[str, float]) -> bool:
+        """Replace a user's alert subscriptions with {location_id: threshold}"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            with conn:
+                conn.execute("DELETE FROM alert_subscriptions WHERE user_id = ?", (user_id,))
+                conn.executemany("""
+                    INSERT INTO alert_subscriptions (user_id, location_id, threshold)
+                    VALUES (?, ?, ?)
+                """, [(user_id, location_id, threshold) for location_id, threshold in thresholds.items()])
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"❌ Error saving alert subscriptions: {e}")
+            return False
+    
+    def get_alert_subscriptions(self, user_id: Optional[str] = None) -> List[Dict]:
+        """Get alert subscriptions for one user, or all of them"""
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            stats = {}
-            locations = ["home", "work", "football", "studio", "daycare"]
+            if user_id:
+                cursor.execute("SELECT user_id, location_id, threshold FROM alert_subscriptions WHERE user_id = ?", (user_id,))
+            else:
+                cursor.execute("SELECT user_id, location_id, threshold FROM alert_subscriptions")
+            rows = cursor.fetchall()
+            conn.close()
+            
+            return [{"user_id": u, "location_id": l, "threshold": t} for u, l, t in rows]
+        except Exception as e:
+            print(f"❌ Error getting alert subscriptions: {e}")
+            return []
+    
+    def save_user_schedule(self, user_id: str, blocks: List[Dict]) -> bool:
+        """Replace a user's schedule with blocks of {location, days, start_minute, end_minute}"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            with conn:
+                conn.execute("DELETE FROM user_schedules WHERE user_id = ?", (user_id,))
+                conn.executemany("""
+                    INSERT INTO user_schedules (user_id, position, location_id, days, start_minute, end_minute)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [
+                    (user_id, position, block["location"], "".join(str(d) for d in block["days"]),
+                     block["start_minute"], block["end_minute"])
+                    for position, block in enumerate(blocks)
+                ])
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"❌ Error saving user schedule: {e}")
+            return False
+    
+    def get_user_schedules(self, user_ids: Optional[List[str]] = None) -> Dict[str, List[Dict]]:
+        """Get schedules as {user_id: [block, ...]} for the given users, or all of them"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
             
-            for location in locations:
-                cursor.execute(f"SELECT COUNT(*) FROM {location}_air_quality")
-                count = cursor.fetchone()[0]
-                stats[f"{location}_records"] = count
+            query = "SELECT user_id, location_id, days, start_minute, end_minute FROM user_schedules"
+            if user_ids is not None:
+                # Temp table join rather than a huge IN (...) list for large batches
+                cursor.execute("CREATE TEMP TABLE schedule_users (user_id TEXT PRIMARY KEY)")
+                cursor.executemany("INSERT OR IGNORE INTO schedule_users VALUES (?)", [(u,) for u in user_ids])
+                query += " WHERE user_id IN (SELECT user_id FROM schedule_users)"
+            cursor.execute(query + " ORDER BY user_id, position")
+            rows = cursor.fetchall()
+            conn.close()
             
-            cursor.execute("SELECT COUNT(*) FROM nyc_stations")
-            stats["station_records"] = cursor.fetchone()[0]
+            schedules = {}
+            for user_id, location_id, days, start_minute, end_minute in rows:
+                schedules.setdefault(user_id, []).append({
+                    "location": location_id,
+                    "days": [int(d) for d in days],
+                    "start_minute": start_minute,
+                    "end_minute": end_minute
+                })
+            return schedules
+        except Exception as e:
+            print(f"❌ Error getting user schedules: {e}")
+            return {}
+    
+    def get_reading_flags(self, source_type: Optional[str] = None, source_id: Optional[str] = None,
+                          kind: Optional[str] = None, since: Optional[str] = None,
+                          limit: int = 100) -> List[Dict]:
+        """Get anomaly flags, newest reading first, optionally filtered"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
             
-            cursor.execute("SELECT COUNT(*) FROM user_profiles")
-            stats["user_profiles"] = cursor.fetchone()[0]
+            conditions, params = [], []
+            for column, value in (("source_type", source_type), ("source_id", source_id), ("kind", kind)):
+                if value:
+                    conditions.append(f"{column} = ?")
+                    params.append(value)
+            if since:
+                conditions.append("reading_time >= ?")
+                params.append(since)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
             
+            cursor.execute(f"""
+                SELECT id, {", ".join(FLAG_COLUMNS)}, created_at FROM reading_flags
+                {where}
+                ORDER BY reading_time DESC, id DESC LIMIT ?
+            """, (*params, limit))
+            rows = cursor.fetchall()
             conn.close()
+            
+            columns = [description[0] for description in cursor.description]
+            flags = [dict(zip(columns, row)) for row in rows]
+            for flag in flags:
+                flag["reading"] = json.loads(flag["reading"]) if flag["reading"] else None
+            return flags
+        except Exception as e:
+            print(f"❌ Error getting reading flags: {e}")
+            return []
+    
+    def _get_table_sizes(self, key: str = "main") -> Dict[str, int]:
+        """Last computed on-disk bytes per table (with its indexes) for one file; {} until computed.
+
+        Never walks pages itself: missing or stale sizes (older than
+        size_cache_seconds; frozen partitions never go stale) are handed to
+        the background refresh, so the stats request stays counter reads.
+        """
+        cached = self._table_sizes.get(key)
+        if not cached or (cached[0] is not None and time.monotonic() - cached[0] >= self.size_cache_seconds):
+            self._request_size_refresh()
+        return cached[1] if cached else {}
+    
+    def _request_size_refresh(self):
+        self._size_refresh.set()
+        with self._size_lock:
+            if self._size_thread is None or not self._size_thread.is_alive():
+                self._size_thread = threading.Thread(target=self._size_loop, name="table-sizes", daemon=True)
+                self._size_thread.start()
+    
+    def _size_loop(self):
+        while True:
+            self._size_refresh.wait()
+            self._size_refresh.clear()
+            try:
+                self.refresh_table_sizes()
+            except Exception as e:
+                print(f"❌ Table size refresh failed: {e}")
+    
+    def _measure_table_sizes(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        try:
+            rows = conn.execute("""
+                SELECT m.tbl_name, SUM(s.pgsize)
+                FROM dbstat('main', 1) s JOIN sqlite_master m ON m.name = s.name
+                GROUP BY m.tbl_name
+            """).fetchall()
+        except sqlite3.OperationalError:
+            # SQLite built without the dbstat virtual table
+            rows = []
+        return dict(rows)
+    
+    def refresh_table_sizes(self):
+        """Re-measure table sizes of every file whose cached sizes are missing or stale"""
+        now = time.monotonic()
+        
+        def stale(key):
+            cached = self._table_sizes.get(key)
+            return not cached or (cached[0] is not None and now - cached[0] >= self.size_cache_seconds)
+        
+        if stale("main"):
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True)
+            try:
+                self._table_sizes["main"] = (time.monotonic(), self._measure_table_sizes(conn))
+            finally:
+                conn.close()
+        months = self.partitions.months()
+        for month in months:
+            if not stale(month):
+                continue
+            frozen = self.partitions.is_frozen(month)
+            conn = self.partitions.connect_read(month)
+            try:
+                self._table_sizes[month] = (None if frozen else time.monotonic(), self._measure_table_sizes(conn))
+            finally:
+                conn.close()
+        for key in set(self._table_sizes) - set(months) - {"main"}:
+            self._table_sizes.pop(key, None)
+    
+    def _read_table_stats(self, conn: sqlite3.Connection, key: str = "main") -> Dict[str, Dict]:
+        """Trigger-maintained counters of one file as {table: stats}"""
+        rows = conn.execute("""
+            SELECT s.table_name, s.row_count, s.min_time, s.max_time, s.last_insert_at,
+                   COALESCE(SUM(m.inserts), 0)
+            FROM table_stats s
+            LEFT JOIN table_ingest_minutes m
+                ON m.table_name = s.table_name
+                AND m.minute >= strftime('%Y-%m-%dT%H:%M', 'now', '-60 minutes')
+            GROUP BY s.table_name
+        """).fetchall()
+        sizes = self._get_table_sizes(key)
+        
+        tables = {}
+        for table, row_count, min_time, max_time, last_insert_at, recent_inserts in rows:
+            tables[table] = {
+                "rows": row_count,
+                "min_time": min_time,
+                "max_time": max_time,
+                "last_insert_at": last_insert_at,
+                "recent_inserts": recent_inserts,
+                "size_bytes": sizes.get(table)
+            }
+        return tables
+    
+    def get_database_stats(self) -> Dict:
+        """Get database statistics from the trigger-maintained counters of the main file and every partition"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            tables = self._read_table_stats(conn)
+            database_size = os.path.getsize(self.db_path)
+            conn.close()
+            
+            partitions = []
+            for month in self.partitions.months():
+                frozen = self.partitions.is_frozen(month)
+                conn = self.partitions.connect_read(month)
+                month_tables = self._read_table_stats(conn, month)
+                conn.close()
+                size = os.path.getsize(self.partitions.path(month))
+                database_size += size
+                partitions.append({
+                    "month": month,
+                    "frozen": frozen,
+                    "rows": sum(t["rows"] for t in month_tables.values()),
+                    "size_bytes": size
+                })
+                
+                # Fold each partition's counters into one entry per table
+                for table, month_stats in month_tables.items():
+                    merged = tables.setdefault(table, {
+                        "rows": 0, "min_time": None, "max_time": None, "last_insert_at": None,
+                        "recent_inserts": 0, "size_bytes": None
+                    })
+                    merged["rows"] += month_stats["rows"]
+                    merged["recent_inserts"] += month_stats["recent_inserts"]
+                    for field, pick in (("min_time", min), ("max_time", max), ("last_insert_at", max)):
+                        values = [v for v in (merged[field], month_stats[field]) if v is not None]
+                        merged[field] = pick(values) if values else None
+                    if month_stats["size_bytes"] is not None:
+                        merged["size_bytes"] = (merged["size_bytes"] or 0) + month_stats["size_bytes"]
+            
+            for table_stats in tables.values():
+                table_stats["ingest_rate_per_min"] = round(table_stats.pop("recent_inserts") / 60, 2)
+            
+            stats = {}
+            for location in LOCATION_IDS:
+                stats[f"{location}_records"] = tables.get(f"{location}_air_quality", {}).get("rows", 0)
+            stats["station_records"] = tables.get("nyc_stations", {}).get("rows", 0)
+            stats["station_history_records"] = tables.get("nyc_station_readings", {}).get("rows", 0)
+            stats["user_profiles"] = tables.get("user_profiles", {}).get("rows", 0)
+            stats["reading_flags"] = tables.get("reading_flags", {}).get("rows", 0)
+            stats["tables"] = tables
+            stats["partitions"] = partitions
+            stats["database_size_bytes"] = database_size
+            
             return stats
         except Exception as e:
             print(f"❌ Error getting database stats: {e}")
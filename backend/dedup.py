@@ -0,0 +1,39 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable
+
+
+class RecentKeyCache:
+    """Bounded LRU of recently written reading keys and a fingerprint of their values.
+
+    Lets the write path drop exact re-deliveries (same key, same values) before
+    they reach SQLite. A key that comes back with different values is passed
+    through so the upsert can apply the correction.
+    """
+
+    def __init__(self, maxsize: int = 50000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def is_duplicate(self, key: Hashable, fingerprint: Hashable) -> bool:
+        with self.lock:
+            if self.entries.get(key) == fingerprint:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def remember(self, key: Hashable, fingerprint: Hashable):
+        with self.lock:
+            self.entries[key] = fingerprint
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,231 @@
+import threading
+import warnings
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from cache import LRUCache
+from ringbuffer import nan_to_none, reading_times_to_epoch
+
+# Fields integrated over time, in output order
+EXPOSURE_FIELDS = ["aqi_value", "pm25", "pm10", "o3", "no2", "so2", "co"]
+
+MINUTES_PER_DAY = 24 * 60
+
+# Where unscheduled time is spent
+DEFAULT_LOCATION = "home"
+
+
+def parse_time_of_day(value: str) -> int:
+    """'HH:MM' -> minute of day ('24:00' is allowed as an end time)"""
+    hours, minutes = (int(part) for part in value.split(":"))
+    minute = hours * 60 + minutes
+    if not 0 <= minutes < 60 or not 0 <= minute <= MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time of day: {value}")
+    return minute
+
+
+def day_segments(block: Dict, weekday: int) -> List[tuple]:
+    """(start, end) minute ranges a block covers on one weekday.
+
+    A block whose end is before its start wraps past midnight: it starts on
+    its listed days and runs into the next morning, so a Mon-Fri 22:00-06:00
+    block covers Tuesday-Saturday 00:00-06:00.
+    """
+    start, end = block["start_minute"], block["end_minute"]
+    if end > start:
+        return [(start, end)] if weekday in block["days"] else []
+    segments = []
+    if (weekday - 1) % 7 in block["days"] and end > 0:
+        segments.append((0, end))
+    if weekday in block["days"]:
+        segments.append((start, MINUTES_PER_DAY))
+    return segments
+
+
+def occupancy_for_day(blocks: List[Dict], weekday: int, location_index: Dict[str, int],
+                      default_index: int) -> np.ndarray:
+    """Location index for every minute of one day; later blocks override earlier ones"""
+    occupancy = np.full(MINUTES_PER_DAY, default_index, dtype=np.int8)
+    for block in blocks:
+        index = location_index.get(block["location"])
+        if index is None:
+            continue
+        for start, end in day_segments(block, weekday):
+            occupancy[start:end] = index
+    return occupancy
+
+
+def minute_concentrations(epochs: np.ndarray, values: np.ndarray, day_start: int,
+                          max_hold_minutes: int) -> np.ndarray:
+    """Sample-and-hold readings onto the day's minute grid -> (1440, fields).
+
+    Each reading holds until the next one, for at most `max_hold_minutes`;
+    minutes with no recent reading are NaN.
+    """
+    minutes = day_start + 60 * np.arange(MINUTES_PER_DAY)
+    if not len(epochs):
+        return np.full((MINUTES_PER_DAY, values.shape[1]), np.nan)
+    index = np.searchsorted(epochs, minutes, side="right") - 1
+    clipped = np.maximum(index, 0)
+    valid = (index >= 0) & (minutes - epochs[clipped] <= max_hold_minutes * 60)
+    grid = values[clipped]
+    grid[~valid] = np.nan
+    return grid
+
+
+def integrate_exposure(exposure: np.ndarray, rolling_hours: int) -> Dict[str, np.ndarray]:
+    """Time-weighted statistics for a stack of per-minute exposure series.
+
+    `exposure` is (users, 1440, fields) in concentration units; results are
+    in concentration-hours (cumulative) or concentration (means). The
+    rolling mean is trailing and stays within the day.
+    """
+    valid = ~np.isnan(exposure)
+    filled = np.where(valid, exposure, 0.0)
+    zeros = np.zeros((exposure.shape[0], 1, exposure.shape[2]))
+    csum = np.concatenate([zeros, np.cumsum(filled, axis=1)], axis=1)
+    ccount = np.concatenate([zeros, np.cumsum(valid, axis=1)], axis=1)
+
+    hour_ends = 60 * np.arange(1, 25)
+    window = rolling_hours * 60
+    window_starts = np.maximum(hour_ends - window, 0)
+    rolling_sums = csum[:, hour_ends] - csum[:, window_starts]
+    rolling_counts = ccount[:, hour_ends] - ccount[:, window_starts]
+
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        # Require half the window to be covered before reporting a rolling mean
+        rolling_mean = np.where(rolling_counts >= np.minimum(window, hour_ends)[None, :, None] / 2,
+                                rolling_sums / rolling_counts, np.nan)
+        total_minutes = ccount[:, -1]
+        return {
+            "cumulative": csum[:, -1] / 60,
+            "cumulative_by_hour": csum[:, hour_ends] / 60,
+            "time_weighted_average": csum[:, -1] / total_minutes,
+            "covered_hours": total_minutes / 60,
+            "rolling_mean_by_hour": rolling_mean,
+            "max_rolling_mean": np.nanmax(rolling_mean, axis=1)
+        }
+
+
+class ExposureEngine:
+    """Time-weighted personal exposure from user schedules and stored readings.
+
+    For a given UTC day the readings of every location are put on a shared
+    minute grid once; each user's schedule becomes a per-minute location
+    index, so their exposure is a single gather plus cumulative sums.
+    Users with identical schedules for the day share one computation.
+    Results are cached per (user, day) and dropped when new readings for
+    that day arrive or the user's schedule changes.
+    """
+
+    def __init__(self, db, location_ids: List[str], max_hold_minutes: int = 90, rolling_hours: int = 8,
+                 chunk_size: int = 128, cache_size: int = 50000):
+        self.db = db
+        self.location_ids = list(location_ids)
+        self.location_index = {location_id: i for i, location_id in enumerate(self.location_ids)}
+        self.max_hold_minutes = max_hold_minutes
+        self.rolling_hours = rolling_hours
+        self.chunk_size = chunk_size
+        self.cache = LRUCache(cache_size)
+        self.day_versions: Dict[str, int] = {}
+        self.user_versions: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def _cache_key(self, user_id: str, day: str) -> tuple:
+        with self.lock:
+            return (user_id, day, self.day_versions.get(day, 0), self.user_versions.get(user_id, 0))
+
+    def on_location_saved(self, location_id: str, readings: List[Dict]):
+        """AirQualityDatabase save listener: new readings make that day's results stale"""
+        days = {r["reading_time"][:10] for r in readings}
+        # A reading also holds into the first minutes of the next day
+        days |= {(date.fromisoformat(d) + timedelta(days=1)).isoformat() for d in days}
+        with self.lock:
+            for day in days:
+                self.day_versions[day] = self.day_versions.get(day, 0) + 1
+
+    def invalidate_user(self, user_id: str):
+        """Call after a user's schedule changes"""
+        with self.lock:
+            self.user_versions[user_id] = self.user_versions.get(user_id, 0) + 1
+
+    def concentrations(self, day: date) -> np.ndarray:
+        """(locations, 1440, fields) minute grid of held readings for one UTC day"""
+        day_start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        since = (day_start - timedelta(minutes=self.max_hold_minutes)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        until = (day_start + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        grids = []
+        for location_id in self.location_ids:
+            rows = self.db.get_location_rows_between(location_id, EXPOSURE_FIELDS, since, until)
+            epochs = reading_times_to_epoch([row[0] for row in rows])
+            values = np.array([row[1:] for row in rows], dtype=float).reshape(len(rows), len(EXPOSURE_FIELDS))
+            grids.append(minute_concentrations(epochs, values, int(day_start.timestamp()), self.max_hold_minutes))
+        return np.stack(grids)
+
+    def compute(self, user_ids: List[str], day: date) -> Dict[str, Dict]:
+        """Exposure for many users on one UTC day -> {user_id: result}"""
+        day_key = day.isoformat()
+        results, missing = {}, []
+        for user_id in user_ids:
+            cached = self.cache.get(self._cache_key(user_id, day_key))
+            if cached is not None:
+                results[user_id] = cached
+            else:
+                missing.append(user_id)
+        if not missing:
+            return results
+
+        # Read versions before the data so a concurrent save leaves these entries stale
+        keys = {user_id: self._cache_key(user_id, day_key) for user_id in missing}
+        schedules = self.db.get_user_schedules(missing)
+        weekday = day.weekday()
+        default_index = self.location_index[DEFAULT_LOCATION]
+        # Group users by the block segments that fall on this weekday (including last night's overnight blocks)
+        schedule_positions, unique_schedules, inverse = {}, [], []
+        for user_id in missing:
+            blocks = [b for b in schedules.get(user_id, []) if day_segments(b, weekday)]
+            key = tuple((b["location"], tuple(day_segments(b, weekday))) for b in blocks)
+            if key not in schedule_positions:
+                schedule_positions[key] = len(unique_schedules)
+                unique_schedules.append(blocks)
+            inverse.append(schedule_positions[key])
+        unique_occupancy = np.stack([
+            occupancy_for_day(blocks, weekday, self.location_index, default_index) for blocks in unique_schedules
+        ])
+
+        grid = self.concentrations(day)
+        minute_index = np.arange(MINUTES_PER_DAY)
+        unique_results = []
+        for start in range(0, len(unique_occupancy), self.chunk_size):
+            chunk = unique_occupancy[start:start + self.chunk_size]
+            stats = integrate_exposure(grid[chunk, minute_index], self.rolling_hours)
+            for i, schedule in enumerate(chunk):
+                hours_at = np.bincount(schedule, minlength=len(self.location_ids)) / 60
+                unique_results.append({
+                    "date": day_key,
+                    "fields": EXPOSURE_FIELDS,
+                    "units": {"cumulative": "concentration_hours", "means": "concentration"},
+                    "rolling_hours": self.rolling_hours,
+                    "hours_by_location": {
+                        location_id: float(hours_at[j]) for j, location_id in enumerate(self.location_ids) if hours_at[j]
+                    },
+                    "covered_hours": stats["covered_hours"][i].tolist(),
+                    "cumulative": nan_to_none(stats["cumulative"][i]),
+                    "time_weighted_average": nan_to_none(stats["time_weighted_average"][i]),
+                    "max_rolling_mean": nan_to_none(stats["max_rolling_mean"][i]),
+                    "cumulative_by_hour": [nan_to_none(row) for row in stats["cumulative_by_hour"][i]],
+                    "rolling_mean_by_hour": [nan_to_none(row) for row in stats["rolling_mean_by_hour"][i]]
+                })
+
+        for user_id, unique_position in zip(missing, inverse):
+            result = unique_results[unique_position]
+            self.cache.put(keys[user_id], result)
+            results[user_id] = result
+        return results
+
+    def compute_user(self, user_id: str, day: date) -> Optional[Dict]:
+        return self.compute([user_id], day).get(user_id)
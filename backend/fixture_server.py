@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Fixture Server Script
+Serve a fake upstream station feed so ingestion can be tested locally
+
+Usage:
+    python fixture_server.py                 # random readings on every request
+    python fixture_server.py fixtures.json   # replay a fixed {"stations": [...]} payload
+"""
+
+import json
+import random
+import sys
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ingestion import NYC_STATIONS
+
+PORT = 5055
+
+
+def generate_fixture_payload():
+    """Build one feed payload in the upstream (un-normalized) shape"""
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return {
+        "stations": [
+            {
+                "station_id": station["id"],
+                "location": station["location"],
+                "latitude": station["latitude"],
+                "longitude": station["longitude"],
+                "aqi_value": random.randint(20, 160),
+                "primary_pollutant": random.choice(["PM2.5", "O3", "NO2"]),
+                "pm25": round(random.uniform(5, 40), 2),
+                "pm10": round(random.uniform(10, 60), 2),
+                "o3": round(random.uniform(15, 70), 2),
+                "no2": round(random.uniform(5, 45), 2),
+                "so2": round(random.uniform(2, 20), 2),
+                "co": round(random.uniform(0.2, 3.0), 2),
+                "temperature": round(random.uniform(5, 30), 2),
+                "humidity": round(random.uniform(30, 90), 2),
+                "reading_time": now.isoformat()
+            }
+            for station in NYC_STATIONS
+        ]
+    }
+
+
+def make_handler(fixture=None):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/stations":
+                self.send_error(404)
+                return
+
+            body = json.dumps(fixture or generate_fixture_payload()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+if __name__ == "__main__":
+    fixture = None
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            fixture = json.load(f)
+
+    server = ThreadingHTTPServer(("0.0.0.0", PORT), make_handler(fixture))
+    print(f"🧪 Fixture feed running on http://localhost:{PORT}/stations")
+    print(f"   Point the backend at it with INGEST_SOURCES=fixture:http://localhost:{PORT}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
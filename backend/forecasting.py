@@ -0,0 +1,199 @@
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ringbuffer import RingBuffer, reading_times_to_epoch
+
+HOUR = 3600
+
+
+def hourly_series(epochs: np.ndarray, values: np.ndarray, history_hours: int):
+    """Resample readings onto a contiguous hourly grid ending at the newest hour.
+
+    Readings in the same hour are averaged; empty hours are linearly
+    interpolated from their neighbours.
+    """
+    hours = epochs // HOUR
+    last_hour = hours.max()
+    mask = hours > last_hour - history_hours
+    hours, values = hours[mask], values[mask]
+
+    index = hours - hours.min()
+    sums = np.bincount(index, weights=values)
+    counts = np.bincount(index)
+    grid = np.arange(len(sums))
+    present = counts > 0
+    series = np.interp(grid, grid[present], sums[present] / counts[present])
+    return (hours.min() + grid) * HOUR, series
+
+
+def lag_features(series: np.ndarray, hour_epochs: np.ndarray, lags: int) -> np.ndarray:
+    """Design matrix: intercept, the previous `lags` values and hour-of-day harmonics"""
+    n = len(series) - lags
+    columns = [np.ones(n)]
+    columns += [series[lags - k:len(series) - k] for k in range(1, lags + 1)]
+    phase = 2 * np.pi * ((hour_epochs[lags:] // HOUR) % 24) / 24
+    columns += [np.sin(phase), np.cos(phase)]
+    return np.column_stack(columns)
+
+
+def fit_and_forecast(epochs: np.ndarray, values: np.ndarray, horizon: int = 24, lags: int = 6,
+                     alpha: float = 1.0, history_hours: int = 14 * 24) -> Dict:
+    """Fit a ridge regression on lag features and roll it forward `horizon` hours.
+
+    Runs in worker processes, so it only takes and returns plain arrays/dicts.
+    Falls back to persistence when there is too little history to fit.
+    """
+    hour_epochs, series = hourly_series(epochs, values, history_hours)
+    last_hour = int(hour_epochs[-1])
+    future_hours = last_hour + HOUR * np.arange(1, horizon + 1)
+
+    if len(series) < lags + 24:
+        return {
+            "model": "persistence",
+            "points": int(len(series)),
+            "mae": None,
+            "times": future_hours.tolist(),
+            "values": [float(series[-1])] * horizon
+        }
+
+    X = lag_features(series, hour_epochs, lags)
+    y = series[lags:]
+    penalty = alpha * np.eye(X.shape[1])
+    penalty[0, 0] = 0  # do not shrink the intercept
+    weights = np.linalg.solve(X.T @ X + penalty, X.T @ y)
+    mae = float(np.mean(np.abs(X @ weights - y)))
+
+    # Recursive multi-step forecast: each prediction becomes the next lag
+    history = list(series[-lags:])
+    predictions = []
+    for hour in future_hours:
+        phase = 2 * np.pi * ((hour // HOUR) % 24) / 24
+        features = np.concatenate([[1.0], history[::-1][:lags], [np.sin(phase), np.cos(phase)]])
+        prediction = max(0.0, float(features @ weights))
+        predictions.append(prediction)
+        history = history[1:] + [prediction]
+
+    return {
+        "model": "ridge_lag",
+        "points": int(len(series)),
+        "mae": mae,
+        "times": future_hours.tolist(),
+        "values": predictions
+    }
+
+
+class ForecastService:
+    """Precomputes short-horizon AQI forecasts per location after each ingest batch.
+
+    Fitting runs on a process pool so every location is fitted in parallel
+    across cores; the endpoint only ever reads the cached result. start()
+    forks every worker up front, and only while the process is still
+    single-threaded, so no worker inherits another thread's held locks.
+    spawn and forkserver workers would re-import app.py as __main__, so
+    where fork is unsafe (macOS) or unavailable, or when start() is not
+    called first, fits run in-process instead.
+
+    Each location's AQI history lives in a ring buffer of the newest
+    `history_rows` readings, filled once from the database (load_rows) and
+    then appended to by the save path, so a refresh never re-queries it.
+    """
+
+    def __init__(self, location_ids: List[str], horizon: int = 24, history_rows: int = 20000,
+                 max_workers: Optional[int] = None):
+        self.location_ids = location_ids
+        self.horizon = horizon
+        self.history_rows = history_rows
+        self.history = {location_id: RingBuffer(history_rows, width=1) for location_id in location_ids}
+        self.max_workers = max_workers or min(len(location_ids), os.cpu_count() or 1)
+        self.forecasts: Dict[str, Dict] = {}
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Fork the worker pool; call once at startup, before any background thread starts"""
+        if self.executor is not None:
+            return
+        if sys.platform == "darwin" or "fork" not in multiprocessing.get_all_start_methods():
+            return
+        if threading.active_count() > 1:
+            print("⚠️  Forecast workers not forked: other threads are already running, fitting in-process")
+            return
+        executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("fork"))
+        # Under fork the pool launches all its workers on the first submit: do that now
+        executor.submit(int).result()
+        self.executor = executor
+
+    def load_rows(self, location_id: str, rows: List[tuple]):
+        """Fill a location's history from database rows shaped (reading_time, aqi_value)"""
+        if rows:
+            epochs = reading_times_to_epoch([row[0] for row in rows])
+            self.history[location_id].extend(epochs, np.array([row[1:2] for row in rows], dtype=float))
+
+    def on_location_saved(self, location_id: str, readings: List[Dict]):
+        """AirQualityDatabase save listener: append the committed readings to the history"""
+        if location_id in self.history and readings:
+            epochs = reading_times_to_epoch([r["reading_time"] for r in readings])
+            self.history[location_id].extend(epochs, np.array([[r.get("aqi_value")] for r in readings], dtype=float))
+
+    def refresh(self):
+        """Fit every location from its buffered history and replace the cached forecasts"""
+        inputs = {}
+        for location_id in self.location_ids:
+            epochs, values = self.history[location_id].snapshot()
+            present = ~np.isnan(values[:, 0])
+            if present.any():
+                inputs[location_id] = (epochs[present], values[present, 0])
+
+        if not inputs:
+            return
+
+        try:
+            if self.executor is None:
+                raise RuntimeError("not started")
+            futures = {
+                location_id: self.executor.submit(fit_and_forecast, epochs, values, self.horizon)
+                for location_id, (epochs, values) in inputs.items()
+            }
+            results = {location_id: future.result() for location_id, future in futures.items()}
+        except Exception as e:
+            if self.executor is not None:
+                print(f"⚠️  Forecast process pool unavailable, fitting in-process: {e}")
+            results = {
+                location_id: fit_and_forecast(epochs, values, self.horizon)
+                for location_id, (epochs, values) in inputs.items()
+            }
+
+        generated_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        with self.lock:
+            for location_id, result in results.items():
+                self.forecasts[location_id] = dict(result, generated_at=generated_at)
+
+    def get(self, location_id: str) -> Optional[Dict]:
+        with self.lock:
+            return self.forecasts.get(location_id)
+
+    def _loop(self):
+        while True:
+            self.pending.wait()
+            self.pending.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ Forecast refresh failed: {e}")
+
+    def request_refresh(self, *args):
+        """Schedule a refresh; batches arriving during a refresh coalesce into one more run"""
+        self.pending.set()
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._loop, name="forecast-refresh", daemon=True)
+                self.thread.start()
@@ -0,0 +1,133 @@
+import importlib.util
+import json
+from typing import Dict, List, Optional
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+# Encoders from requirements.txt; a format is only offered when its library imports,
+# so a partial install degrades loudly rather than failing at request time
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    print("⚠️  orjson not installed: JSON responses use the slower stdlib encoder (pip install -r requirements.txt)")
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+    print("⚠️  msgpack not installed: ?format=msgpack is unavailable")
+
+# pyarrow takes longer to import than the rest of the app's dependencies,
+# so it is only checked for here and imported on the first Arrow response
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+if not HAS_PYARROW:
+    print("⚠️  pyarrow not installed: ?format=arrow is unavailable")
+
+JSON_MIMETYPE = "application/json"
+COLUMNAR_MIMETYPE = "application/vnd.airwatch.columnar+json"
+MSGPACK_MIMETYPE = "application/x-msgpack"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+FORMAT_MIMETYPES = {
+    "json": JSON_MIMETYPE,
+    "columnar": COLUMNAR_MIMETYPE,
+    "msgpack": MSGPACK_MIMETYPE,
+    "arrow": ARROW_MIMETYPE
+}
+
+ACCEPT_ALIASES = {
+    JSON_MIMETYPE: "json",
+    COLUMNAR_MIMETYPE: "columnar",
+    MSGPACK_MIMETYPE: "msgpack",
+    "application/msgpack": "msgpack",
+    ARROW_MIMETYPE: "arrow"
+}
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes with orjson when it is installed"""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def available_formats() -> List[str]:
+    formats = ["json", "columnar"]
+    if msgpack is not None:
+        formats.append("msgpack")
+    if HAS_PYARROW:
+        formats.append("arrow")
+    return formats
+
+
+def negotiate_format(request) -> Optional[str]:
+    """Pick a format from ?format= or the Accept header; None if nothing acceptable is available"""
+    formats = available_formats()
+    requested = request.args.get("format")
+    if requested:
+        return requested if requested in formats else None
+
+    offered = [mimetype for mimetype, name in ACCEPT_ALIASES.items() if name in formats]
+    best = request.accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+    return ACCEPT_ALIASES.get(best, "json")
+
+
+def to_columnar(rows: List[Dict]) -> Dict[str, list]:
+    """List of row dicts -> {field: [values...]} (keys taken from the first row)"""
+    if not rows:
+        return {}
+    fields = list(rows[0])
+    return {field: [row.get(field) for row in rows] for field in fields}
+
+
+def encode_json(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def encode_rows(fmt: str, rows: List[Dict], key: str, meta: Dict) -> bytes:
+    """Encode `rows` (plus scalar metadata) in one of the negotiated formats.
+
+    json keeps the existing {**meta, key: [row, ...]} shape; columnar and
+    msgpack put {field: [values]} under `key`; arrow writes an IPC stream
+    with the metadata attached to the schema.
+    """
+    if fmt == "json":
+        return encode_json({**meta, key: rows})
+    if fmt == "columnar":
+        return encode_json({**meta, "layout": "columnar", "count": len(rows), key: to_columnar(rows)})
+    if fmt == "msgpack":
+        return msgpack.packb({**meta, "layout": "columnar", "count": len(rows), key: to_columnar(rows)})
+    if fmt == "arrow":
+        import pyarrow as pa
+        table = pa.Table.from_pydict(to_columnar(rows))
+        table = table.replace_schema_metadata({k: json.dumps(v) for k, v in meta.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def rows_response(request, rows: List[Dict], key: str, meta: Optional[Dict] = None) -> Response:
+    """Content-negotiated response for a list of rows"""
+    fmt = negotiate_format(request)
+    if fmt is None:
+        body = encode_json({"error": "Unsupported format", "available": available_formats()})
+        return Response(body, status=406, mimetype=JSON_MIMETYPE)
+
+    response = Response(encode_rows(fmt, rows, key, meta or {}), mimetype=FORMAT_MIMETYPES[fmt])
+    response.vary.add("Accept")
+    return response
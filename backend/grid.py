@@ -0,0 +1,113 @@
+import base64
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cache import LRUCache
+
+# (min_lon, min_lat, max_lon, max_lat) covering the five boroughs
+NYC_BBOX = (-74.26, 40.49, -73.70, 40.92)
+
+
+def idw_grid(lats: np.ndarray, lons: np.ndarray, values: np.ndarray, bbox: Tuple[float, float, float, float],
+             rows: int, cols: int, power: float = 2.0) -> np.ndarray:
+    """Inverse-distance-weighted surface over a regular lat/lon grid.
+
+    Row 0 is the northern edge. Distances use an equirectangular
+    approximation, which is plenty at city scale.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    grid_lats = np.linspace(max_lat, min_lat, rows)
+    grid_lons = np.linspace(min_lon, max_lon, cols)
+
+    lon_scale = np.cos(np.radians((min_lat + max_lat) / 2))
+    d_lat = grid_lats[:, None, None] - lats[None, None, :]
+    d_lon = (grid_lons[None, :, None] - lons[None, None, :]) * lon_scale
+    dist_sq = d_lat ** 2 + d_lon ** 2
+
+    with np.errstate(divide="ignore"):
+        weights = dist_sq ** (-power / 2)
+    # Cells sitting exactly on a station take that station's value
+    exact = np.isinf(weights)
+    if exact.any():
+        weights = np.where(exact.any(axis=2, keepdims=True), exact.astype(float), weights)
+
+    return (weights * values).sum(axis=2) / weights.sum(axis=2)
+
+
+def grid_size_for_zoom(zoom: int) -> int:
+    """Cells per side: 64 at zoom 10, doubling per zoom level, clamped to [16, 256]"""
+    return int(min(256, max(16, 64 * 2 ** (zoom - 10))))
+
+
+class AQIGridService:
+    """Keeps the latest station AQIs and serves cached interpolated grids.
+
+    Station updates bump a version; grids are cached per (version, zoom,
+    bbox) and the default NYC grid is recomputed eagerly after each batch,
+    so map clients get a cached array plus an ETag for conditional GETs.
+    """
+
+    def __init__(self, default_zoom: int = 10, power: float = 2.0, cache_size: int = 256):
+        self.default_zoom = default_zoom
+        self.power = power
+        self.stations: Dict[str, Tuple[float, float, float]] = {}
+        self.version = 0
+        self.cache = LRUCache(cache_size)
+        self.lock = threading.Lock()
+
+    def load_stations(self, stations: List[Dict]):
+        """Seed from station snapshot rows (get_all_stations_data)"""
+        with self.lock:
+            for station in stations:
+                self.stations[station["station_id"]] = (station["latitude"], station["longitude"], station["aqi_value"])
+            self.version += 1
+
+    def on_station_saved(self, station_id: str, readings: List[Dict]):
+        """AirQualityDatabase station save listener"""
+        latest = max(readings, key=lambda r: r["reading_time"])
+        with self.lock:
+            self.stations[station_id] = (latest["latitude"], latest["longitude"], latest["aqi_value"])
+            self.version += 1
+
+    def on_batch_saved(self, readings: List[Dict]):
+        """AirQualityDatabase batch listener: precompute the default view"""
+        self.get_grid(NYC_BBOX, self.default_zoom)
+
+    def get_grid(self, bbox: Tuple[float, float, float, float], zoom: int) -> Optional[Dict]:
+        """Cached grid payload for a bbox/zoom, or None when no station data exists"""
+        bbox = tuple(round(v, 4) for v in bbox)
+        with self.lock:
+            version = self.version
+            stations = list(self.stations.values())
+
+        key = (version, zoom, bbox)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        if not stations:
+            return None
+
+        points = np.array(stations, dtype=float)
+        size = grid_size_for_zoom(zoom)
+        surface = idw_grid(points[:, 0], points[:, 1], points[:, 2], bbox, size, size, self.power)
+        data = np.clip(np.rint(surface), 0, 65535).astype("<u2").tobytes()
+
+        payload = {
+            "bbox": list(bbox),
+            "zoom": zoom,
+            "rows": size,
+            "cols": size,
+            "dtype": "uint16",
+            "encoding": "base64",
+            "row_order": "north_to_south",
+            "min": int(np.rint(surface.min())),
+            "max": int(np.rint(surface.max())),
+            "stations": len(stations),
+            "data": base64.b64encode(data).decode("ascii"),
+            "etag": hashlib.sha1(data + repr((zoom, bbox)).encode()).hexdigest()[:20]
+        }
+        self.cache.put(key, payload)
+        return payload
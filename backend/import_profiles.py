@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Import Profiles Script
+Bulk load user profiles from a JSON or CSV file in a single transaction
+
+JSON: a list of profiles (or {"profiles": [...]}) using the same fields as
+POST /api/users/profile. CSV: columns userId, age, sex, smoking_status and
+health_conditions (semicolon separated).
+"""
+
+import csv
+import json
+import sqlite3
+import sys
+import time
+
+from database import AirQualityDatabase
+
+
+def load_profiles(file_path):
+    """Read profiles from a .json or .csv file"""
+    if file_path.endswith(".csv"):
+        profiles = []
+        with open(file_path, newline="") as f:
+            for row in csv.DictReader(f):
+                conditions = row.get("health_conditions") or ""
+                profiles.append({
+                    "userId": row.get("userId") or row.get("user_id"),
+                    "age": int(row["age"]) if row.get("age") else None,
+                    "sex": row.get("sex") or None,
+                    "smoking_status": row.get("smoking_status") or None,
+                    "health_conditions": [c.strip() for c in conditions.split(";") if c.strip()]
+                })
+        return profiles
+
+    with open(file_path) as f:
+        data = json.load(f)
+    return data.get("profiles", []) if isinstance(data, dict) else data
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python import_profiles.py <profiles.json|profiles.csv> [db_path]")
+        sys.exit(1)
+
+    db = AirQualityDatabase(sys.argv[2] if len(sys.argv) > 2 else "air_quality.db")
+    profiles = load_profiles(sys.argv[1])
+
+    print(f"👥 Importing {len(profiles)} profiles from {sys.argv[1]}...")
+    started = time.perf_counter()
+    try:
+        result = db.import_user_profiles(profiles)
+    except sqlite3.Error as e:
+        print(f"❌ Import failed, nothing was imported: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    print(f"✅ Imported {result['imported']} profiles in {elapsed:.2f}s")
+    if result["skipped"]:
+        print(f"⚠️  Skipped {result['skipped']} profiles without a userId")
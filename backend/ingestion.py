@@ -0,0 +1,301 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+
+# NYC Monitoring Stations
+NYC_STATIONS = [
+    {
+        "id": "manhattan_midtown",
+        "location": "Manhattan Midtown",
+        "latitude": 40.7589,
+        "longitude": -73.9851
+    },
+    {
+        "id": "brooklyn_downtown",
+        "location": "Brooklyn Downtown",
+        "latitude": 40.6943,
+        "longitude": -73.9903
+    },
+    {
+        "id": "queens_astoria",
+        "location": "Queens Astoria",
+        "latitude": 40.7794,
+        "longitude": -73.9217
+    },
+    {
+        "id": "bronx_south",
+        "location": "Bronx South",
+        "latitude": 40.8448,
+        "longitude": -73.8648
+    },
+    {
+        "id": "staten_island_north",
+        "location": "Staten Island North",
+        "latitude": 40.6415,
+        "longitude": -74.0776
+    }
+]
+
+STATIONS_BY_ID = {station["id"]: station for station in NYC_STATIONS}
+
+POLLUTANT_FIELDS = ["pm25", "pm10", "o3", "no2", "so2", "co", "temperature", "humidity"]
+
+
+def get_aqi_category(aqi_value):
+    """Convert AQI value to category"""
+    if aqi_value <= 50:
+        return "good"
+    elif aqi_value <= 100:
+        return "moderate"
+    elif aqi_value <= 150:
+        return "unhealthy_sensitive"
+    elif aqi_value <= 200:
+        return "unhealthy"
+    elif aqi_value <= 300:
+        return "very_unhealthy"
+    else:
+        return "hazardous"
+
+
+def normalize_reading_time(value) -> str:
+    """Normalize a timestamp (ISO string, epoch seconds or datetime) to UTC 'YYYY-MM-DDTHH:MM:SSZ'"""
+    if value is None:
+        dt = datetime.now(timezone.utc)
+    elif isinstance(value, datetime):
+        dt = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    elif isinstance(value, (int, float)):
+        dt = datetime.fromtimestamp(value, tz=timezone.utc)
+    else:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class RateLimiter:
+    """Token bucket limiting how often a single source may be hit"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class DataSource:
+    """Base class for upstream station feeds.
+
+    Subclasses implement fetch() returning raw records; normalize() maps a raw
+    record onto the reading dict the database layer expects.
+    """
+
+    name = "source"
+
+    def __init__(self, rate_limit: float = 1.0, max_retries: int = 3, backoff: float = 0.5):
+        self.limiter = RateLimiter(rate_limit)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def fetch(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def normalize(self, raw: Dict) -> Optional[Dict]:
+        """Map a raw station record to a reading dict, or None if it is unusable"""
+        station_id = raw.get("id") or raw.get("station_id")
+        if not station_id or raw.get("aqi_value") is None:
+            return None
+
+        station = STATIONS_BY_ID.get(station_id, {})
+        aqi_value = int(round(float(raw["aqi_value"])))
+
+        reading = {
+            "id": station_id,
+            "location": raw.get("location") or station.get("location", station_id),
+            "latitude": float(raw.get("latitude", station.get("latitude", 0.0))),
+            "longitude": float(raw.get("longitude", station.get("longitude", 0.0))),
+            "aqi_value": aqi_value,
+            "aqi_category": get_aqi_category(aqi_value),
+            "primary_pollutant": raw.get("primary_pollutant") or "PM2.5",
+            "reading_time": normalize_reading_time(raw.get("reading_time")),
+            "data_source": self.name
+        }
+        for field in POLLUTANT_FIELDS:
+            # A pollutant the feed did not send stays None (stored as NULL), not 0.0
+            value = raw.get(field)
+            reading[field] = float(value) if value is not None else None
+        return reading
+
+    def poll(self) -> List[Dict]:
+        """Fetch with rate limiting, retries and exponential backoff, then normalize"""
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                raw_records = self.fetch()
+                break
+            except Exception as e:
+                last_error = e
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff * (2 ** attempt) * (1 + random.random() * 0.1))
+        else:
+            raise last_error
+
+        readings = []
+        for raw in raw_records:
+            try:
+                reading = self.normalize(raw)
+            except (TypeError, ValueError) as e:
+                print(f"⚠️  {self.name}: dropping malformed record: {e}")
+                continue
+            if reading:
+                readings.append(reading)
+        return readings
+
+
+class MockStationSource(DataSource):
+    """Generates synthetic readings for the NYC stations (development default)"""
+
+    name = "mock"
+
+    def fetch(self) -> List[Dict]:
+        stations = []
+
+        for station in NYC_STATIONS:
+            stations.append({
+                "id": station["id"],
+                "location": station["location"],
+                "latitude": station["latitude"],
+                "longitude": station["longitude"],
+                "aqi_value": random.randint(40, 120),
+                "primary_pollutant": "PM2.5",
+                "pm25": random.uniform(10, 30),
+                "pm10": random.uniform(15, 40),
+                "o3": random.uniform(20, 60),
+                "no2": random.uniform(10, 35),
+                "so2": random.uniform(5, 15),
+                "co": random.uniform(0.5, 2.0),
+                "temperature": random.uniform(15, 25),
+                "humidity": random.uniform(50, 80),
+                "reading_time": datetime.now(timezone.utc)
+            })
+
+        return stations
+
+
+class HttpStationSource(DataSource):
+    """Polls a JSON feed returning {"stations": [...]} (e.g. fixture_server.py)"""
+
+    name = "http"
+
+    def __init__(self, url: str, timeout: float = 10, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self) -> List[Dict]:
+        import requests  # deferred: the mock source never needs it
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        payload = response.json()
+        return payload.get("stations", []) if isinstance(payload, dict) else payload
+
+
+class FixtureServerSource(HttpStationSource):
+    """Reads from the local fixture server used for testing ingestion end to end"""
+
+    name = "fixture"
+
+    def __init__(self, base_url: str = "http://localhost:5055", **kwargs):
+        super().__init__(base_url.rstrip("/") + "/stations", **kwargs)
+
+
+def build_sources(spec: str) -> List[DataSource]:
+    """Build sources from a comma separated spec such as 'mock' or 'fixture:http://localhost:5055'"""
+    sources = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, target = entry.partition(":")
+        if kind == "mock":
+            sources.append(MockStationSource())
+        elif kind == "fixture":
+            sources.append(FixtureServerSource(target or "http://localhost:5055"))
+        elif kind == "http":
+            sources.append(HttpStationSource(target))
+        else:
+            raise ValueError(f"Unknown ingestion source: {kind}")
+    return sources
+
+
+class IngestionPoller:
+    """Polls all sources on a schedule and writes readings through the bulk path.
+
+    Fetching runs on a thread pool so one slow feed does not hold up the
+    others; the database write happens once per cycle on the poller thread.
+    """
+
+    def __init__(self, db, sources: List[DataSource], interval: float = 60, max_workers: int = 4):
+        self.db = db
+        self.sources = sources
+        self.interval = interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_run = None
+        self.last_count = 0
+
+    def run_once(self) -> int:
+        """Poll every source once and persist the batch. Returns the number of readings written"""
+        futures = {self.executor.submit(source.poll): source for source in self.sources}
+
+        readings = []
+        for future, source in futures.items():
+            try:
+                readings.extend(future.result())
+            except Exception as e:
+                print(f"❌ Ingestion source {source.name} failed: {e}")
+
+        if readings and not self.db.save_ingest_batch(readings):
+            readings = []
+
+        self.last_run = datetime.now(timezone.utc)
+        self.last_count = len(readings)
+        return len(readings)
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"❌ Ingestion cycle failed: {e}")
+            self.stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name="ingestion-poller", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 5):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+        self.executor.shutdown(wait=False)
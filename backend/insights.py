@@ -0,0 +1,103 @@
+import itertools
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class InsightStore:
+    """Latest generated insight per location, read by the insights endpoint"""
+
+    def __init__(self):
+        self.entries: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+
+    def get(self, location_id: str) -> Optional[Dict]:
+        with self.lock:
+            return self.entries.get(location_id)
+
+    def put(self, location_id: str, insight: Dict):
+        with self.lock:
+            self.entries[location_id] = insight
+
+
+class InsightPrewarmer:
+    """Regenerates insights in the background after every ingest batch.
+
+    Pending locations are kept once each, in a dict bounded by
+    `queue_size`. The worker picks the location with the most recent
+    requests (an exponentially decaying counter) each time it is free, so
+    requests made while a location waits raise its priority without
+    adding entries. `build(location_id)` does the slow work (loading the
+    latest reading and calling the LLM) and returns the payload to store,
+    or None when the location has no data.
+    """
+
+    def __init__(self, build: Callable[[str], Optional[Dict]], location_ids: List[str],
+                 store: Optional[InsightStore] = None, queue_size: int = 64,
+                 traffic_half_life: float = 900):
+        self.build = build
+        self.location_ids = list(location_ids)
+        self.store = store or InsightStore()
+        self.queue_size = queue_size
+        self.pending: Dict[str, int] = {}  # location_id -> enqueue order, breaks priority ties
+        self.sequence = itertools.count()
+        self.traffic_decay = math.log(2) / traffic_half_life
+        self.traffic: Dict[str, tuple] = {}  # location_id -> (score, updated_at)
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.thread = None
+
+    def _traffic_score(self, location_id: str, now: float) -> float:
+        score, updated_at = self.traffic.get(location_id, (0.0, now))
+        return score * math.exp(-self.traffic_decay * (now - updated_at))
+
+    def record_request(self, location_id: str):
+        """Count a request for a location's insight toward its priority"""
+        now = time.monotonic()
+        with self.lock:
+            self.traffic[location_id] = (self._traffic_score(location_id, now) + 1, now)
+
+    def enqueue(self, location_id: str) -> bool:
+        """Queue a regeneration unless one is already pending; False if the queue is full"""
+        with self.lock:
+            if location_id in self.pending:
+                return True
+            if len(self.pending) >= self.queue_size:
+                self.dropped += 1
+                return False
+            self.pending[location_id] = next(self.sequence)
+            self.ready.notify()
+            return True
+
+    def enqueue_all(self, *args):
+        """AirQualityDatabase batch listener: refresh every location"""
+        for location_id in self.location_ids:
+            self.enqueue(location_id)
+
+    def _next(self) -> str:
+        """Block until a location is pending, then take the busiest one"""
+        with self.lock:
+            while not self.pending:
+                self.ready.wait()
+            now = time.monotonic()
+            location_id = max(self.pending, key=lambda location: (
+                self._traffic_score(location, now), -self.pending[location]))
+            del self.pending[location_id]
+            return location_id
+
+    def _run(self):
+        while True:
+            location_id = self._next()
+            try:
+                insight = self.build(location_id)
+                if insight is not None:
+                    self.store.put(location_id, insight)
+            except Exception as e:
+                print(f"❌ Insight pre-warm failed for {location_id}: {e}")
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="insight-prewarm", daemon=True)
+            self.thread.start()
@@ -0,0 +1,41 @@
+import sqlite3
+from typing import Callable, List, Tuple
+
+# (version, name, fn(conn)); versions only ever grow and applied entries are never edited
+Migration = Tuple[int, str, Callable[[sqlite3.Connection], None]]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """Highest applied migration, 0 for a database that predates versioning"""
+    try:
+        return conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
+
+def apply_migrations(conn: sqlite3.Connection, migrations: List[Migration], label: str = "database") -> int:
+    """Run migrations newer than the recorded version, in order; returns how many ran.
+
+    An up-to-date database costs a single query. Each migration commits
+    before its version is recorded, so migrations must be idempotent (safe
+    to re-run if the process dies in between).
+    """
+    current = schema_version(conn)
+    pending = [migration for migration in migrations if migration[0] > current]
+    if not pending:
+        return 0
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    for version, name, migrate in sorted(pending):
+        migrate(conn)
+        conn.commit()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO schema_migrations (version, name) VALUES (?, ?)", (version, name))
+        print(f"🔧 Applied {label} migration {version}: {name}")
+    return len(pending)
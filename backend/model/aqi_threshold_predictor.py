@@ -1,15 +1,19 @@
 
-import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from sklearn.metrics import mean_absolute_error
-import joblib
+import os
+import threading
+
+# pandas/scikit-learn/joblib are imported inside the functions that use them,
+# so importing this module (e.g. from the API process) stays cheap
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aqi_safe_threshold_model.pkl")
+
+_model = None
+_model_lock = threading.Lock()
 
 # Load and clean data
 def load_data(file_path):
+    import pandas as pd
+
     df = pd.read_excel(file_path)
     df = df[['AGE', 'GENDER', 'DIAGNOSISNAME', 'AQI', 'PATIENT_STATUS']].dropna()
     df = df[df['AQI'] > 0]
@@ -18,6 +22,14 @@ def load_data(file_path):
 
 # Train model
 def train_model(df):
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import OneHotEncoder
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
+    from sklearn.metrics import mean_absolute_error
+    import joblib
+
     X = df[['AGE', 'GENDER', 'DIAGNOSISNAME']]
     y = df['AQI']
 
@@ -38,12 +50,33 @@ def train_model(df):
     mae = mean_absolute_error(y_test, preds)
     print(f"Model trained. MAE: {mae:.2f}")
 
-    joblib.dump(model, "aqi_safe_threshold_model.pkl")
-    print("Model saved as 'aqi_safe_threshold_model.pkl'")
+    joblib.dump(model, MODEL_PATH)
+    print(f"Model saved as '{MODEL_PATH}'")
     return model
 
+# Load the saved model on first use (or from warm_up)
+def get_model(path=MODEL_PATH):
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import joblib
+                _model = joblib.load(path)
+    return _model
+
+# Optional warm-up hook: pay the import and load cost before the first request
+def warm_up(path=MODEL_PATH):
+    if os.path.exists(path):
+        get_model(path)
+        import pandas  # noqa: F401  (used by get_safe_aqi)
+        return True
+    return False
+
 # Predict AQI
 def get_safe_aqi(model, age, gender, diagnosis):
+    import pandas as pd
+
+    model = model if model is not None else get_model()
     input_df = pd.DataFrame([{
         'AGE': age,
         'GENDER': gender,
@@ -0,0 +1,188 @@
+import glob
+import os
+import re
+import sqlite3
+import stat
+import threading
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+# Read-only partitions are memory-mapped up to this many bytes
+FROZEN_MMAP_SIZE = 256 * 1024 * 1024
+
+# SQLite attaches at most 10 databases per connection; leave room for the main file
+MAX_ATTACHED = 8
+
+MONTH_PATTERN = re.compile(r"^\d{4}_\d{2}$")
+
+
+def partition_month(reading_time: str) -> str:
+    """'2025-09-21T11:23:44Z' -> '2025_09'"""
+    return f"{reading_time[:4]}_{reading_time[5:7]}"
+
+
+def current_month() -> str:
+    """Partition month of the current UTC time"""
+    return datetime.now(timezone.utc).strftime("%Y_%m")
+
+
+def previous_month(month: str, count: int = 1) -> str:
+    year, month_number = int(month[:4]), int(month[5:])
+    index = year * 12 + month_number - 1 - count
+    return f"{index // 12:04d}_{index % 12 + 1:02d}"
+
+
+class PartitionManager:
+    """Monthly SQLite files holding the time-series reading tables.
+
+    The directory listing is the catalog: a month exists when its file does,
+    so archiving or dropping a cold month is moving or deleting one file.
+    A partition is frozen by making its file read-only; frozen partitions
+    are opened with immutable=1 (no locking, no change detection) and
+    memory-mapped. Only the current UTC month and the `writable_months` - 1
+    before it stay writable (a newer file never pushes the window forward).
+    """
+
+    def __init__(self, directory: str, prefix: str, init_schema: Callable[[sqlite3.Connection], None],
+                 writable_months: int = 2, compact: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.directory = directory
+        self.prefix = prefix
+        self.init_schema = init_schema
+        # Run on a partition's connection (and committed) just before it is frozen
+        self.compact = compact
+        self.writable_months = writable_months
+        self.initialized = set()
+        self.freeze_pending = False
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, month: str) -> str:
+        if not MONTH_PATTERN.match(month):
+            raise ValueError(f"Invalid partition month: {month}")
+        return os.path.join(self.directory, f"{self.prefix}_{month}.db")
+
+    def schema(self, month: str) -> str:
+        """Schema name a partition is attached under"""
+        return f"p_{month}"
+
+    def months(self) -> List[str]:
+        """Existing partitions, oldest first"""
+        months = []
+        for path in glob.glob(os.path.join(self.directory, f"{self.prefix}_*.db")):
+            month = os.path.basename(path)[len(self.prefix) + 1:-3]
+            if MONTH_PATTERN.match(month):
+                months.append(month)
+        return sorted(months)
+
+    def months_between(self, since: Optional[str] = None, until: Optional[str] = None) -> List[str]:
+        """Partitions that can hold readings with since <= reading_time <= until"""
+        low = partition_month(since) if since else "0000_00"
+        high = partition_month(until) if until else "9999_99"
+        return [month for month in self.months() if low <= month <= high]
+
+    def is_frozen(self, month: str) -> bool:
+        path = self.path(month)
+        return os.path.exists(path) and not os.stat(path).st_mode & stat.S_IWUSR
+
+    def ensure(self, month: str, freeze: bool = True):
+        """Create a partition (and, unless `freeze` is False, freeze ones that fell out of the writable window)"""
+        with self.lock:
+            if month in self.initialized:
+                return
+            path = self.path(month)
+            created = not os.path.exists(path)
+            if created:
+                # Build the schema under a temporary name: readers list months by file,
+                # and must never see one without its tables
+                building = f"{path}.building"
+                for leftover in (building, f"{building}-journal", f"{building}-wal", f"{building}-shm"):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                conn = sqlite3.connect(building)
+                with conn:
+                    self.init_schema(conn)
+                conn.close()
+                os.rename(building, path)
+            elif not self.is_frozen(month):
+                conn = sqlite3.connect(path)
+                with conn:
+                    self.init_schema(conn)
+                conn.close()
+            self.initialized.add(month)
+            if created:
+                self.freeze_pending = True
+        if freeze:
+            self.freeze_expired()
+
+    def freeze_expired(self):
+        """Freeze partitions that fell out of the writable window (measured from the current UTC month)"""
+        with self.lock:
+            if not self.freeze_pending:
+                return
+            self.freeze_pending = False
+        self.freeze_older_than(previous_month(current_month(), self.writable_months - 1))
+
+    def attach(self, conn: sqlite3.Connection, month: str) -> str:
+        """Attach a writable partition to `conn` (outside a transaction); returns its schema name.
+
+        Freezing is deferred (a partition cannot be frozen while attached):
+        call freeze_expired() once `conn` is closed.
+        """
+        self.ensure(month, freeze=False)
+        schema = self.schema(month)
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (self.path(month),))
+        return schema
+
+    def connect_read(self, month: str) -> sqlite3.Connection:
+        """Read-only connection to a partition; frozen ones are immutable and memory-mapped"""
+        path = os.path.abspath(self.path(month))
+        if self.is_frozen(month):
+            conn = sqlite3.connect(f"file:{path}?immutable=1", uri=True)
+            conn.execute(f"PRAGMA mmap_size = {FROZEN_MMAP_SIZE}")
+        else:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        return conn
+
+    def freeze(self, month: str):
+        """Compact a partition (cold-encoding it, if configured) and make its file read-only"""
+        if self.is_frozen(month):
+            return
+        path = self.path(month)
+        conn = sqlite3.connect(path)
+        if self.compact:
+            try:
+                self.compact(conn)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                conn.close()
+                print(f"❌ Not freezing partition {month}, compaction failed: {e}")
+                return
+        # Immutable files must be self-contained: fold the WAL back in first
+        if conn.execute("PRAGMA journal_mode = DELETE").fetchone()[0] != "delete":
+            conn.close()
+            print(f"⚠️ Partition {month} is in use, not freezing it yet")
+            return
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+        conn.close()
+        os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        print(f"🧊 Froze partition {month}")
+
+    def freeze_older_than(self, month: str):
+        for older in self.months():
+            if older < month:
+                self.freeze(older)
+
+    def thaw(self, month: str):
+        """Make a frozen partition writable again (e.g. to backfill late data)"""
+        os.chmod(self.path(month), stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+
+    def drop(self, month: str):
+        """Delete a partition's file and its readings"""
+        path = self.path(month)
+        for leftover in (path, f"{path}-journal", f"{path}-wal", f"{path}-shm"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        with self.lock:
+            self.initialized.discard(month)
@@ -0,0 +1,189 @@
+import threading
+import warnings
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Numeric reading fields kept in memory, in column order
+ROLLING_FIELDS = ["aqi_value", "pm25", "pm10", "o3", "no2", "so2", "co", "temperature", "humidity"]
+
+
+def nan_to_none(array: np.ndarray) -> list:
+    """ndarray -> list with NaN as None, so it serializes as JSON null"""
+    return np.where(np.isnan(array), None, array).tolist()
+
+
+def reading_times_to_epoch(reading_times: Sequence[str]) -> np.ndarray:
+    """Vectorized 'YYYY-MM-DDTHH:MM:SSZ' -> int64 epoch seconds"""
+    return np.array([t[:19] for t in reading_times], dtype="datetime64[s]").astype(np.int64)
+
+
+class RingBuffer:
+    """Fixed-size, NumPy-backed buffer of (epoch, values) rows in time order.
+
+    Appends overwrite the oldest row once full. Readings older than the
+    newest one are ignored and a reading at the same second replaces it, so
+    the buffer stays sorted without ever moving data.
+    """
+
+    def __init__(self, capacity: int, width: int = len(ROLLING_FIELDS)):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.values = np.full((capacity, width), np.nan)
+        self.head = 0  # next write position
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def append(self, epoch: int, values: Sequence[float]):
+        with self.lock:
+            if self.size:
+                last = (self.head - 1) % self.capacity
+                if epoch < self.times[last]:
+                    return
+                if epoch == self.times[last]:
+                    self.values[last] = values
+                    return
+            self.times[self.head] = epoch
+            self.values[self.head] = values
+            self.head = (self.head + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, epochs: np.ndarray, values: np.ndarray):
+        """Bulk-append rows with slice writes (used when filling from the database)"""
+        if not len(epochs):
+            return
+        order = np.argsort(epochs, kind="stable")
+        epochs, values = epochs[order], values[order]
+        # Keep the last row for each distinct second
+        keep = np.append(epochs[1:] != epochs[:-1], True)
+        epochs, values = epochs[keep], values[keep]
+
+        with self.lock:
+            overlaps = bool(self.size and len(epochs)) and \
+                epochs[0] <= self.times[(self.head - 1) % self.capacity]
+
+        if overlaps:
+            # Reaches back into what is buffered; use ordered single appends
+            for epoch, row in zip(epochs, values):
+                self.append(int(epoch), row)
+            return
+
+        epochs, values = epochs[-self.capacity:], values[-self.capacity:]
+        with self.lock:
+            n = len(epochs)
+            first = min(n, self.capacity - self.head)
+            self.times[self.head:self.head + first] = epochs[:first]
+            self.values[self.head:self.head + first] = values[:first]
+            self.times[:n - first] = epochs[first:]
+            self.values[:n - first] = values[first:]
+            self.head = (self.head + n) % self.capacity
+            self.size = min(self.size + n, self.capacity)
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Copies of (times, values) in chronological order"""
+        with self.lock:
+            if self.size < self.capacity:
+                return self.times[:self.size].copy(), self.values[:self.size].copy()
+            return np.roll(self.times, -self.head), np.roll(self.values, -self.head, axis=0)
+
+    def window(self, seconds: int, end: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows with end - seconds < time <= end (end defaults to the newest row)"""
+        times, values = self.snapshot()
+        if not len(times):
+            return times, values
+        end = times[-1] if end is None else end
+        start = np.searchsorted(times, end - seconds, side="right")
+        stop = np.searchsorted(times, end, side="right")
+        return times[start:stop], values[start:stop]
+
+
+class RollingWindows:
+    """Ring buffers per location and per station, fed by the save path.
+
+    Serves the rolling 24h series, moving averages and daily maxima from
+    memory. Windows end at the newest buffered reading.
+    """
+
+    def __init__(self, capacity: int = 2048):
+        self.capacity = capacity
+        self.buffers: Dict[Tuple[str, str], RingBuffer] = {}
+        self.lock = threading.Lock()
+
+    def buffer(self, kind: str, key: str) -> RingBuffer:
+        with self.lock:
+            ring = self.buffers.get((kind, key))
+            if ring is None:
+                ring = self.buffers[(kind, key)] = RingBuffer(self.capacity)
+            return ring
+
+    def add_readings(self, kind: str, key: str, readings: List[Dict]):
+        if not readings:
+            return
+        epochs = reading_times_to_epoch([r["reading_time"] for r in readings])
+        values = np.array([[r.get(f) for f in ROLLING_FIELDS] for r in readings], dtype=float)
+        self.buffer(kind, key).extend(epochs, values)
+
+    def load_rows(self, kind: str, key: str, rows: List[tuple]):
+        """Fill from database rows shaped (reading_time, *ROLLING_FIELDS)"""
+        if not rows:
+            return
+        epochs = reading_times_to_epoch([row[0] for row in rows])
+        values = np.array([row[1:] for row in rows], dtype=float)
+        self.buffer(kind, key).extend(epochs, values)
+
+    def on_location_saved(self, location_id: str, readings: List[Dict]):
+        """AirQualityDatabase save listener"""
+        self.add_readings("location", location_id, readings)
+
+    def on_station_saved(self, station_id: str, readings: List[Dict]):
+        """AirQualityDatabase station save listener"""
+        self.add_readings("station", station_id, readings)
+
+    def hourly_series(self, kind: str, key: str, field: str = "aqi_value", hours: int = 24) -> List[Tuple[int, float]]:
+        """Hourly means over the last `hours` hours as (hour_epoch, mean) pairs"""
+        times, values = self.buffer(kind, key).window(hours * 3600)
+        if not len(times):
+            return []
+        column = values[:, ROLLING_FIELDS.index(field)]
+        hour_index = times // 3600
+        hour_index -= hour_index[0]
+        valid = ~np.isnan(column)
+        sums = np.bincount(hour_index[valid], weights=column[valid])
+        counts = np.bincount(hour_index[valid], minlength=len(sums))
+        present = np.nonzero(counts)[0]
+        base_hour = times[0] // 3600
+        return [(int((base_hour + h) * 3600), float(sums[h] / counts[h])) for h in present]
+
+    def summary(self, kind: str, key: str, hours: int = 24, moving_average_points: int = 8) -> Optional[Dict]:
+        """Latest values, window mean/max and a trailing moving average per field"""
+        times, values = self.buffer(kind, key).window(hours * 3600)
+        if not len(times):
+            return None
+
+        # Trailing simple moving average via cumulative sums (NaNs treated as gaps)
+        filled = np.nan_to_num(values)
+        present = (~np.isnan(values)).astype(float)
+        n = moving_average_points
+        csum = np.vstack([np.zeros(values.shape[1]), np.cumsum(filled, axis=0)])
+        ccount = np.vstack([np.zeros(values.shape[1]), np.cumsum(present, axis=0)])
+        lower = np.maximum(np.arange(1, len(times) + 1) - n, 0)
+        with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            moving_average = (csum[1:] - csum[lower]) / (ccount[1:] - ccount[lower])
+            window_mean = np.nanmean(values, axis=0)
+            window_max = np.nanmax(values, axis=0)
+
+        return {
+            "fields": ROLLING_FIELDS,
+            "points": int(len(times)),
+            "window_start": int(times[0]),
+            "window_end": int(times[-1]),
+            "latest": nan_to_none(values[-1]),
+            "mean": nan_to_none(window_mean),
+            "max": nan_to_none(window_max),
+            "moving_average": nan_to_none(moving_average[-1]),
+            "moving_average_points": n,
+            "times": times.tolist(),
+            "aqi_value": nan_to_none(values[:, 0]),
+            "aqi_moving_average": nan_to_none(moving_average[:, 0])
+        }
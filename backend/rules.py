@@ -0,0 +1,172 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# AQI categories in severity order (the keys get_aqi_category returns) and their upper AQI bounds
+AQI_CATEGORIES = ["good", "moderate", "unhealthy_sensitive", "unhealthy", "very_unhealthy", "hazardous"]
+AQI_UPPER_BOUNDS = [50, 100, 150, 200, 300]
+
+# Lower-cased labels (keys, and display names found in older rows) mapped onto the category keys
+CATEGORY_ALIASES = {
+    **{category: category for category in AQI_CATEGORIES},
+    "unhealthy for sensitive groups": "unhealthy_sensitive",
+    "very unhealthy": "very_unhealthy"
+}
+
+RECOMMENDATIONS = {
+    "good": {
+        "message": "Air quality is satisfactory and poses little or no risk.",
+        "activities": ["All outdoor activities are safe", "Great day for outdoor exercise"],
+        "sensitive_groups": "No special precautions needed"
+    },
+    "moderate": {
+        "message": "Air quality is acceptable for most people.",
+        "activities": ["Most outdoor activities are safe", "Consider reducing prolonged outdoor exertion"],
+        "sensitive_groups": "Sensitive individuals may experience minor breathing discomfort"
+    },
+    "unhealthy_sensitive": {
+        "message": "Sensitive groups may experience health effects.",
+        "activities": ["Reduce outdoor activities", "Avoid prolonged outdoor exertion"],
+        "sensitive_groups": "Children, elderly, and those with respiratory conditions should limit outdoor activities"
+    },
+    "unhealthy": {
+        "message": "Everyone may begin to experience health effects.",
+        "activities": ["Avoid outdoor activities", "Stay indoors when possible"],
+        "sensitive_groups": "Sensitive groups should avoid all outdoor activities"
+    },
+    "very_unhealthy": {
+        "message": "Health warnings of emergency conditions.",
+        "activities": ["Stay indoors", "Avoid all outdoor activities"],
+        "sensitive_groups": "Everyone should avoid outdoor activities"
+    },
+    "hazardous": {
+        "message": "Health alert: everyone may experience serious health effects.",
+        "activities": ["Stay indoors", "Use air purifiers", "Avoid all outdoor activities"],
+        "sensitive_groups": "Emergency conditions - everyone should stay indoors"
+    }
+}
+
+# Fallback insight rules: each group contributes the text of its first matching rule, in
+# group order, and an insight keeps the first three. A rule is (field, operator, value, text);
+# text may use {location}.
+INSIGHT_RULES = [
+    [
+        ("category", "==", "good", "Air quality is excellent in {location} - perfect for outdoor activities!"),
+        ("category", "==", "moderate", "Air quality is acceptable in {location} - most activities are safe"),
+        ("category", "==", "unhealthy_sensitive",
+         "Air quality may affect sensitive groups in {location} - limit outdoor time"),
+        ("category", "==", "unhealthy", "Air quality is unhealthy in {location} - stay indoors when possible"),
+        ("category", "==", "very_unhealthy", "Air quality is very unhealthy in {location} - stay indoors"),
+        ("category", "==", "hazardous", "Hazardous air quality in {location} - stay indoors immediately")
+    ],
+    [
+        ("co", ">", 2.0, "High CO levels detected - check for nearby fires or gas leaks"),
+        ("co", ">", 1.0, "Elevated CO levels - avoid areas with heavy traffic")
+    ],
+    [
+        ("pm25", ">", 25, "High PM2.5 levels - consider wearing a mask outdoors"),
+        ("pm25", ">", 15, "Moderate PM2.5 levels - sensitive individuals should take precautions")
+    ],
+    [
+        ("temperature", ">", 30, "Hot weather combined with air pollution - stay hydrated and limit outdoor time"),
+        ("temperature", "<", 5, "Cold weather may trap pollutants - check indoor air quality")
+    ],
+    [
+        ("primary_pollutant", "==", "PM2.5", "Fine particles are the main concern - avoid outdoor exercise"),
+        ("primary_pollutant", "==", "O3", "Ozone levels are elevated - avoid outdoor activities during peak hours"),
+        ("primary_pollutant", "==", "NO2", "Nitrogen dioxide from traffic - avoid busy roads")
+    ]
+]
+
+MAX_INSIGHTS = 3
+
+OPERATORS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal, "==": np.equal}
+
+
+def normalize_category(label: Optional[str], aqi_value: Optional[float] = None) -> str:
+    """Category key for a stored label ('Good', 'good', ...), else derived from the AQI value"""
+    category = CATEGORY_ALIASES.get(str(label).strip().lower()) if label else None
+    if category:
+        return category
+    return AQI_CATEGORIES[int(np.searchsorted(AQI_UPPER_BOUNDS, aqi_value or 0))]
+
+
+class RuleEngine:
+    """Health recommendations and rule-based insights for many readings at once.
+
+    Rules are compiled once into per-field threshold arrays: numeric fields
+    become one float column, text fields (category, primary pollutant) are
+    encoded against the values the rules mention. A batch is then one
+    comparison per rule over all readings plus a first-match per group.
+    """
+
+    def __init__(self, rule_groups: List[List[tuple]] = INSIGHT_RULES,
+                 recommendations: Dict[str, Dict] = RECOMMENDATIONS, max_insights: int = MAX_INSIGHTS):
+        self.recommendations = recommendations
+        self.max_insights = max_insights
+        self.text_values: Dict[str, Dict[str, int]] = {"category": {c: i for i, c in enumerate(AQI_CATEGORIES)}}
+        self.fields: List[str] = []
+        self.groups = []  # per group: (field indexes, operators, thresholds, texts)
+        for group in rule_groups:
+            indexes, operators, thresholds, texts = [], [], [], []
+            for field, operator, value, text in group:
+                if isinstance(value, str):
+                    codes = self.text_values.setdefault(field, {})
+                    value = codes.setdefault(value, len(codes))
+                if field not in self.fields:
+                    self.fields.append(field)
+                indexes.append(self.fields.index(field))
+                operators.append(OPERATORS[operator])
+                thresholds.append(float(value))
+                texts.append(text)
+            self.groups.append((np.array(indexes), operators, np.array(thresholds), texts))
+
+    def categories(self, readings: Sequence[Dict]) -> List[str]:
+        return [normalize_category(r.get("aqi_category"), r.get("aqi_value")) for r in readings]
+
+    def _matrix(self, readings: Sequence[Dict], categories: List[str]) -> np.ndarray:
+        """(readings, fields) float matrix; text fields hold codes (-1 when no rule mentions the value)"""
+        matrix = np.empty((len(readings), len(self.fields)))
+        for j, field in enumerate(self.fields):
+            if field == "category":
+                codes = self.text_values["category"]
+                matrix[:, j] = [codes[category] for category in categories]
+            elif field in self.text_values:
+                codes = self.text_values[field]
+                matrix[:, j] = [codes.get(r.get(field), -1) for r in readings]
+            else:
+                matrix[:, j] = [r.get(field) or 0.0 for r in readings]
+        return matrix
+
+    def evaluate(self, readings: Sequence[Dict], locations: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Category, recommendations and insight for each reading, in one pass.
+
+        `locations` are the display names used in insight text (defaulting
+        to each reading's 'location').
+        """
+        if not readings:
+            return []
+        categories = self.categories(readings)
+        matrix = self._matrix(readings, categories)
+        # (readings, groups) index of the first matching rule in each group, -1 for none
+        matches = np.full((len(readings), len(self.groups)), -1)
+        for g, (indexes, operators, thresholds, _) in enumerate(self.groups):
+            hits = np.column_stack([
+                operator(matrix[:, index], threshold)
+                for index, operator, threshold in zip(indexes, operators, thresholds)
+            ])
+            matches[:, g] = np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+
+        locations = locations or [r.get("location", "Unknown Location") for r in readings]
+        results = []
+        for i, category in enumerate(categories):
+            texts = [self.groups[g][3][rule] for g, rule in enumerate(matches[i].tolist()) if rule >= 0]
+            results.append({
+                "aqi_category": category,
+                "recommendations": self.recommendations[category],
+                "insight": "\n".join(text.format(location=locations[i]) for text in texts[:self.max_insights])
+            })
+        return results
+
+    def evaluate_one(self, reading: Dict, location: Optional[str] = None) -> Dict:
+        return self.evaluate([reading], [location] if location else None)[0]
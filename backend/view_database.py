@@ -6,24 +6,31 @@ View all tables and data in the air quality database
 
 import sqlite3
 import os
+import glob
 
 def view_database():
-    """View all tables and their data in the database"""
+    """View all tables and their data in the database and its monthly partitions"""
     db_path = "air_quality.db"
     
     if not os.path.exists(db_path):
         print("❌ Database file not found!")
         return
     
+    # Readings live in partitions/air_quality_YYYY_MM.db
+    for path in [db_path] + sorted(glob.glob(os.path.join("partitions", "air_quality_*.db"))):
+        view_file(path)
+
+def view_file(db_path):
+    """View all tables and their data in one database file"""
     try:
-        conn = sqlite3.connect(db_path)
+        conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
         cursor = conn.cursor()
         
         # Get all table names
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
         tables = cursor.fetchall()
         
-        print("📊 Database Tables:")
+        print(f"📊 Database Tables ({db_path}):")
         print("=" * 50)
         
         for table in tables:
@@ -46,7 +53,13 @@ def view_database():
             
             # Show first 5 rows
             if count > 0:
-                cursor.execute(f"SELECT * FROM {table_name} LIMIT 5;")
+                if table_name == "cold_blocks":
+                    # Compressed readings of a frozen month; show block sizes rather than the payloads
+                    cursor.execute("""
+                        SELECT table_name, source_id, day, row_count, LENGTH(payload) FROM cold_blocks LIMIT 5;
+                    """)
+                else:
+                    cursor.execute(f"SELECT * FROM {table_name} LIMIT 5;")
                 rows = cursor.fetchall()
                 
                 print("Sample data (first 5 rows):")